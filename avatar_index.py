@@ -0,0 +1,116 @@
+import os
+import re
+import time
+import logging
+import sqlite3
+import threading
+
+from key_locks import KeyLocks
+
+
+# -------------------
+# 头像索引
+# -------------------
+
+# 同名头像有多个扩展名时按这个顺序取（和原来逐个 os.path.exists 探测的顺序一致）
+AVATAR_EXTS = ('.jpg', '.jpeg', '.png', '.gif')
+
+_UNSAFE_NAME_RE = re.compile(r'[\\/:*?"<>|]')
+
+
+def avatar_name(author: str) -> str:
+    return _UNSAFE_NAME_RE.sub('_', author)
+
+
+class AvatarIndex:
+    """
+    内存中的头像索引，取代每次查找都对四种扩展名调用 os.path.exists：
+    - 启动时扫描一次 avatar 目录，之后查找只读内存
+    - 记录每个头像的来源 URL（存在 state.db），推特换头像后 URL 会变，这时重新下载覆盖旧头像
+    - 改造前下载的头像没有来源记录，第一次遇到时重新下载一次并记下 URL
+    """
+
+    def __init__(self, avatar_dir: str, db_path: str, fetch):
+        # fetch(url, path) -> bool，负责把 url 下载到 path
+        self.avatar_dir = avatar_dir
+        self.fetch = fetch
+        os.makedirs(avatar_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._key_locks = KeyLocks()
+        self.downloads = 0
+        self.refreshed = 0
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS avatars ("
+            " name TEXT PRIMARY KEY,"
+            " source_url TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._paths = self._scan()
+        self._sources = dict(self._conn.execute("SELECT name, source_url FROM avatars"))
+        logging.info(f"头像索引已建立：{len(self._paths)} 个头像，{len(self._sources)} 个有来源记录")
+
+    def _scan(self) -> dict:
+        candidates = []
+        with os.scandir(self.avatar_dir) as entries:
+            for entry in entries:
+                name, ext = os.path.splitext(entry.name)
+                if ext.lower() in AVATAR_EXTS and entry.is_file():
+                    candidates.append((AVATAR_EXTS.index(ext.lower()), name, entry.name))
+        # 优先级低的先写入，被优先级高的覆盖
+        return {
+            name: os.path.join(self.avatar_dir, filename)
+            for _, name, filename in sorted(candidates, reverse=True)
+        }
+
+    def get(self, author: str):
+        """本地头像路径，没有返回 None"""
+        return self._paths.get(avatar_name(author))
+
+    def ensure(self, author: str, url: str, ext: str):
+        """
+        返回 author 的头像路径：本地头像来自同一个 URL 时直接返回，
+        没有头像或 URL 变了时下载 url 覆盖。下载失败时保留旧头像。
+        """
+        name = avatar_name(author)
+        with self._key_locks.hold(name):
+            return self._ensure(name, url, ext)
+
+    def _ensure(self, name: str, url: str, ext: str):
+        path = self._paths.get(name)
+        source = self._sources.get(name)
+        if path and source == url:
+            return path
+        new_path = os.path.join(self.avatar_dir, f"{name}{ext}")
+        if not self.fetch(url, new_path):
+            return path
+        if path and path != new_path:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        with self._lock:
+            self._paths[name] = new_path
+            self._sources[name] = url
+            self._conn.execute(
+                "INSERT OR REPLACE INTO avatars (name, source_url, updated_at) VALUES (?, ?, ?)",
+                (name, url, time.time()),
+            )
+            self._conn.commit()
+            if path:
+                self.refreshed += 1
+            else:
+                self.downloads += 1
+        if path:
+            logging.info(f"头像已更新：{name}（{'来源变化' if source else '补记来源'}）")
+        return new_path
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"avatars": len(self._paths), "downloads": self.downloads, "refreshed": self.refreshed}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
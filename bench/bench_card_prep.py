@@ -0,0 +1,128 @@
+"""
+卡片 HTML 生成（渲染前准备）基准：
+  1) 旧写法：每张卡片新建 Jinja2 Environment、重新读取 css2.css / browser@4.js、重新定义闭包和翻译来源 SVG
+  2) CardRenderer：模板和资源只加载一次，每张卡片只做 template.render
+开始前先确认两种写法对同一组样本生成的 HTML 完全一致。不需要浏览器。
+
+用法：python bench/bench_card_prep.py --cards 500
+"""
+import os
+import re
+import sys
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from jinja2 import Environment, FileSystemLoader
+from item_parser import merge_consecutive_br
+from card_renderer import CardRenderer, TRANSLATE_SOURCE_DEEPSEEK
+
+TEMPLATE_DIR = os.path.join(ROOT, "html")
+
+SAMPLES = [
+    {
+        "author": "大西亜玖璃", "author_id": "aguri_onishi",
+        "desc_clean": "今日は #ラブライブ のイベントでした！<br><br>ありがとうございました✨",
+        "desc_zh": "今天是 #ラブライブ 的活动！<br>谢谢大家✨",
+        "quote_clean": "本日のゲストは大西亜玖璃さんです！<br>お楽しみに", "quote_zh": "今天的嘉宾是大西亜玖璃！<br>敬请期待",
+        "quoted_username": "staff_aguri", "is_retweet": False,
+    },
+    {
+        "author": "大西亜玖璃", "author_id": "aguri_onishi",
+        "desc_clean": "", "desc_zh": "",
+        "quote_clean": "新曲MV公開！<br><br><br>#蓮ノ空", "quote_zh": "新曲MV公开！<br>#蓮ノ空",
+        "quoted_username": "hasunosora_SIC", "is_retweet": True,
+    },
+    {
+        "author": "楠木ともり", "author_id": "tomori_kusunoki",
+        "desc_clean": "写真です📷", "desc_zh": "照片📷",
+        "quote_clean": "", "quote_zh": "", "quoted_username": "", "is_retweet": False,
+    },
+    {
+        "author": "楠木ともり", "author_id": "tomori_kusunoki",
+        "desc_clean": "", "desc_zh": "", "quote_clean": "", "quote_zh": "", "quoted_username": "", "is_retweet": False,
+    },
+]
+COMMON = {
+    "categories": ["#ラブライブ"],
+    "beijing_time_str": "星期六，2025.06.14 19:00:00",
+    "avatar_path": "/tmp/avatar/aguri.jpg",
+    "avatar_quote": "/tmp/avatar/staff.jpg",
+}
+
+
+def legacy_render_html(tailwind_css_for, author, author_id, desc_clean, desc_zh, quote_clean='', quote_zh='',
+                       categories=None, beijing_time_str=None, avatar_path=None, avatar_quote=None,
+                       quoted_username='', is_retweet=False):
+    """改动前 text_to_image_html 里生成 HTML 的部分，作为对照"""
+    def load_resource(filename):
+        with open(os.path.join(TEMPLATE_DIR, filename), 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def highlight_hashtags(text: str) -> str:
+        return re.sub(r'#([^<\s]+)', r'<span style="color:#1da1f2;">#\1</span>', text)
+
+    desc_clean = highlight_hashtags(merge_consecutive_br(desc_clean))
+    desc_zh = highlight_hashtags(merge_consecutive_br(desc_zh))
+    quote_clean = highlight_hashtags(merge_consecutive_br(quote_clean))
+    quote_zh = highlight_hashtags(merge_consecutive_br(quote_zh))
+    template_name = 'seiyuu.html' if quote_clean.strip() or quote_zh.strip() else 'no-quote.html'
+    css_content = load_resource("css2.css")
+    tailwind_css = tailwind_css_for(template_name)
+    js_content = '' if tailwind_css else load_resource("browser@4.js")
+    env = Environment(loader=FileSystemLoader(TEMPLATE_DIR))
+    template = env.get_template(template_name)
+    if not desc_clean.strip() and not desc_zh.strip() and not quote_clean.strip() and not quote_zh.strip():
+        translate_source = ''
+    elif is_retweet:
+        translate_source = "已转推"
+    else:
+        translate_source = TRANSLATE_SOURCE_DEEPSEEK
+    return template.render(
+        author=author, author_id=author_id, desc_clean=desc_clean, desc_zh=desc_zh,
+        quote_clean=quote_clean, quote_zh=quote_zh, beijing_time_str=beijing_time_str,
+        categories=categories, avatar_path=avatar_path, avatar_quote=avatar_quote,
+        quoted_username=quoted_username, translate_source=translate_source,
+        css_content=css_content, js_content=js_content, tailwind_css=tailwind_css,
+    )
+
+
+def per_card(func, cards) -> float:
+    start = time.perf_counter()
+    for i in range(cards):
+        func(**SAMPLES[i % len(SAMPLES)], **COMMON)
+    return (time.perf_counter() - start) / cards * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cards", type=int, default=500)
+    args = parser.parse_args()
+
+    # static：有预编译 Tailwind CSS（不内联 browser@4.js）；runtime：每张卡片内联 browser@4.js
+    modes = {
+        "static": lambda name: "/* tailwind */ .p-4{padding:1rem}",
+        "runtime": lambda name: "",
+    }
+    for mode, tailwind_css_for in modes.items():
+        card_renderer = CardRenderer(TEMPLATE_DIR, tailwind_css=tailwind_css_for)
+        hot_renderer = CardRenderer(TEMPLATE_DIR, tailwind_css=tailwind_css_for, hot_reload=True)
+        legacy = lambda **kw: legacy_render_html(tailwind_css_for, **kw)
+        for sample in SAMPLES:
+            expected = legacy(**sample, **COMMON)
+            assert card_renderer.render_html(**sample, **COMMON) == expected, f"{mode} 模式下 HTML 不一致"
+            assert hot_renderer.render_html(**sample, **COMMON) == expected
+
+        legacy_ms = per_card(legacy, args.cards)
+        new_ms = per_card(card_renderer.render_html, args.cards)
+        hot_ms = per_card(hot_renderer.render_html, args.cards)
+        print(f"== TAILWIND_MODE={mode} | {args.cards} 张卡片（每张平均）")
+        print(f"  旧写法                    {legacy_ms:7.3f} ms")
+        print(f"  CardRenderer              {new_ms:7.3f} ms | {legacy_ms / new_ms:.1f}x")
+        print(f"  CardRenderer（热重载）    {hot_ms:7.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Mirai 发送通道基准：在本地模拟的 mirai-api-http（bench/mock_mirai.py）上对比
+  1) HTTP：每条消息一次 /sendGroupMessage（连接池长连接）
+  2) WebSocket：一条长连接，按 syncId 匹配响应，多个线程同时发送
+开始前先做几项检查：并发发送时 syncId 一一对应、断线后自动重连、WebSocket 不可用时回退 HTTP。
+
+用法：python bench/bench_mirai_transport.py --messages 500 --concurrency 8 --latency 0.01
+需要 websocket-client。
+"""
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mirai import MiraiClient, MiraiWsTransport
+from mock_mirai import MockMiraiServer
+
+GROUPS = [1001, 1002, 1003, 1004]
+
+
+def chain(i):
+    return [{"type": "Plain", "text": f"消息 {i}"}]
+
+
+def check(server):
+    """功能检查，失败时抛 AssertionError"""
+    # 并发发送：每个响应都回到发出它的线程
+    transport = MiraiWsTransport(server.ws_url, server.verify_key, 1, timeout=10, reconnect_delay=0)
+    futures = [transport.submit("sendGroupMessage", {"target": 1, "messageChain": chain(i)}) for i in range(200)]
+    ids = [future.result(timeout=10)["messageId"] for future in futures]
+    assert len(set(ids)) == 200, "syncId 匹配出错，有响应被重复或丢失"
+    sent_texts = {c[0]["text"] for _, c in server.sent[-200:]}
+    assert sent_texts == {chain(i)[0]["text"] for i in range(200)}
+
+    # 断线重连
+    transport._ws.sock.close()
+    time.sleep(0.2)
+    assert transport.command("sendGroupMessage", {"target": 1, "messageChain": chain(-1)})["code"] == 0
+    assert transport.reconnects == 2, f"重连次数不对：{transport.reconnects}"
+    transport.close()
+
+    # WebSocket 不可用时回退 HTTP
+    client = MiraiClient(server.http_url, server.verify_key, 1, ws_url="ws://127.0.0.1:1/all", timeout=2)
+    key = client.session_key()
+    assert client.send_group_message(key, 1, chain(-2))["code"] == 0
+    assert client.ws_fallbacks == 1
+    client.close()
+    print("检查通过：syncId 匹配 / 断线重连 / HTTP 回退")
+
+
+def run(client, messages, concurrency):
+    key = client.session_key()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(
+            lambda i: client.send_group_message(key, GROUPS[i % len(GROUPS)], chain(i)), range(messages)
+        ))
+    elapsed = time.perf_counter() - start
+    assert all(r.get("code") == 0 for r in results)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.01, help="模拟 Mirai 处理每个命令的耗时（秒）")
+    args = parser.parse_args()
+
+    server = MockMiraiServer(latency=args.latency).start()
+    try:
+        check(server)
+        http_client = MiraiClient(server.http_url, server.verify_key, 1, pool_size=args.concurrency)
+        ws_client = MiraiClient(server.http_url, server.verify_key, 1, pool_size=args.concurrency,
+                                ws_url=server.ws_url)
+        # 预热：建立会话和连接
+        run(http_client, args.concurrency, args.concurrency)
+        run(ws_client, args.concurrency, args.concurrency)
+
+        http_time = run(http_client, args.messages, args.concurrency)
+        ws_time = run(ws_client, args.messages, args.concurrency)
+        assert ws_client.ws_fallbacks == 0, "基准期间 WebSocket 回退到了 HTTP"
+        http_client.close()
+        ws_client.close()
+
+        print(f"== {args.messages} 条消息 | 并发 {args.concurrency} | 模拟延迟 {args.latency*1000:.0f}ms")
+        print(f"  HTTP       {http_time:.2f}s | {args.messages / http_time:.0f} 条/秒")
+        print(f"  WebSocket  {ws_time:.2f}s | {args.messages / ws_time:.0f} 条/秒")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+RSS 条目解析基准和回归检查：
+  1) 用 bench/corpus/items.xml 里的样本条目，逐字段对比 item_parser.parse_item 和 bench/corpus/parsed.json
+  2) 对比旧实现（每条推文现拼正则、对描述反复 findall）和 item_parser 的单条解析耗时
+
+用法：python bench/bench_parser.py --rounds 2000
+      python bench/bench_parser.py --update   # 用旧实现重新生成 parsed.json（只在有意改变解析结果时使用）
+"""
+import os
+import re
+import sys
+import json
+import time
+import logging
+import argparse
+import xml.etree.ElementTree as ET
+from html import unescape
+from datetime import datetime, timezone, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from item_parser import parse_item, clean_html, extract_user_id, WEEKDAY_MAP
+
+CORPUS = os.path.join(ROOT, "bench", "corpus", "items.xml")
+GOLDEN = os.path.join(ROOT, "bench", "corpus", "parsed.json")
+
+rt_pattern = re.compile(r'^(.+?)\s+RT\s*<br>', re.IGNORECASE)
+
+
+def legacy_parse_item(item):
+    """seiyuu.parse_item 改用 item_parser 之前的实现，保留用于对比"""
+    quoted_username = ''
+    quote_block = ''
+    quote_clean = ''
+    quote_avatar_url = ''
+    author_avatar_url = ''
+
+    link = item.findtext('link')
+    if not link:
+        return None
+
+    author_id = extract_user_id(link)
+    desc = item.findtext('description') or ''
+    author_text = item.findtext('author') or 'unknown'
+    author_clean = re.sub(r'<[^>]+>', '', author_text)
+    author = re.sub(r'<[^>]+>', '', author_text)
+    author = re.sub(r'[\\/:*?"<>|\s]', '_', author.strip()).strip('_')
+
+    pub_dt = item.findtext('pubDate') or ''
+    categories = ['#' + c.text.strip() for c in item.findall('category') if c.text]
+
+    rt_match = rt_pattern.search(desc)
+
+    if rt_match:
+        desc_main_only = ''
+        quote_block = desc[rt_match.end():]
+        quote_author_match = re.search(r'<img[^>]+?src="([^"]+?)"[^>]*?>([^:<]+?):', quote_block)
+        if quote_author_match:
+            quote_avatar_url = unescape(quote_author_match.group(1))
+            quoted_username = quote_author_match.group(2).strip()
+            quoted_username = re.sub(r'<[^>]+>', '', quoted_username)
+            quoted_username = re.sub(r'[\\/:*?"<>|\s]', '_', quoted_username.strip()).strip('_')
+            logging.info(f"提取到RT用户信息 - 用户名: {quoted_username}")
+            logging.info(f"提取到RT用户信息 - 头像URL: {quote_avatar_url}")
+            quote_block = re.sub(fr'{re.escape(quoted_username)}[:：]\s*', '', quote_block)
+            quote_block = re.sub(r'^(?:<img[^>]+>)', '', quote_block)
+        quote_clean = clean_html(quote_block)
+        logging.info(f"[{author}] 检测到直接转发模式。")
+        author_avatar_match = re.search(r'<img[^>]+?src="([^"]+?/profile_images/[^"]+?)"[^>]*?>', desc)
+        if author_avatar_match:
+            author_avatar_url = unescape(author_avatar_match.group(1))
+    else:
+        desc_main_only = re.split(r'<div class="rsshub-quote">', desc)[0]
+        author_pattern = fr'{re.escape(author)}[:：]\s*'
+        match = re.search(author_pattern, desc_main_only)
+        if match:
+            desc_main_only = desc_main_only[match.end():]
+        desc_main_only = re.sub(fr'^.*?{re.escape(author_clean)}[:：]\s*', '', desc_main_only)
+        desc_main_only = desc_main_only.lstrip()
+        m = re.search(r'<img[^>]+?src="([^"]+?/profile_images/[^"]+?)"[^>]*?>', desc)
+        if m:
+            author_avatar_url = unescape(m.group(1))
+        quote_block_match = re.search(r'<div class="rsshub-quote">(.*?)</div>', desc, re.DOTALL)
+        if quote_block_match:
+            quote_block = quote_block_match.group(1)
+            quote_author_match = re.search(r'<img[^>]+?src="([^"]+?)"[^>]*?>([^:<]+?):', quote_block)
+            if quote_author_match:
+                quote_avatar_url = unescape(quote_author_match.group(1))
+                quoted_username = quote_author_match.group(2).strip()
+                quoted_username = re.sub(r'<[^>]+>', '', quoted_username)
+                quoted_username = re.sub(r'[\\/:*?"<>|\s]', '_', quoted_username.strip()).strip('_')
+                logging.info(f"提取到引用用户信息 - 用户名: {quoted_username}")
+                logging.info(f"提取到引用用户信息 - 头像URL: {quote_avatar_url}")
+                quote_block = re.sub(fr'{re.escape(quoted_username)}[:：]\s*', '', quote_block)
+                quote_block = re.sub(r'^<img[^>]+>', '', quote_block)
+            quote_block = re.sub(r'^<img[^>]+>', '', quote_block)
+            quote_clean = clean_html(quote_block)
+
+    desc_clean = clean_html(desc_main_only) if desc_main_only else ''
+
+    quote_block_avatar_url = ''
+    matches = re.findall(r'<img[^>]+src="([^"]+pbs\.twimg\.com/profile_images/[^"]+)"[^>]*>\s*([^:<\n]+)', quote_block)
+    if matches:
+        quote_block_avatar_url = matches[0][0]
+
+    media_urls = []
+    seen_urls = set()
+    for tag in re.findall(r'(<img[^>]+>)', desc):
+        if tag.startswith('<img width="0" height="0" hidden="true"'):
+            continue
+        u = re.search(r'src="([^"]+)"', tag).group(1)
+        u = unescape(u)
+        if u.startswith("https://pbs.twimg.com/profile_images/"):
+            continue
+        if u not in seen_urls:
+            media_urls.append(u)
+            seen_urls.add(u)
+    for tag in re.findall(r'(<video[^>]+>.*?</video>)', desc, re.DOTALL):
+        if 'hidden="true"' in tag or 'style="display:none"' in tag:
+            continue
+        src_match = re.search(r'src="([^"]+)"', tag)
+        if src_match:
+            u = src_match.group(1).replace('&amp;', '&')
+            if u not in seen_urls:
+                media_urls.append(u)
+                seen_urls.add(u)
+
+    try:
+        pub_dt_gmt = datetime.strptime(pub_dt, '%a, %d %b %Y %H:%M:%S %Z')
+        pub_dt_utc = pub_dt_gmt.replace(tzinfo=timezone.utc)
+    except ValueError:
+        pub_dt_gmt = datetime.strptime(pub_dt.rstrip(' GMT'), '%a, %d %b %Y %H:%M:%S')
+        pub_dt_utc = pub_dt_gmt.replace(tzinfo=timezone.utc)
+    pub_dt_beijing = pub_dt_utc.astimezone(timezone(timedelta(hours=8)))
+    weekday_cn = WEEKDAY_MAP[pub_dt_beijing.weekday()]
+    beijing_time_str = f"{weekday_cn}，{pub_dt_beijing.year}.{pub_dt_beijing.month:02}.{pub_dt_beijing.day:02} {pub_dt_beijing.strftime('%H:%M:%S')}"
+
+    return {
+        "link": link,
+        "author": author,
+        "author_id": author_id,
+        "author_avatar_url": author_avatar_url,
+        "categories": categories,
+        "pub_dt_utc": pub_dt_utc,
+        "beijing_time_str": beijing_time_str,
+        "is_retweet": bool(rt_match),
+        "desc_clean": desc_clean,
+        "quote_clean": quote_clean,
+        "quoted_username": quoted_username,
+        "quote_avatar_url": quote_avatar_url,
+        "quote_block_avatar_url": quote_block_avatar_url,
+        "media_urls": media_urls,
+    }
+
+
+def to_json(record):
+    if record is None:
+        return None
+    return {k: v.isoformat() if isinstance(v, datetime) else v for k, v in record.items()}
+
+
+def parse_new(item):
+    parsed = parse_item(item)
+    return parsed.to_record() if parsed else None
+
+
+def check(items) -> int:
+    """逐条逐字段对比，返回不一致的条目数"""
+    with open(GOLDEN, encoding="utf-8") as f:
+        golden = json.load(f)
+    assert len(golden) == len(items), f"样本数 {len(items)} 和 parsed.json 的 {len(golden)} 不一致，需要 --update"
+    failures = 0
+    for index, (item, expected) in enumerate(zip(items, golden)):
+        actual = to_json(parse_new(item))
+        if actual == expected:
+            continue
+        failures += 1
+        title = item.findtext('title')
+        if actual is None or expected is None:
+            print(f"  [{index}] {title}: 期望 {expected!r}，实际 {actual!r}")
+            continue
+        for key in expected:
+            if actual.get(key) != expected[key]:
+                print(f"  [{index}] {title}.{key}: 期望 {expected[key]!r}，实际 {actual.get(key)!r}")
+    return failures
+
+
+def bench(func, items, rounds) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for item in items:
+            func(item)
+    return (time.perf_counter() - start) / (rounds * len(items)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=2000)
+    parser.add_argument("--update", action="store_true", help="用旧实现重新生成 parsed.json")
+    args = parser.parse_args()
+
+    items = ET.parse(CORPUS).getroot().findall("./channel/item")
+    if args.update:
+        with open(GOLDEN, "w", encoding="utf-8") as f:
+            json.dump([to_json(legacy_parse_item(item)) for item in items], f, ensure_ascii=False, indent=2)
+        print(f"已写入 {GOLDEN}（{len(items)} 条）")
+        return
+
+    failures = check(items)
+    if failures:
+        sys.exit(f"解析结果和 parsed.json 不一致：{failures} 条")
+    print(f"回归检查通过：{len(items)} 条样本")
+
+    # 旧实现每次调用都会重新拼接并编译作者相关的正则，清掉缓存模拟真实运行时大量不同作者的情况
+    legacy_time = bench(lambda item: (re.purge(), legacy_parse_item(item)), items, args.rounds)
+    legacy_cached = bench(legacy_parse_item, items, args.rounds)
+    new_time = bench(parse_new, items, args.rounds)
+    print(f"== {len(items)} 条样本 x {args.rounds} 轮（每条平均）")
+    print(f"  旧实现（正则缓存未命中）  {legacy_time:7.1f} µs")
+    print(f"  旧实现（正则缓存命中）    {legacy_cached:7.1f} µs")
+    print(f"  item_parser               {new_time:7.1f} µs | {legacy_cached / new_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
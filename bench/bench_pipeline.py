@@ -0,0 +1,418 @@
+"""
+端到端离线基准：不连接 RSSHub、Deepseek、Mirai 和推特，完整跑一遍 seiyuu.py 的 抓取 -> 解析 -> 翻译 -> 下载
+-> 渲染 -> 上传 -> 发送，报告每分钟处理的推文数、各阶段耗时和内存峰值，用于比较不同版本的性能。
+
+- 录制的 RSS 来自 bench/corpus/items.xml（纯文字、多图、视频、引用、转推等形状），按 --items 复制，
+  每份的链接、正文和媒体地址都不同，翻译、下载、渲染、上传不会被缓存短路
+- 推文分成 --rounds 轮发布到 --feeds 个订阅源，每轮像真实 RSSHub 一样把新推文加在最前面，
+  然后调用一次 seiyuu.Twitter_seiyuu()
+- 模拟服务：mock_services.MockFeedServer 占用 RSSHub 的端口（默认 14607）并代替推特图床，
+  mock_services.MockDeepseekServer 代替 Deepseek，mock_mirai.MockMiraiServer 代替 mirai-api-http
+- seiyuu.py 在临时目录里运行：config.json 以仓库里的为基础，指向模拟服务，状态库、头像、媒体、截图都在临时目录，
+  每次都是冷启动；--set KEY=JSON 可以覆盖任意配置（默认不限速 DELIVERY_RATE=0，比较的是处理能力）
+- 内存峰值为本进程的最大常驻内存（Chromium 是子进程，不计入）；--tracemalloc 另外统计 Python 对象的峰值，但会明显拖慢
+
+没有安装 Chromium 时渲染阶段会失败，推文仍然以文字链接发出，结果里 render_pool.failed 会显示失败次数。
+
+--check 不跑基准，只在同样的环境里检查投递保证（失败时抛 AssertionError）：
+  某个群发送失败时推文不标记为已看、不保存 ETag，下次轮询重新下载并只补发给失败的群；置顶的旧推文不挡住排在它后面的新推文。
+
+用法：
+  python bench/bench_pipeline.py --items 60 --feeds 2 --rounds 3 --llm-latency 0.8 --json before.json
+  python bench/bench_pipeline.py --items 60 --feeds 2 --rounds 3 --llm-latency 0.8 --compare before.json
+  python bench/bench_pipeline.py --check
+"""
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+from contextlib import contextmanager
+from email.utils import format_datetime
+from datetime import datetime, timezone, timedelta
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+from requests.adapters import HTTPAdapter
+
+from mock_mirai import MockMiraiServer
+from mock_services import MockFeedServer, MockDeepseekServer
+
+CORPUS = os.path.join(BENCH_DIR, "corpus", "items.xml")
+TWITTER_HOSTS = ("pbs.twimg.com", "video.twimg.com")
+QUOTE_DIV = '<div class="rsshub-quote">'
+
+_STATUS_RE = re.compile(r'(/status/\d+)')
+_MEDIA_RE = re.compile(r'(https://pbs\.twimg\.com/media/\w+)')
+_VIDEO_RE = re.compile(r'(https://video\.twimg\.com/[^"?]+?)(\.mp4)')
+_LINK_RE = re.compile(r'<link>(.*?)</link>')
+
+
+# -------------------
+# 录制的 RSS
+# -------------------
+
+def load_corpus(path: str):
+    """返回 (channel 头部, [item XML 字符串])"""
+    with open(path, encoding="utf-8") as f:
+        xml = f.read()
+    head = xml[:xml.index("<item>")]
+    items = re.findall(r"<item>.*?</item>", xml, re.S)
+    return head, items
+
+
+def make_copy(item: str, copy: int) -> str:
+    """第 copy 份：链接、正文、媒体地址都加上编号"""
+    if copy == 0:
+        return item
+    item = _STATUS_RE.sub(rf"\g<1>{copy:04d}", item)
+    item = _MEDIA_RE.sub(rf"\g<1>B{copy}", item)
+    item = _VIDEO_RE.sub(rf"\g<1>-{copy}\g<2>", item)
+    start = item.find("<description><![CDATA[")
+    end = item.find("]]></description>")
+    if start < 0 or end < 0:
+        return item
+    desc = item[start:end]
+    marker = f"<br>No.{copy}"
+    desc = desc.replace(QUOTE_DIV, marker + QUOTE_DIV, 1) if QUOTE_DIV in desc else desc + marker
+    return item[:start] + desc + item[end:]
+
+
+def with_pub_date(item: str, when: datetime) -> str:
+    pub = f"<pubDate>{format_datetime(when, usegmt=True)}</pubDate>"
+    if "<pubDate>" in item:
+        return re.sub(r"<pubDate>.*?</pubDate>", pub, item, count=1)
+    return item.replace("</item>", pub + "</item>", 1)
+
+
+def build_items(total: int):
+    head, items = load_corpus(CORPUS)
+    copies = [make_copy(items[i % len(items)], i // len(items)) for i in range(total)]
+    return head, copies
+
+
+# -------------------
+# 运行环境
+# -------------------
+
+class LocalAdapter(HTTPAdapter):
+    """把 https://pbs.twimg.com/... 改写成 http://模拟服务/pbs.twimg.com/..."""
+
+    def __init__(self, base_url: str, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        request.url = f"{self.base_url}/{parts.netloc}{parts.path}" + (f"?{parts.query}" if parts.query else "")
+        return super().send(request, **kwargs)
+
+
+def parse_overrides(pairs) -> dict:
+    overrides = {}
+    for pair in pairs or ():
+        key, _, value = pair.partition("=")
+        try:
+            overrides[key] = json.loads(value)
+        except ValueError:
+            overrides[key] = value
+    return overrides
+
+
+def write_config(work_dir: str, args, feed, llm, mirai, feed_names) -> dict:
+    with open(os.path.join(ROOT, "config.json"), encoding="utf-8") as f:
+        config = json.load(f)
+    groups = [1001 + i for i in range(args.groups)]
+    config.update({
+        "MIRAI_API_URL": mirai.http_url,
+        "VERIFY_KEY": mirai.verify_key,
+        "MIRAI_WS_URL": "",
+        "QQ_ID": 10000,
+        "TARGET_IDs": groups,
+        "TARGET_IDs_list": groups,
+        "RSS_URLS": [feed.feed_url(name) for name in feed_names],
+        "base_url": llm.base_url,
+        "DELIVERY_RATE": 0,
+        "METRICS_PORT": 0,
+        "METRICS_JSONL_PATH": "metrics.jsonl",
+    })
+    config.update(parse_overrides(args.set))
+    with open(os.path.join(work_dir, "config.json"), "w", encoding="utf-8") as f:
+        json.dump(config, f, ensure_ascii=False, indent=4)
+    return config
+
+
+def peak_rss_mb() -> float:
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 单位是 KB，macOS 是字节
+        return round(peak / 1024 / (1024 if sys.platform == "darwin" else 1), 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return round(getattr(info, "peak_wset", info.rss) / 1024 / 1024, 1)
+    except ImportError:
+        return 0.0
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return ""
+
+
+# -------------------
+# 投递检查
+# -------------------
+
+def sent_links(mirai, target) -> list:
+    """模拟 Mirai 收到的发往 target 群的原文链接（按收到的顺序，可能重复）"""
+    return [
+        link
+        for sent_target, chain in list(mirai.sent) if sent_target == target
+        for part in chain if part.get("type") == "Plain"
+        for link in re.findall(r"原文链接：(\S+)", part.get("text", ""))
+    ]
+
+
+def check(args):
+    """投递保证的检查，失败时抛 AssertionError"""
+    args = argparse.Namespace(**dict(vars(args), groups=2))
+    ok_group, bad_group = 1001, 1002
+    head, items = build_items(5)
+    links = [_LINK_RE.search(item).group(1) for item in items]
+    now = datetime.now(timezone.utc)
+    # 编号越大越新
+    items = [with_pub_date(item, now - timedelta(minutes=len(items) - i)) for i, item in enumerate(items)]
+
+    with seiyuu_env(args, ["check"]) as (seiyuu, feed, llm, mirai):
+        url = feed.feed_url("check")
+        seen = seiyuu.get_seen_state()
+        fetcher = seiyuu.get_feed_fetcher()
+
+        def publish(order):
+            feed.publish("check", head + "".join(items[i] for i in order) + "</channel>\n</rss>\n")
+
+        # 一个群发送失败：推文不标记为已看，订阅源不保存 ETag
+        publish([2, 1, 0])
+        mirai.fail_targets = {bad_group}
+        seiyuu.poll_feed(url)
+        assert not any(link in seen for link in links[:3]), "有群没发出去的推文被标记为已看"
+        assert not fetcher._feed_state(url).get("etag"), "有推文没发完时保存了 ETag，下次会拿到 304 而不重试"
+        assert sorted(sent_links(mirai, ok_group)) == sorted(links[:3])
+        assert not sent_links(mirai, bad_group)
+
+        # 群恢复后：重新下载（不是 304），只补发给失败的群，全部标记为已看并保存 ETag
+        mirai.fail_targets = set()
+        already = sorted(sent_links(mirai, ok_group))
+        downloads = feed.counts.get("feed", 0)
+        seiyuu.poll_feed(url)
+        assert feed.counts.get("feed", 0) == downloads + 1, "失败后没有重新下载订阅源"
+        assert all(link in seen for link in links[:3]), "补发成功后没有标记为已看"
+        assert sorted(sent_links(mirai, bad_group)) == sorted(links[:3]), "失败的群没有收到补发"
+        assert sorted(sent_links(mirai, ok_group)) == already, "已经收到的群又收到了重发"
+        assert fetcher._feed_state(url).get("etag"), "全部发完后没有保存 ETag"
+
+        # 置顶的旧推文排在最前面，后面的新推文照样处理，旧推文不重复发送
+        publish([0, 4, 3, 2, 1])
+        seiyuu.poll_feed(url)
+        assert links[3] in seen and links[4] in seen, "置顶的旧推文挡住了后面的新推文"
+        for target in (ok_group, bad_group):
+            received = sent_links(mirai, target)
+            assert sorted(received) == sorted(links), f"群 {target} 收到的推文不对（每条应该正好一次）：{received}"
+
+        # 没有变化时拿到 304，不再发送
+        sent = len(mirai.sent)
+        not_modified = feed.counts.get("feed_304", 0)
+        seiyuu.poll_feed(url)
+        assert feed.counts.get("feed_304", 0) == not_modified + 1, "没有变化的订阅源没有走 304"
+        assert len(mirai.sent) == sent
+    print("检查通过：部分群失败不标记已看、只补发失败的群 / 失败后不保存 ETag / 置顶旧推文不挡住新推文 / 304")
+
+
+# -------------------
+# 基准
+# -------------------
+
+@contextmanager
+def seiyuu_env(args, feed_names):
+    """启动模拟服务，在临时目录里导入 seiyuu，返回 (seiyuu, feed, llm, mirai)；结束时关闭 seiyuu 和模拟服务"""
+    feed = MockFeedServer(args.feed_port, args.feed_latency, args.media_latency, video_kb=args.video_kb).start()
+    llm = MockDeepseekServer(0, args.llm_latency, args.llm_chunk_latency).start()
+    mirai = MockMiraiServer(0, args.mirai_latency, upload_latency=args.upload_latency).start()
+    work_dir = tempfile.mkdtemp(prefix="nchan-bench-")
+    cwd = os.getcwd()
+
+    try:
+        write_config(work_dir, args, feed, llm, mirai, feed_names)
+        # Translator 没有传 api_key/base_url，由 OpenAI 客户端从环境变量读取
+        os.environ["OPENAI_API_KEY"] = "bench"
+        os.environ["OPENAI_BASE_URL"] = llm.base_url
+        os.chdir(work_dir)
+        if args.tracemalloc:
+            tracemalloc.start()
+        import seiyuu
+
+        adapter = LocalAdapter(feed.url, pool_maxsize=max(1, seiyuu.DOWNLOAD_WORKERS))
+        for host in TWITTER_HOSTS:
+            seiyuu.get_downloader().session.mount(f"https://{host}/", adapter)
+        yield seiyuu, feed, llm, mirai
+        seiyuu.shutdown()
+    finally:
+        os.chdir(cwd)
+        for server in (feed, llm, mirai):
+            server.stop()
+        if args.keep:
+            print(f"运行目录保留在 {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def run(args) -> dict:
+    feed_names = [f"feed{i}" for i in range(args.feeds)]
+    head, items = build_items(args.items)
+
+    with seiyuu_env(args, feed_names) as (seiyuu, feed, llm, mirai):
+        start = time.perf_counter()
+        seiyuu.prepare_tailwind_css()
+        warmup = time.perf_counter() - start
+
+        published = {name: [] for name in feed_names}
+        per_round = -(-len(items) // args.rounds)
+        round_times = []
+        start = time.perf_counter()
+        for r in range(args.rounds):
+            batch = items[r * per_round:(r + 1) * per_round]
+            now = datetime.now(timezone.utc)
+            for i, item in enumerate(batch):
+                # 新推文放在最前面；同一轮里越靠后的越新
+                published[feed_names[i % len(feed_names)]].insert(0, with_pub_date(item, now))
+            for name in feed_names:
+                feed.publish(name, head + "".join(published[name][:args.feed_size]) + "</channel>\n</rss>\n")
+            round_start = time.perf_counter()
+            seiyuu.Twitter_seiyuu()
+            round_times.append(time.perf_counter() - round_start)
+        elapsed = time.perf_counter() - start
+
+        snapshot = seiyuu.get_metrics().snapshot()
+        components = {
+            "render_pool": seiyuu.get_render_pool().stats.snapshot(),
+            "translator": seiyuu.get_translator().stats.snapshot(),
+            "downloader": seiyuu.get_downloader().stats.snapshot(),
+            "upload_cache": seiyuu.get_upload_cache().snapshot(),
+        }
+    python_peak = tracemalloc.get_traced_memory()[1] if args.tracemalloc else 0
+
+    delivered = snapshot["counters"].get("items_delivered", 0)
+    stages = {
+        name: dict(s, total=round(s["avg"] * s["count"], 3))
+        for name, s in sorted(snapshot["stages"].items(), key=lambda kv: -kv[1]["avg"] * kv[1]["count"])
+    }
+    return {
+        "revision": git_revision(),
+        "args": {k: v for k, v in vars(args).items() if k not in ("json", "compare")},
+        "items": len(items),
+        "delivered": delivered,
+        "elapsed": round(elapsed, 2),
+        "warmup": round(warmup, 2),
+        "rounds": [round(t, 2) for t in round_times],
+        "items_per_minute": round(delivered / elapsed * 60, 1) if elapsed else 0.0,
+        "tweet_to_group": snapshot["tweet_to_group"],
+        "stages": stages,
+        "components": components,
+        "peak_rss_mb": peak_rss_mb(),
+        "python_peak_mb": round(python_peak / 1024 / 1024, 1),
+        "mock": {"feed": feed.counts, "deepseek": llm.counts, "mirai": mirai.counts},
+    }
+
+
+def report(result: dict, baseline: dict = None):
+    def delta(new, old):
+        if not old:
+            return ""
+        return f"  ({(new - old) / old * 100:+.0f}%)"
+
+    base_stages = (baseline or {}).get("stages", {})
+    print(f"== 版本 {result['revision'] or '?'} | {result['items']} 条推文 | "
+          f"{result['args']['feeds']} 个订阅源 x {result['args']['rounds']} 轮 | {result['args']['groups']} 个群")
+    print(f"  发送 {result['delivered']} 条，耗时 {result['elapsed']}s（每轮 {result['rounds']}），"
+          f"预热 {result['warmup']}s")
+    print(f"  吞吐 {result['items_per_minute']} 条/分钟"
+          + delta(result['items_per_minute'], (baseline or {}).get('items_per_minute')))
+    latency = result["tweet_to_group"]
+    print(f"  推文到群延迟 p50 {latency['p50']}s / p95 {latency['p95']}s / 最大 {latency['max']}s")
+    print(f"  内存峰值 {result['peak_rss_mb']} MB"
+          + (f"，Python 对象峰值 {result['python_peak_mb']} MB" if result['python_peak_mb'] else ""))
+    print(f"  {'阶段':<14}{'次数':>6}{'合计(s)':>10}{'平均(ms)':>10}{'p95(ms)':>10}{'字节':>12}")
+    for name, s in result["stages"].items():
+        old = base_stages.get(name, {}).get("avg")
+        print(f"  {name:<16}{s['count']:>6}{s['total']:>10.2f}{s['avg'] * 1000:>10.1f}"
+              f"{s['p95'] * 1000:>10.1f}{s['bytes']:>12}" + delta(s['avg'], old))
+    print(f"  组件统计 {result['components']}")
+    print(f"  模拟服务请求 {result['mock']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=60, help="推文总数（样本循环复制）")
+    parser.add_argument("--feeds", type=int, default=2)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--groups", type=int, default=2)
+    parser.add_argument("--feed-size", type=int, default=20, help="每个订阅源返回最新的多少条")
+    parser.add_argument("--feed-port", type=int, default=14607, help="模拟 RSSHub 的端口，seiyuu 用它判断 RSSHub 是否在运行")
+    parser.add_argument("--feed-latency", type=float, default=0.2)
+    parser.add_argument("--media-latency", type=float, default=0.05)
+    parser.add_argument("--video-kb", type=int, default=2048)
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="Deepseek 首 token 前的等待（秒）")
+    parser.add_argument("--llm-chunk-latency", type=float, default=0.05)
+    parser.add_argument("--mirai-latency", type=float, default=0.02)
+    parser.add_argument("--upload-latency", type=float, default=0.1)
+    parser.add_argument("--set", action="append", metavar="KEY=JSON", help="覆盖 config.json 的某一项，可重复")
+    parser.add_argument("--tracemalloc", action="store_true")
+    parser.add_argument("--keep", action="store_true", help="保留临时运行目录（日志、metrics.jsonl、截图）")
+    parser.add_argument("--verbose", action="store_true")
+    parser.add_argument("--json", help="结果写入 JSON 文件")
+    parser.add_argument("--compare", help="和之前 --json 保存的结果对比")
+    parser.add_argument("--check", action="store_true", help="只检查投递保证，不跑基准")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format="%(asctime)s %(threadName)s %(levelname)s %(message)s",
+    )
+    try:
+        if args.check:
+            return check(args)
+        result = run(args)
+    except OSError as e:
+        if args.feed_port and "address" in str(e).lower():
+            sys.exit(f"端口 {args.feed_port} 被占用（RSSHub 正在运行？），先关闭它或换 --feed-port：{e}")
+        raise
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    report(result, baseline)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
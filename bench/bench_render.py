@@ -0,0 +1,127 @@
+"""
+渲染基准：在现有两个卡片模板上对比
+  1) 固定 2160x8000 画布截图 + 裁白边（旧 lambda 裁剪 / 新查找表裁剪）
+  2) 按卡片实际高度截图（不再裁剪）
+
+用法：python bench/bench_render.py --runs 5
+需要 playwright 和 chromium（playwright install chromium）。
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from PIL import Image
+from jinja2 import Environment, FileSystemLoader
+from renderer import RenderPool, crop_whitespace
+
+TEMPLATE_DIR = os.path.join(ROOT, "html")
+OUTPUT_DIR = os.path.join(ROOT, "output", "bench")
+
+SAMPLE = {
+    "author": "大西亜玖璃",
+    "author_id": "aguri_onishi",
+    "desc_clean": "今日は<span style=\"color:#1da1f2;\">#ラブライブ</span> のイベントでした！<br>ありがとうございました✨",
+    "desc_zh": "今天是<span style=\"color:#1da1f2;\">#ラブライブ</span> 的活动！<br>谢谢大家✨",
+    "quote_clean": "本日のゲストは大西亜玖璃さんです！<br>お楽しみに",
+    "quote_zh": "今天的嘉宾是大西亜玖璃！<br>敬请期待",
+    "quoted_username": "staff_aguri",
+    "beijing_time_str": "星期六，2025.06.14 20:00:00",
+    "translate_source": "",
+    "avatar_path": "",
+    "avatar_quote": "",
+}
+
+
+def legacy_crop(filepath):
+    """改动前 text_to_image_html 里的裁剪写法，作为对照"""
+    img = Image.open(filepath)
+    gray = img.convert('L')
+    bbox = gray.point(lambda x: 0 if x == 255 else 255).getbbox()
+    if bbox:
+        img = img.crop(bbox)
+        img.save(filepath)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def summary(values):
+    return f"avg {statistics.mean(values):.3f}s | median {statistics.median(values):.3f}s"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--engine", default="playwright")
+    args = parser.parse_args()
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    env = Environment(loader=FileSystemLoader(TEMPLATE_DIR))
+    with open(os.path.join(TEMPLATE_DIR, "css2.css"), encoding="utf-8") as f:
+        css_content = f.read()
+    with open(os.path.join(TEMPLATE_DIR, "browser@4.js"), encoding="utf-8") as f:
+        js_content = f.read()
+
+    fixed_pool = RenderPool(size=1, engine=args.engine, fit_content=False)
+    fit_pool = RenderPool(size=1, engine=args.engine, fit_content=True)
+
+    try:
+        for template_name in ("seiyuu.html", "no-quote.html"):
+            template = env.get_template(template_name)
+            # 两种方式都使用同一份预编译 CSS，只比较截图和裁剪
+            try:
+                tailwind_css = fit_pool.compile_tailwind_css(
+                    template.render(**SAMPLE, css_content="", js_content=js_content, tailwind_css=""),
+                    OUTPUT_DIR,
+                )
+                html = template.render(**SAMPLE, css_content=css_content, js_content="", tailwind_css=tailwind_css)
+            except Exception:
+                html = template.render(**SAMPLE, css_content=css_content, js_content=js_content, tailwind_css="")
+
+            name = os.path.splitext(template_name)[0]
+            fixed_path = os.path.join(OUTPUT_DIR, f"{name}_fixed.png")
+            fit_path = os.path.join(OUTPUT_DIR, f"{name}_fit.png")
+            fixed_render, lambda_crop, lut_crop, fit_render = [], [], [], []
+
+            # 预热，避免把浏览器启动时间算进去
+            fixed_pool.render(html, fixed_path)
+            fit_pool.render(html, fit_path)
+
+            for _ in range(args.runs):
+                fixed_render.append(fixed_pool.render(html, fixed_path).elapsed)
+                lambda_copy = fixed_path.replace(".png", "_lambda.png")
+                shutil.copyfile(fixed_path, lambda_copy)
+                lambda_crop.append(timed(legacy_crop, lambda_copy))
+                lut_crop.append(timed(crop_whitespace, fixed_path))
+                fit_render.append(fit_pool.render(html, fit_path).elapsed)
+
+            with Image.open(fixed_path) as img:
+                fixed_size = img.size
+            with Image.open(fit_path) as img:
+                fit_size = img.size
+
+            print(f"== {template_name} ({args.runs} 次)")
+            print(f"  固定画布截图      {summary(fixed_render)}")
+            print(f"    + lambda 裁剪   {summary(lambda_crop)}")
+            print(f"    + 查找表裁剪    {summary(lut_crop)}")
+            print(f"    裁剪后尺寸 {fixed_size} | {os.path.getsize(fixed_path)} 字节")
+            print(f"  按内容截图        {summary(fit_render)}")
+            print(f"    输出尺寸 {fit_size} | {os.path.getsize(fit_path)} 字节")
+            total_old = statistics.mean(fixed_render) + statistics.mean(lambda_crop)
+            print(f"  单张总耗时 {total_old:.3f}s -> {statistics.mean(fit_render):.3f}s")
+    finally:
+        fixed_pool.shutdown()
+        fit_pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
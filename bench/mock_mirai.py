@@ -0,0 +1,237 @@
+"""
+本地模拟的 mirai-api-http，用于测试和基准，不连接真实的 QQ：
+  HTTP：/verify /bind /sessionInfo /release /uploadImage /file/upload /sendGroupMessage
+  WebSocket：/all、/message（syncId 原样返回，命令并发处理）
+每个命令按 latency 秒模拟 Mirai 的处理耗时，收到的消息记录在 server.sent 里；
+发往 server.fail_targets 里的群的消息返回错误码（模拟 Bot 被禁言），不记入 sent。
+
+单独运行：python bench/mock_mirai.py --port 18080 --latency 0.02
+"""
+import json
+import time
+import socket
+import base64
+import struct
+import hashlib
+import argparse
+import threading
+from itertools import count
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WS_MAGIC = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+def _read_frame(rfile):
+    """读一个客户端帧，返回 (opcode, payload)；连接关闭返回 (None, b'')"""
+    header = rfile.read(2)
+    if len(header) < 2:
+        return None, b''
+    opcode = header[0] & 0x0F
+    masked = header[1] & 0x80
+    length = header[1] & 0x7F
+    if length == 126:
+        length = struct.unpack(">H", rfile.read(2))[0]
+    elif length == 127:
+        length = struct.unpack(">Q", rfile.read(8))[0]
+    mask = rfile.read(4) if masked else b''
+    payload = rfile.read(length)
+    if masked:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return opcode, payload
+
+
+def _encode_frame(payload: bytes, opcode: int = 0x1) -> bytes:
+    length = len(payload)
+    if length < 126:
+        header = struct.pack(">BB", 0x80 | opcode, length)
+    elif length < 65536:
+        header = struct.pack(">BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack(">BBQ", 0x80 | opcode, 127, length)
+    return header + payload
+
+
+class MockMiraiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latency: float = 0.0, verify_key: str = "bench", upload_latency: float = None):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency = latency
+        self.upload_latency = latency if upload_latency is None else upload_latency
+        self.verify_key = verify_key
+        self.sessions = set()
+        self.sent = []
+        self.fail_targets = set()
+        self.counts = {}
+        self._ids = count(1)
+        self._lock = threading.Lock()
+
+    @property
+    def http_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}"
+
+    @property
+    def ws_url(self) -> str:
+        return f"ws://127.0.0.1:{self.server_port}/all"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="mock-mirai", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def new_session(self) -> str:
+        key = f"session-{next(self._ids)}"
+        with self._lock:
+            self.sessions.add(key)
+        return key
+
+    def handle_command(self, command: str, content: dict, session_key: str = None) -> dict:
+        """HTTP 和 WebSocket 共用的命令处理"""
+        self._count(command)
+        if command in ("uploadImage", "file/upload"):
+            time.sleep(self.upload_latency)
+        else:
+            time.sleep(self.latency)
+        if command == "verify":
+            if content.get("verifyKey") != self.verify_key:
+                return {"code": 1, "msg": "Auth Key错误"}
+            return {"code": 0, "session": self.new_session()}
+        if session_key is not None and session_key not in self.sessions:
+            return {"code": 3, "msg": "Session失效或者不存在"}
+        if command == "release":
+            with self._lock:
+                self.sessions.discard(session_key)
+            return {"code": 0, "msg": "success"}
+        if command == "sendGroupMessage":
+            if content.get("target") in self.fail_targets:
+                self._count("sendGroupMessage_failed")
+                return {"code": 20, "msg": "Bot被禁言"}
+            with self._lock:
+                self.sent.append((content.get("target"), content.get("messageChain")))
+                message_id = len(self.sent)
+            return {"code": 0, "msg": "success", "messageId": message_id}
+        if command == "uploadImage":
+            return {"imageId": f"{{{next(self._ids):08X}-0000-0000-0000-000000000000}}.png", "url": ""}
+        if command == "file/upload":
+            return {"code": 0, "msg": "success", "data": {"id": f"/file-{next(self._ids)}", "name": "video"}}
+        return {"code": 0, "msg": "success"}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: MockMiraiServer
+
+    def setup(self):
+        super().setup()
+        # 响应头和正文分两次写出，不关 Nagle 会和客户端的延迟 ACK 叠加出 40ms 级的等待
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, data: dict):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _form(self) -> dict:
+        """粗略解析 multipart 表单里的文本字段，图片/文件内容直接丢弃"""
+        length = int(self.headers.get("Content-Length", 0))
+        raw = self.rfile.read(length)
+        fields = {}
+        for part in raw.split(b"--"):
+            head, _, value = part.partition(b"\r\n\r\n")
+            if b'name="' not in head or b"filename=" in head:
+                continue
+            name = head.split(b'name="', 1)[1].split(b'"', 1)[0].decode()
+            fields[name] = value.rstrip(b"\r\n").decode("utf-8", "ignore")
+        return fields
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        if self.headers.get("Upgrade", "").lower() == "websocket":
+            return self._websocket(parse_qs(parsed.query))
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        self._reply(self.server.handle_command(parsed.path.strip("/"), query, query.get("sessionKey", "")))
+
+    def do_POST(self):
+        path = urlparse(self.path).path.strip("/")
+        if self.headers.get("Content-Type", "").startswith("multipart/"):
+            content = self._form()
+        else:
+            length = int(self.headers.get("Content-Length", 0))
+            content = json.loads(self.rfile.read(length) or b"{}")
+        session_key = None if path == "verify" else content.get("sessionKey", "")
+        self._reply(self.server.handle_command(path, content, session_key))
+
+    # ---- WebSocket ----
+    def _websocket(self, query: dict):
+        key = self.headers["Sec-WebSocket-Key"]
+        accept = base64.b64encode(hashlib.sha1((key + WS_MAGIC).encode()).digest()).decode()
+        self.send_response(101)
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", accept)
+        self.end_headers()
+        self.wfile.flush()
+
+        write_lock = threading.Lock()
+
+        def send(obj):
+            frame = _encode_frame(json.dumps(obj, ensure_ascii=False).encode("utf-8"))
+            with write_lock:
+                self.wfile.write(frame)
+                self.wfile.flush()
+
+        if query.get("verifyKey", [""])[0] != self.server.verify_key:
+            send({"syncId": "", "data": {"code": 1, "msg": "Auth Key错误"}})
+            self.close_connection = True
+            return
+        session_key = self.server.new_session()
+        send({"syncId": "", "data": {"code": 0, "session": session_key}})
+
+        def handle(payload):
+            request = json.loads(payload)
+            data = self.server.handle_command(request.get("command"), request.get("content") or {})
+            try:
+                send({"syncId": str(request.get("syncId")), "data": data})
+            except OSError:
+                pass
+
+        while True:
+            opcode, payload = _read_frame(self.rfile)
+            if opcode is None or opcode == 0x8:
+                break
+            if opcode == 0x9:
+                with write_lock:
+                    self.wfile.write(_encode_frame(payload, 0xA))
+                continue
+            if opcode == 0x1:
+                # 并发处理，响应顺序可能和请求顺序不同，客户端按 syncId 匹配
+                threading.Thread(target=handle, args=(payload,), daemon=True).start()
+        self.close_connection = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--latency", type=float, default=0.02)
+    args = parser.parse_args()
+    server = MockMiraiServer(args.port, args.latency)
+    print(f"mock mirai: {server.http_url} | {server.ws_url} | verifyKey={server.verify_key}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
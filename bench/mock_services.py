@@ -0,0 +1,260 @@
+"""
+基准用的本地模拟服务，和 mock_mirai.py 一起替代 seiyuu.py 依赖的外部服务：
+  MockFeedServer：代替 RSSHub 提供录制好的 RSS（支持 ETag / 304），同时代替 pbs.twimg.com / video.twimg.com
+                  返回头像、图片和视频（内容按扩展名生成，只生成一次）
+  MockDeepseekServer：OpenAI 兼容的 /v1/chat/completions，支持流式（SSE）、普通和批量 JSON 翻译
+每个请求按配置的延迟模拟服务端耗时，请求次数记录在 server.counts 里。
+
+单独运行：python bench/mock_services.py --feed-port 14607 --llm-port 18081 --llm-latency 0.5
+"""
+import io
+import os
+import json
+import time
+import random
+import socket
+import hashlib
+import argparse
+import threading
+from urllib.parse import urlparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, body: bytes, content_type: str, status: int = 200, headers: dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _CountingServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int, handler):
+        super().__init__(("127.0.0.1", port), handler)
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name=type(self).__name__, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+
+# -------------------
+# RSSHub + 推特图床
+# -------------------
+
+def _sample_image(size, fmt: str) -> bytes:
+    """带噪点的样图，编码后的大小接近真实照片，不会被压成几 KB"""
+    rng = random.Random(size[0] * 31 + size[1])
+    img = Image.new("RGB", size)
+    img.putdata([
+        (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+        for _ in range(size[0] * size[1] // 64)
+    ] * 64)
+    out = io.BytesIO()
+    if fmt == "JPEG":
+        img.save(out, fmt, quality=85)
+    else:
+        img.save(out, fmt)
+    return out.getvalue()
+
+
+class MockFeedServer(_CountingServer):
+    """
+    /feed/<名字> 返回 publish() 设置的 RSS；其他路径按 /<主机>/<路径> 当作推特图床请求：
+    profile_images 返回 400x400 头像，其余图片返回 media_size 的照片，.mp4 返回 video_kb 的随机数据。
+    """
+
+    def __init__(self, port: int = 0, latency: float = 0.0, media_latency: float = 0.0,
+                 media_size=(1200, 900), video_kb: int = 2048):
+        super().__init__(port, _FeedHandler)
+        self.latency = latency
+        self.media_latency = media_latency
+        self.feeds = {}
+        self._blobs = {
+            "avatar": _sample_image((400, 400), "JPEG"),
+            "jpg": _sample_image(tuple(media_size), "JPEG"),
+            "png": _sample_image((media_size[0] // 2, media_size[1] // 2), "PNG"),
+            "mp4": os.urandom(video_kb * 1024),
+        }
+
+    def feed_url(self, name: str) -> str:
+        return f"{self.url}/feed/{name}"
+
+    def publish(self, name: str, xml: str):
+        body = xml.encode("utf-8")
+        with self._lock:
+            self.feeds[name] = (body, '"' + hashlib.sha1(body).hexdigest()[:16] + '"')
+
+    def media(self, path: str, query: str) -> bytes:
+        if "/profile_images/" in path:
+            blob = self._blobs["avatar"]
+        elif path.endswith(".mp4"):
+            blob = self._blobs["mp4"]
+        elif path.endswith(".png") or "format=png" in query:
+            blob = self._blobs["png"]
+        else:
+            blob = self._blobs["jpg"]
+        # 图片结尾之后追加按路径生成的字节：不同 URL 内容不同，不会被媒体库和上传缓存按哈希去重
+        return blob + hashlib.sha1(path.encode("utf-8")).digest()
+
+
+class _FeedHandler(_QuietHandler):
+    server: MockFeedServer
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        if parsed.path.startswith("/feed/"):
+            time.sleep(self.server.latency)
+            with self.server._lock:
+                feed = self.server.feeds.get(parsed.path[len("/feed/"):])
+            if feed is None:
+                self.server.count("feed_404")
+                return self._reply(b"not found", "text/plain", 404)
+            body, etag = feed
+            if self.headers.get("If-None-Match") == etag:
+                self.server.count("feed_304")
+                return self._reply(b"", "application/xml", 304, {"ETag": etag})
+            self.server.count("feed")
+            self.server.count("bytes_sent", len(body))
+            return self._reply(body, "application/xml; charset=utf-8", headers={"ETag": etag})
+        time.sleep(self.server.media_latency)
+        body = self.server.media(parsed.path, parsed.query)
+        self.server.count("avatar" if "/profile_images/" in parsed.path else "media")
+        self.server.count("bytes_sent", len(body))
+        content_type = "video/mp4" if parsed.path.endswith(".mp4") else "image/jpeg"
+        self._reply(body, content_type)
+
+
+# -------------------
+# Deepseek（OpenAI 兼容接口）
+# -------------------
+
+def _fake_translation(text: str) -> str:
+    return f"（译）{text}"
+
+
+class MockDeepseekServer(_CountingServer):
+    """
+    latency 为首 token 前的等待，之后每个流式分块再等 chunk_latency；
+    普通和批量请求一次性等待 latency + chunks * chunk_latency。译文是原文加「（译）」前缀。
+    """
+
+    def __init__(self, port: int = 0, latency: float = 0.5, chunk_latency: float = 0.02, chunks: int = 8):
+        super().__init__(port, _DeepseekHandler)
+        self.latency = latency
+        self.chunk_latency = chunk_latency
+        self.chunks = max(1, chunks)
+
+    @property
+    def base_url(self) -> str:
+        return f"{self.url}/v1"
+
+    def answer(self, request: dict) -> str:
+        messages = request.get("messages") or []
+        user = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+        if (request.get("response_format") or {}).get("type") == "json_object":
+            segments = json.loads(user).get("segments", [])
+            return json.dumps({
+                "translations": [{"id": s["id"], "text": _fake_translation(s["text"])} for s in segments]
+            }, ensure_ascii=False)
+        return _fake_translation(user.split("\n", 1)[-1])
+
+
+class _DeepseekHandler(_QuietHandler):
+    server: MockDeepseekServer
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        if not urlparse(self.path).path.endswith("/chat/completions"):
+            return self._reply(b'{"error": "not found"}', "application/json", 404)
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        content = self.server.answer(request)
+        prompt_tokens = sum(len(m.get("content", "")) for m in request.get("messages", [])) // 3 + 1
+        completion_tokens = len(content.encode("utf-8")) // 3 + 1
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        self.server.count("tokens", usage["total_tokens"])
+        base = {"id": "bench", "created": int(time.time()), "model": request.get("model", "deepseek-chat")}
+
+        if not request.get("stream"):
+            self.server.count("batch" if request.get("response_format") else "completion")
+            time.sleep(self.server.latency + self.server.chunks * self.server.chunk_latency)
+            body = dict(base, object="chat.completion", usage=usage, choices=[{
+                "index": 0, "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content},
+            }])
+            return self._reply(json.dumps(body, ensure_ascii=False).encode("utf-8"), "application/json")
+
+        self.server.count("stream")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(self.server.latency)
+        step = max(1, -(-len(content) // self.server.chunks))
+        for i in range(0, len(content), step):
+            if i:
+                time.sleep(self.server.chunk_latency)
+            chunk = dict(base, object="chat.completion.chunk", choices=[{
+                "index": 0, "finish_reason": None, "delta": {"content": content[i:i + step]},
+            }])
+            self._write_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+        final = dict(base, object="chat.completion.chunk", choices=[], usage=usage)
+        self._write_chunk(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+        self._write_chunk(b"")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--feed-port", type=int, default=14607)
+    parser.add_argument("--llm-port", type=int, default=18081)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--corpus", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus", "items.xml"))
+    args = parser.parse_args()
+    feed = MockFeedServer(args.feed_port)
+    with open(args.corpus, encoding="utf-8") as f:
+        feed.publish("corpus", f.read())
+    feed.start()
+    llm = MockDeepseekServer(args.llm_port, args.llm_latency).start()
+    print(f"mock rsshub: {feed.feed_url('corpus')} | mock deepseek: {llm.base_url}")
+    threading.Event().wait()
+
+
+if __name__ == "__main__":
+    main()
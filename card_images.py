@@ -0,0 +1,136 @@
+import os
+import base64
+import hashlib
+import logging
+import threading
+from typing import Optional
+from collections import OrderedDict
+
+from PIL import Image
+
+
+# -------------------
+# 卡片用到的图片处理
+# -------------------
+
+# 模板里 body 的 zoom，头像按显示尺寸乘以它缩放，截图里不会糊
+CARD_ZOOM = 4
+MIME_TYPES = {'jpg': 'jpeg', 'jpeg': 'jpeg', 'png': 'png', 'gif': 'gif', 'webp': 'webp', 'svg': 'svg+xml'}
+CARD_FORMATS = {'png': '.png', 'jpeg': '.jpg', 'webp': '.webp'}
+
+
+def image_to_base64(image_path: str) -> Optional[str]:
+    if not image_path or not os.path.exists(image_path):
+        return None
+    try:
+        with open(image_path, "rb") as img_file:
+            encoded = base64.b64encode(img_file.read()).decode("utf-8")
+            ext = os.path.splitext(image_path)[1][1:].lower()  # jpg/png/svg 等
+            return f"data:image/{MIME_TYPES.get(ext, ext)};base64,{encoded}"
+    except Exception as e:
+        logging.warning(f"Base64 编码失败：{e}")
+        return None
+
+
+def _has_alpha(img: Image.Image) -> bool:
+    return img.mode in ('RGBA', 'LA', 'PA') or (img.mode == 'P' and 'transparency' in img.info)
+
+
+class AvatarCache:
+    """
+    头像预处理缓存：
+    - 每个头像按显示尺寸 x CARD_ZOOM 缩小一次（400x400 -> 192x192 / 96x96），缩略图保存在 cache_dir，重启后复用
+    - 缩略图的 data URI 保存在内存里，卡片直接内联，渲染时浏览器不再从磁盘读取原图
+    - 原图被更新（修改时间或大小变化）时重新生成
+    """
+
+    def __init__(self, cache_dir: str, zoom: int = CARD_ZOOM, max_entries: int = 1024):
+        self.cache_dir = cache_dir
+        self.zoom = zoom
+        self.max_entries = max_entries
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._uris = OrderedDict()  # (原图路径, 显示尺寸) -> ((mtime, size), data URI)
+        self.hits = 0
+        self.resized = 0
+
+    def _thumbnail(self, path: str, pixels: int, st: os.stat_result) -> str:
+        name = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:16]
+        with Image.open(path) as img:
+            img.load()
+            alpha = _has_alpha(img)
+            ext = '.png' if alpha else '.jpg'
+            thumb_path = os.path.join(self.cache_dir, f"{name}_{pixels}{ext}")
+            if os.path.exists(thumb_path) and os.path.getmtime(thumb_path) >= st.st_mtime:
+                return thumb_path
+            img = img.convert('RGBA' if alpha else 'RGB')
+            if img.width > pixels or img.height > pixels:
+                # 模板里头像固定为正方形，和浏览器的拉伸效果保持一致
+                img = img.resize((pixels, pixels), Image.LANCZOS)
+        tmp_path = f"{thumb_path}.tmp"
+        if alpha:
+            img.save(tmp_path, 'PNG', optimize=True)
+        else:
+            img.save(tmp_path, 'JPEG', quality=92, optimize=True)
+        os.replace(tmp_path, thumb_path)
+        self.resized += 1
+        return thumb_path
+
+    def data_uri(self, path: str, size: int) -> Optional[str]:
+        """path 头像在 size 像素显示时使用的 data URI；处理失败返回 None，调用方退回文件路径"""
+        if not path:
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        key = (path, size)
+        version = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            cached = self._uris.get(key)
+            if cached and cached[0] == version:
+                self._uris.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+        try:
+            uri = image_to_base64(self._thumbnail(path, size * self.zoom, st))
+        except Exception as e:
+            logging.warning(f"头像预处理失败：{path} - {e}")
+            return None
+        if uri:
+            with self._lock:
+                self._uris[key] = (version, uri)
+                self._uris.move_to_end(key)
+                while len(self._uris) > self.max_entries:
+                    self._uris.popitem(last=False)
+        return uri
+
+    def snapshot(self) -> dict:
+        return {"entries": len(self._uris), "hits": self.hits, "resized": self.resized}
+
+
+def encode_card(src: str, dst: str, fmt: str = 'png', width: int = 0, quality: int = 90) -> int:
+    """
+    输出编码阶段：把截图 src 缩放到 width（0 为不缩放，只缩小不放大）并编码为 fmt 写入 dst，返回文件大小。
+    png 不需要缩放时直接把截图改名为 dst，不再解码重编码（重新压缩几乎不减小体积却很耗 CPU）；
+    jpeg 关闭色度抽样，文字边缘不发虚；webp 使用最慢也最小的压缩方式。
+    """
+    with Image.open(src) as img:
+        # 只读文件头，不解码像素
+        resize = bool(width and img.width > width)
+    if fmt == 'png' and not resize:
+        os.replace(src, dst)
+        return os.path.getsize(dst)
+    with Image.open(src) as img:
+        img.load()
+        if resize:
+            img = img.resize((width, round(img.height * width / img.width)), Image.LANCZOS)
+        tmp_path = f"{dst}.tmp"
+        if fmt == 'jpeg':
+            img.convert('RGB').save(tmp_path, 'JPEG', quality=quality, optimize=True, progressive=True, subsampling=0)
+        elif fmt == 'webp':
+            img.save(tmp_path, 'WEBP', quality=quality, method=6)
+        else:
+            img.save(tmp_path, 'PNG')
+    os.replace(tmp_path, dst)
+    return os.path.getsize(dst)
@@ -0,0 +1,198 @@
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+
+
+# -------------------
+# 按群分队列发送
+# -------------------
+
+class DeliveryStopped(Exception):
+    """发送队列已经关闭，推文没有发出"""
+
+
+def _percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class RateLimiter:
+    """令牌桶：平均每秒 rate 次，最多连续 burst 次"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class _GroupWorker(threading.Thread):
+    """一个群一个线程：按提交顺序依次发送，群与群之间互不等待"""
+
+    # 每个群保留最近多少次发送延迟用于计算分位数
+    RECENT = 200
+
+    def __init__(self, dispatcher: "GroupDispatcher", target):
+        super().__init__(name=f"group-{target}", daemon=True)
+        self.dispatcher = dispatcher
+        self.target = target
+        self.jobs = queue.Queue()
+        self.limiter = RateLimiter(dispatcher.rate, dispatcher.burst)
+        self.delivered = 0
+        self.failed = 0
+        self.latencies = []
+        self._lock = threading.Lock()
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            func, enqueued_at, done = job
+            try:
+                func(self.target)
+            except Exception as e:
+                with self._lock:
+                    self.failed += 1
+                logging.error(f"发送到群 {self.target} 出错：{e}")
+                done(self.target, e)
+                continue
+            latency = time.monotonic() - enqueued_at
+            with self._lock:
+                self.delivered += 1
+                self.latencies.append(latency)
+                del self.latencies[:-self.RECENT]
+            done(self.target, None)
+
+    def drain(self):
+        """取出还没开始发送的任务，通知它们已取消"""
+        while True:
+            try:
+                job = self.jobs.get_nowait()
+            except queue.Empty:
+                return
+            if job is not None:
+                job[2](self.target, DeliveryStopped())
+
+
+class GroupDispatcher:
+    """
+    多群发送：
+    - 每个群一个有序队列和一个发送线程，同一个群里推文顺序不变，各群并行发送，慢的群不拖住其他群
+    - 每个群一个令牌桶（rate 次/秒，burst 次突发），所有发往该群的 Mirai 调用都先经过 call() 限速
+    - call() 对失败的调用按 retries 次指数退避重试；发群消息这类重发会重复的调用由 retry_if 限定可重试的错误
+    - 记录每个群从入队到发完的延迟（平均 / p95 / 最大）
+    """
+
+    def __init__(self, targets, rate: float = 1.0, burst: int = 3,
+                 retries: int = 3, retry_delay: float = 2.0):
+        self.rate = rate
+        self.burst = burst
+        self.retries = max(1, retries)
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+        self._stopping = False
+        self._workers = {target: _GroupWorker(self, target) for target in targets}
+        for worker in self._workers.values():
+            worker.start()
+
+    def submit(self, func) -> Future:
+        """
+        把 func(target) 排进每个群的队列，返回所有群都处理完时完成的 Future，
+        结果为 {target: 异常或 None}。
+        """
+        result = Future()
+        results = {}
+        remaining = [len(self._workers)]
+        lock = threading.Lock()
+
+        def done(target, error):
+            with lock:
+                results[target] = error
+                remaining[0] -= 1
+                finished = remaining[0] == 0
+            if finished:
+                if any(isinstance(e, DeliveryStopped) for e in results.values()):
+                    result.set_exception(DeliveryStopped())
+                else:
+                    result.set_result(results)
+
+        with self._lock:
+            if self._stopping:
+                raise DeliveryStopped()
+            if not self._workers:
+                result.set_result({})
+                return result
+            now = time.monotonic()
+            for worker in self._workers.values():
+                worker.jobs.put((func, now, done))
+        return result
+
+    def call(self, target, func, retry_if=None):
+        """
+        在 target 群的限速下执行一次 Mirai 调用，返回 func() 的结果。
+        失败时重试；retry_if(异常) 为 False 的错误直接抛出，不传时任何异常都重试。
+        """
+        worker = self._workers.get(target)
+        for attempt in range(self.retries):
+            if worker:
+                worker.limiter.acquire()
+            try:
+                return func()
+            except Exception as e:
+                error = e
+            if retry_if is not None and not retry_if(error):
+                raise error
+            if attempt + 1 < self.retries:
+                delay = self.retry_delay * (2 ** attempt)
+                logging.warning(f"群 {target} 调用失败（第 {attempt+1} 次），{delay:.0f}s 后重试：{error}")
+                time.sleep(delay)
+        raise error
+
+    def snapshot(self) -> dict:
+        stats = {}
+        for target, worker in self._workers.items():
+            with worker._lock:
+                latencies = list(worker.latencies)
+                delivered, failed = worker.delivered, worker.failed
+            stats[target] = {
+                "delivered": delivered,
+                "failed": failed,
+                "pending": worker.jobs.qsize(),
+                "avg": round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+                "p95": round(_percentile(latencies, 95), 2),
+                "max": round(max(latencies), 2) if latencies else 0.0,
+            }
+        return stats
+
+    def shutdown(self, wait: bool = True):
+        """不再接收新推文；已经开始发送的推文发完，排队中的推文取消"""
+        with self._lock:
+            self._stopping = True
+        for worker in self._workers.values():
+            worker.drain()
+            worker.jobs.put(None)
+        if wait:
+            for worker in self._workers.values():
+                worker.join()
+        logging.info(f"发送队列已关闭 | 各群统计={self.snapshot()}")
@@ -0,0 +1,136 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# -------------------
+# 媒体/头像下载管理
+# -------------------
+
+DEFAULT_HEADERS = {'User-Agent': 'Mozilla/5.0'}
+# 读网络和写磁盘都按 1MB 一块，原来的 1KB 块对视频来说系统调用太多
+CHUNK_SIZE = 1024 * 1024
+
+
+class DownloadStats:
+    """下载量和吞吐统计，线程安全"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.failed = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def record(self, size: int, elapsed: float):
+        with self._lock:
+            self.count += 1
+            self.bytes += size
+            self.seconds += elapsed
+
+    def record_failure(self):
+        with self._lock:
+            self.failed += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            throughput = self.bytes / self.seconds if self.seconds else 0.0
+            return {
+                "count": self.count,
+                "failed": self.failed,
+                "bytes": self.bytes,
+                "seconds": round(self.seconds, 2),
+                "throughput_kbps": round(throughput / 1024, 1),
+            }
+
+
+class DownloadManager:
+    """
+    共享连接池的下载器：
+    - 一个 requests.Session，同一个主机（pbs.twimg.com / video.twimg.com）的连接复用
+    - 全局最多 workers 个下载同时进行；单条推文的媒体最多 per_item 个并行
+    - 先写到同目录的 .part 临时文件，下载完整后再原子改名，半截文件不会被当成已下载
+    """
+
+    def __init__(self, workers: int = 8, per_item: int = 4, timeout: float = 15,
+                 retries: int = 3, proxies: dict = None, verify: bool = False,
+                 chunk_size: int = CHUNK_SIZE):
+        self.per_item = max(1, per_item)
+        self.timeout = timeout
+        self.retries = retries
+        self.verify = verify
+        self.chunk_size = chunk_size
+        self.stats = DownloadStats()
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        if proxies:
+            self.session.proxies.update(proxies)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(1, workers))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="download")
+
+    def fetch(self, url: str, path: str) -> bool:
+        """下载 url 到 path，失败按 retries 重试，返回是否成功"""
+        filename = os.path.basename(path)
+        for attempt in range(self.retries):
+            tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.part"
+            start = time.perf_counter()
+            try:
+                with self.session.get(url, stream=True, timeout=self.timeout, verify=self.verify) as resp:
+                    resp.raise_for_status()
+                    size = 0
+                    with open(tmp_path, 'wb', buffering=self.chunk_size) as f:
+                        for chunk in resp.iter_content(self.chunk_size):
+                            f.write(chunk)
+                            size += len(chunk)
+                os.replace(tmp_path, path)
+            except Exception as e:
+                logging.warning(f"下载 {filename} 第 {attempt+1}/{self.retries} 次失败：{str(e)[:100]}")
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                if attempt + 1 < self.retries:
+                    time.sleep(1)
+                continue
+            elapsed = time.perf_counter() - start
+            self.stats.record(size, elapsed)
+            speed = size / elapsed / 1024 if elapsed else 0.0
+            logging.info(f"下载成功：{filename} | {size/1024:.0f}KB | {elapsed:.2f}s | {speed:.0f}KB/s")
+            return True
+        self.stats.record_failure()
+        logging.error(f"下载失败：{url}")
+        return False
+
+    def map(self, func, args_list) -> list:
+        """
+        在下载线程池里并行执行 func(*args)，同一次调用里最多 per_item 个同时进行，
+        按输入顺序返回结果（异常时对应位置为 None）。
+        """
+        limit = threading.BoundedSemaphore(self.per_item)
+        futures = []
+        for args in args_list:
+            limit.acquire()
+            future = self._pool.submit(func, *args)
+            future.add_done_callback(lambda _: limit.release())
+            futures.append(future)
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                logging.error(f"下载任务出错：{e}")
+                results.append(None)
+        return results
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+        self.session.close()
+        logging.info(f"下载器已关闭 | 统计={self.stats.snapshot()}")
@@ -0,0 +1,311 @@
+import re
+import logging
+from html import unescape
+from dataclasses import dataclass, field
+from datetime import datetime, timezone, timedelta
+from urllib.parse import urlparse
+
+
+# -------------------
+# RSS 条目解析
+# -------------------
+
+WEEKDAY_MAP = {
+    0: "星期一", 1: "星期二", 2: "星期三", 3: "星期四",
+    4: "星期五", 5: "星期六", 6: "星期天"
+}
+BEIJING_TZ = timezone(timedelta(hours=8))
+
+QUOTE_OPEN = '<div class="rsshub-quote">'
+QUOTE_CLOSE = '</div>'
+HIDDEN_IMG_PREFIX = '<img width="0" height="0" hidden="true"'
+PROFILE_IMAGE_PREFIX = "https://pbs.twimg.com/profile_images/"
+NAME_COLONS = ':：'
+
+# 所有正则只在模块加载时编译一次，作者名相关的匹配改用字符串查找，不再每条推文拼正则
+RT_PATTERN = re.compile(r'^(.+?)\s+RT\s*<br>', re.IGNORECASE)
+# 描述里关心的元素：<img> 标签和 <video> 块，一次扫描按出现顺序取出
+_ELEMENT_RE = re.compile(r'<img[^>]+>|<video[^>]+>.*?</video>', re.DOTALL)
+_IMG_RE = re.compile(r'<img[^>]+>')
+_SRC_RE = re.compile(r'src="([^"]+)"')
+_TAG_RE = re.compile(r'<[^>]+>')
+_ILLEGAL_NAME_RE = re.compile(r'[\\/:*?"<>|\s]')
+_HTML_TAG_RE = re.compile(r'<(?!br).*?>')
+_BR_RUN_RE = re.compile(r'(?:<br>){2,}')
+_SPACES_RE = re.compile(r'\s*')
+# 引用块头像后面紧跟的「用户名:」
+_NAME_COLON_RE = re.compile(r'([^:<]+?):')
+# 转推头像后面需要跟着用户名文字
+_AFTER_AVATAR_RE = re.compile(r'\s*[^:<\n]')
+# RSSHub 的 pubDate 固定是 "Sat, 14 Jun 2025 11:00:00 GMT"，直接取数字，比 strptime 快得多；其他格式仍交给 strptime
+_PUB_DATE_RE = re.compile(r'[A-Za-z]{3}, (\d{1,2}) ([A-Za-z]{3}) (\d{4}) (\d{2}):(\d{2}):(\d{2}) GMT$')
+_MONTHS = {m: i for i, m in enumerate(
+    ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'), 1)}
+
+
+def merge_consecutive_br(text: str) -> str:
+    """合并文本中连续的<br>标签为单个<br>"""
+    if not text:
+        return text
+    return _BR_RUN_RE.sub('<br>', text)
+
+
+def clean_html(text: str) -> str:
+    text = unescape(text)
+    # 清理其他HTML标签，保留<br>
+    text = _HTML_TAG_RE.sub('', text)
+    # 合并连续的<br>标签
+    return merge_consecutive_br(text)
+
+
+def extract_user_id(link: str) -> str:
+    """从推特URL提取用户ID"""
+    parsed = urlparse(link)
+    path_segments = [s for s in parsed.path.split('/') if s]
+    return path_segments[0] if path_segments else 'unknown_user'
+
+
+def sanitize_name(name: str) -> str:
+    """把用户名里不能用于文件名的字符和空白换成下划线"""
+    return _ILLEGAL_NAME_RE.sub('_', name.strip()).strip('_')
+
+
+def _find_name_colon(text: str, name: str, start: int = 0, first_line: bool = False):
+    """
+    查找第一处「name:」或「name：」，返回 (起点, 跳过冒号和其后空白的终点)，找不到返回 None。
+    first_line 时起点之前不能有换行（等价于原来的 ^.*?name[:：]）。
+    """
+    limit = len(text)
+    if first_line:
+        newline = text.find('\n')
+        if newline >= 0:
+            limit = newline
+    size = len(name)
+    pos = text.find(name, start)
+    while 0 <= pos <= limit:
+        colon = pos + size
+        if colon < len(text) and text[colon] in NAME_COLONS:
+            return pos, _SPACES_RE.match(text, colon + 1).end()
+        pos = text.find(name, pos + 1)
+    return None
+
+
+def _remove_name_colons(text: str, name: str) -> str:
+    """删除所有「name:」/「name：」及其后的空白"""
+    parts = []
+    start = 0
+    while True:
+        found = _find_name_colon(text, name, start)
+        if found is None:
+            break
+        parts.append(text[start:found[0]])
+        start = found[1]
+    if not parts:
+        return text
+    parts.append(text[start:])
+    return ''.join(parts)
+
+
+def _strip_leading_img(text: str) -> str:
+    m = _IMG_RE.match(text)
+    return text[m.end():] if m else text
+
+
+def _is_profile_src(src: str, marker: str) -> bool:
+    # 原正则要求标记前后至少各有一个字符
+    pos = src.find(marker, 1)
+    return pos >= 1 and pos + len(marker) < len(src)
+
+
+def _quote_avatar_url(block: str) -> str:
+    """引用块里第一个后面跟着用户名文字的推特头像（取标签里最后一个 src）"""
+    for m in _IMG_RE.finditer(block):
+        if not _AFTER_AVATAR_RE.match(block, m.end()):
+            continue
+        for src in reversed(_SRC_RE.findall(m.group(0))):
+            if _is_profile_src(src, 'pbs.twimg.com/profile_images/'):
+                return src
+    return ''
+
+
+@dataclass
+class ParsedItem:
+    link: str
+    author: str
+    author_id: str
+    author_avatar_url: str
+    categories: list
+    pub_dt_utc: datetime
+    beijing_time_str: str
+    is_retweet: bool
+    desc_clean: str
+    quote_clean: str
+    quoted_username: str
+    quote_avatar_url: str
+    quote_block_avatar_url: str
+    media_urls: list = field(default_factory=list)
+
+    def to_record(self) -> dict:
+        """转成流水线使用的 dict，后续阶段会往里面追加翻译、头像、图片路径等字段"""
+        return dict(self.__dict__)
+
+
+def parse_pub_date(pub_dt: str):
+    """RSS pubDate -> (UTC 时间, 北京时间字符串)"""
+    m = _PUB_DATE_RE.match(pub_dt)
+    month = _MONTHS.get(m.group(2)) if m else None
+    if month:
+        day, _, year, hour, minute, second = m.groups()
+        pub_dt_utc = datetime(int(year), month, int(day), int(hour), int(minute), int(second),
+                              tzinfo=timezone.utc)
+    else:
+        try:
+            pub_dt_gmt = datetime.strptime(pub_dt, '%a, %d %b %Y %H:%M:%S %Z')
+        except ValueError:
+            pub_dt_gmt = datetime.strptime(pub_dt.rstrip(' GMT'), '%a, %d %b %Y %H:%M:%S')
+        pub_dt_utc = pub_dt_gmt.replace(tzinfo=timezone.utc)
+    b = pub_dt_utc.astimezone(BEIJING_TZ)
+    beijing_time_str = (
+        f"{WEEKDAY_MAP[b.weekday()]}，{b.year}.{b.month:02}.{b.day:02} "
+        f"{b.hour:02}:{b.minute:02}:{b.second:02}"
+    )
+    return pub_dt_utc, beijing_time_str
+
+
+def parse_item(item) -> ParsedItem:
+    """
+    解析一个 RSS <item>：对描述 HTML 只扫描一遍取出所有 <img>/<video>，
+    再按位置切出正文和引用块。没有链接的条目返回 None。
+    """
+    link = item.findtext('link')
+    if not link:
+        return None
+
+    author_id = extract_user_id(link)
+    desc = item.findtext('description') or ''
+    author_text = item.findtext('author') or 'unknown'
+    author_clean = _TAG_RE.sub('', author_text)
+    author = sanitize_name(author_clean)
+    categories = ['#' + c.text.strip() for c in item.findall('category') if c.text]
+    pub_dt_utc, beijing_time_str = parse_pub_date(item.findtext('pubDate') or '')
+
+    # 一次扫描：按出现顺序记录所有 <img>（含 <video> 内部的）和 <video>
+    imgs = []    # (起点, 终点, 标签)
+    videos = []  # 标签
+    for m in _ELEMENT_RE.finditer(desc):
+        tag = m.group(0)
+        if tag.startswith('<img'):
+            imgs.append((m.start(), m.end(), tag))
+        else:
+            videos.append(tag)
+            for inner in _IMG_RE.finditer(tag):
+                imgs.append((m.start() + inner.start(), m.start() + inner.end(), inner.group(0)))
+
+    def quote_author(block_start: int, block_end: int):
+        """引用块里第一个「<img 头像>用户名:」，返回 (头像URL, 用户名)"""
+        for start, end, tag in imgs:
+            if start < block_start or end > block_end:
+                continue
+            name_match = _NAME_COLON_RE.match(desc, end)
+            if not name_match or name_match.end() > block_end:
+                continue
+            src = _SRC_RE.search(tag)
+            if src:
+                return unescape(src.group(1)), sanitize_name(name_match.group(1))
+        return None
+
+    # 原作者头像：第一个 src 含 /profile_images/ 的 <img>
+    author_avatar_url = ''
+    for _, _, tag in imgs:
+        src = next((s for s in _SRC_RE.findall(tag) if _is_profile_src(s, '/profile_images/')), None)
+        if src:
+            author_avatar_url = unescape(src)
+            break
+
+    quoted_username = ''
+    quote_avatar_url = ''
+    quote_block = ''
+    quote_clean = ''
+    desc_main_only = ''
+
+    rt_match = RT_PATTERN.match(desc)
+    if rt_match:
+        # 直接转发无评论：RT 之后的全部内容作为引用
+        quote_block = desc[rt_match.end():]
+        found = quote_author(rt_match.end(), len(desc))
+        if found:
+            quote_avatar_url, quoted_username = found
+            logging.info(f"提取到RT用户信息 - 用户名: {quoted_username}")
+            logging.info(f"提取到RT用户信息 - 头像URL: {quote_avatar_url}")
+            quote_block = _strip_leading_img(_remove_name_colons(quote_block, quoted_username))
+        quote_clean = clean_html(quote_block)
+        logging.info(f"[{author}] 检测到直接转发模式。")
+    else:
+        quote_pos = desc.find(QUOTE_OPEN)
+        desc_main_only = desc if quote_pos < 0 else desc[:quote_pos]
+
+        # 去掉正文开头的「作者名:」及其之前的头像等内容
+        found = _find_name_colon(desc_main_only, author)
+        if found:
+            desc_main_only = desc_main_only[found[1]:]
+        found = _find_name_colon(desc_main_only, author_clean, first_line=True)
+        if found:
+            desc_main_only = desc_main_only[found[1]:]
+        desc_main_only = desc_main_only.lstrip()
+
+        if quote_pos >= 0:
+            block_start = quote_pos + len(QUOTE_OPEN)
+            block_end = desc.find(QUOTE_CLOSE, block_start)
+            if block_end >= 0:
+                quote_block = desc[block_start:block_end]
+                found = quote_author(block_start, block_end)
+                if found:
+                    quote_avatar_url, quoted_username = found
+                    logging.info(f"提取到引用用户信息 - 用户名: {quoted_username}")
+                    logging.info(f"提取到引用用户信息 - 头像URL: {quote_avatar_url}")
+                    quote_block = _strip_leading_img(_remove_name_colons(quote_block, quoted_username))
+                quote_block = _strip_leading_img(quote_block)
+                quote_clean = clean_html(quote_block)
+
+    desc_clean = clean_html(desc_main_only) if desc_main_only else ''
+
+    # 媒体链接：跳过隐藏元素和头像，保持出现顺序去重，图片在前视频在后
+    media_urls = []
+    seen_urls = set()
+    for _, _, tag in imgs:
+        if tag.startswith(HIDDEN_IMG_PREFIX):
+            continue
+        src = _SRC_RE.search(tag)
+        if not src:
+            continue
+        u = unescape(src.group(1))
+        if u.startswith(PROFILE_IMAGE_PREFIX) or u in seen_urls:
+            continue
+        media_urls.append(u)
+        seen_urls.add(u)
+    for tag in videos:
+        if 'hidden="true"' in tag or 'style="display:none"' in tag:
+            continue
+        src = _SRC_RE.search(tag)
+        if src:
+            u = src.group(1).replace('&amp;', '&')
+            if u not in seen_urls:
+                media_urls.append(u)
+                seen_urls.add(u)
+
+    return ParsedItem(
+        link=link,
+        author=author,
+        author_id=author_id,
+        author_avatar_url=author_avatar_url,
+        categories=categories,
+        pub_dt_utc=pub_dt_utc,
+        beijing_time_str=beijing_time_str,
+        is_retweet=bool(rt_match),
+        desc_clean=desc_clean,
+        quote_clean=quote_clean,
+        quoted_username=quoted_username,
+        quote_avatar_url=quote_avatar_url,
+        quote_block_avatar_url=_quote_avatar_url(quote_block),
+        media_urls=media_urls,
+    )
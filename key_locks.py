@@ -0,0 +1,38 @@
+import threading
+from contextlib import contextmanager
+
+
+# -------------------
+# 按键加锁
+# -------------------
+
+class KeyLocks:
+    """
+    同一个键同时只有一个线程在处理，不同键互不影响：with key_locks.hold(key): ...
+    每个键的锁带使用者计数（持有的和正在等待的），最后一个使用者离开时才删掉，
+    字典不会随键无限增长，也不会出现还在等旧锁的线程和新建了锁的线程同时进入的情况。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks = {}  # 键 -> [锁, 使用者数]
+
+    @contextmanager
+    def hold(self, key):
+        with self._lock:
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = self._locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._locks)
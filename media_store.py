@@ -0,0 +1,216 @@
+import os
+import time
+import shutil
+import hashlib
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+from html import unescape
+from urllib.parse import urlparse, parse_qs
+
+from key_locks import KeyLocks
+
+
+# -------------------
+# 按内容寻址的媒体库
+# -------------------
+
+STORE_DIRNAME = '.store'
+HASH_CHUNK = 1024 * 1024
+
+
+def media_identity(url: str) -> str:
+    """
+    媒体 URL 的身份：去掉协议和尺寸等参数，同一张图的不同尺寸/链接写法视为同一个。
+    pbs.twimg.com/media/XXX?format=jpg&name=orig -> pbs.twimg.com/media/XXX.jpg
+    """
+    url = unescape(url.replace('&amp;', '&'))
+    parsed = urlparse(url)
+    path = parsed.path
+    if parsed.netloc == 'pbs.twimg.com' and path.startswith('/media/'):
+        fmt = parse_qs(parsed.query).get('format')
+        if fmt and '.' not in os.path.basename(path):
+            path = f"{path}.{fmt[0]}"
+    return f"{parsed.netloc}{path}"
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class MediaStore:
+    """
+    每个媒体文件只下载、保存一次：
+    - 实体文件按内容哈希存放在 root/.store/ab/<sha256>.<ext>
+    - 先按 URL 身份查找，命中就不再下载；没命中时下载后按内容哈希去重（不同链接的同一张图也只存一份）
+    - 原来的 root/<作者>/<日期>_<文件名> 改为指向实体文件的硬链接（不支持硬链接时直接返回实体文件路径），
+      并记录在索引里，可按作者和日期查询
+    """
+
+    def __init__(self, root: str, db_path: str, fetch):
+        # fetch(url, path) -> bool，负责把 url 下载到 path
+        self.root = root
+        self.fetch = fetch
+        self.store_dir = os.path.join(root, STORE_DIRNAME)
+        os.makedirs(self.store_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._key_locks = KeyLocks()
+        self.hits = 0
+        self.dedup_hits = 0
+        self.downloads = 0
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS media_blobs ("
+            " identity TEXT PRIMARY KEY,"
+            " sha256 TEXT NOT NULL,"
+            " ext TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS media_index ("
+            " path TEXT PRIMARY KEY,"
+            " sha256 TEXT NOT NULL,"
+            " author TEXT NOT NULL,"
+            " date TEXT NOT NULL,"
+            " identity TEXT NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_media_blobs_sha256 ON media_blobs(sha256)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_media_index_author_date ON media_index(author, date)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_media_index_sha256 ON media_index(sha256)")
+        self._conn.commit()
+
+    def blob_path(self, sha256: str, ext: str) -> str:
+        return os.path.join(self.store_dir, sha256[:2], f"{sha256}{ext}")
+
+    def _lookup(self, identity: str):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT sha256, ext FROM media_blobs WHERE identity = ?", (identity,)
+            ).fetchone()
+
+    def _add_blob(self, src: str, ext: str, move: bool):
+        """把文件放进实体库，返回 (sha256, 是否已经存在相同内容)"""
+        sha256 = file_sha256(src)
+        blob = self.blob_path(sha256, ext)
+        if os.path.exists(blob):
+            if move:
+                os.remove(src)
+            return sha256, True
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        if move:
+            os.replace(src, blob)
+        else:
+            try:
+                os.link(src, blob)
+            except OSError:
+                shutil.copyfile(src, blob)
+        return sha256, False
+
+    def _link(self, blob: str, path: str) -> str:
+        """在作者目录下建立硬链接，返回对外使用的路径"""
+        if os.path.exists(path):
+            return path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            os.link(blob, path)
+            return path
+        except OSError:
+            return blob
+
+    def _record(self, identity, sha256, ext, path, author, date):
+        now = time.time()
+        size = os.path.getsize(self.blob_path(sha256, ext))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO media_blobs (identity, sha256, ext, size, created_at) VALUES (?, ?, ?, ?, ?)",
+                (identity, sha256, ext, size, now)
+            )
+            self._conn.execute(
+                "INSERT OR IGNORE INTO media_index (path, sha256, author, date, identity, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (path, sha256, author, date, identity, now)
+            )
+            self._conn.commit()
+
+    def get(self, url: str, path: str, author: str) -> str:
+        """
+        取得 url 对应的媒体文件，path 是原来按 作者/日期_文件名 规则生成的路径。
+        返回可用的本地路径，下载失败返回 None。
+        """
+        identity = media_identity(url)
+        with self._key_locks.hold(identity):
+            return self._get(identity, url, path, author)
+
+    def _get(self, identity: str, url: str, path: str, author: str):
+        ext = os.path.splitext(path)[1].lower()
+        date = datetime.now().strftime("%Y%m%d")
+        row = self._lookup(identity)
+        if row and os.path.exists(self.blob_path(*row)):
+            sha256, ext = row
+            with self._lock:
+                self.hits += 1
+            logging.info(f"媒体库命中，跳过下载：{os.path.basename(path)}")
+        elif os.path.exists(path):
+            # 改造前下载的文件，直接收进媒体库
+            sha256, _ = self._add_blob(path, ext, move=False)
+        else:
+            tmp_name = hashlib.sha1(identity.encode('utf-8')).hexdigest()
+            tmp_path = os.path.join(self.store_dir, f"{tmp_name}.download")
+            if not self.fetch(url, tmp_path):
+                return None
+            sha256, existed = self._add_blob(tmp_path, ext, move=True)
+            with self._lock:
+                self.downloads += 1
+                if existed:
+                    self.dedup_hits += 1
+            if existed:
+                logging.info(f"内容与已有文件相同，只保存一份：{os.path.basename(path)}")
+        local_path = self._link(self.blob_path(sha256, ext), path)
+        self._record(identity, sha256, ext, local_path, author, date)
+        return local_path
+
+    def hash_for_path(self, path: str):
+        """查询某个本地路径对应的内容哈希，不在索引里返回 None"""
+        with self._lock:
+            row = self._conn.execute("SELECT sha256 FROM media_index WHERE path = ?", (path,)).fetchone()
+        return row[0] if row else None
+
+    def find(self, author: str = None, date_from: str = None, date_to: str = None) -> list:
+        """按作者和日期（YYYYMMDD，闭区间）查询索引"""
+        sql = "SELECT path, sha256, author, date, identity FROM media_index WHERE 1=1"
+        params = []
+        if author:
+            sql += " AND author = ?"
+            params.append(author)
+        if date_from:
+            sql += " AND date >= ?"
+            params.append(date_from)
+        if date_to:
+            sql += " AND date <= ?"
+            params.append(date_to)
+        sql += " ORDER BY date, path"
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [dict(zip(("path", "sha256", "author", "date", "identity"), row)) for row in rows]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            blobs = self._conn.execute("SELECT COUNT(DISTINCT sha256) FROM media_blobs").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "dedup_hits": self.dedup_hits,
+            "downloads": self.downloads,
+            "blobs": blobs,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
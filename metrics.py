@@ -0,0 +1,321 @@
+import json
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# -------------------
+# 流水线各阶段耗时统计
+# -------------------
+
+# Prometheus 指标名前缀
+PREFIX = 'nchan'
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _percentile(values, p: float) -> float:
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def _label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Summary:
+    """一个指标的累计次数、总和、字节数，以及最近 window 次的值（用于分位数）"""
+
+    def __init__(self, window: int = 500):
+        self.count = 0
+        self.total = 0.0
+        self.bytes = 0
+        self.max = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value: float, nbytes: int = 0):
+        self.count += 1
+        self.total += value
+        self.bytes += nbytes
+        self.max = max(self.max, value)
+        self.recent.append(value)
+
+    def snapshot(self) -> dict:
+        values = list(self.recent)
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 3) if self.count else 0.0,
+            "p50": round(_percentile(values, 50), 3),
+            "p95": round(_percentile(values, 95), 3),
+            "max": round(self.max, 3),
+            "bytes": self.bytes,
+        }
+
+
+class ItemTrace:
+    """
+    一条推文从解析到发完所有群的记录：各阶段耗时（同一阶段多次执行时累加）、字节数、次数，
+    以及发到每个群时距离 pubDate 的延迟。发送阶段多个群线程同时写，所以带锁。
+    """
+
+    def __init__(self, link: str, author: str, published: float):
+        self.link = link
+        self.author = author
+        self.published = published
+        self.started = time.time()
+        self.stages = {}
+        self.bytes = {}
+        self.counts = {}
+        self.latency = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float, nbytes: int = 0):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+            self.counts[stage] = self.counts.get(stage, 0) + 1
+            if nbytes:
+                self.bytes[stage] = self.bytes.get(stage, 0) + nbytes
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "type": "item",
+                "time": round(time.time(), 3),
+                "link": self.link,
+                "author": self.author,
+                "published": self.published,
+                "elapsed": round(time.time() - self.started, 3),
+                "stages": {k: round(v, 4) for k, v in self.stages.items()},
+                "bytes": dict(self.bytes),
+                "counts": dict(self.counts),
+                "latency": {str(k): round(v, 1) for k, v in self.latency.items()},
+            }
+
+
+class _Span:
+    """stage() 返回的计时块，块内可以补上字节数"""
+
+    __slots__ = ('bytes',)
+
+    def __init__(self):
+        self.bytes = 0
+
+
+class Metrics:
+    """
+    流水线埋点：
+    - stage(name) 计时一个阶段（抓取、解析、翻译、下载、截图、编码、上传、发送……），
+      计入全局统计，同时计入当前线程正在处理的推文（track(trace) 设置）
+    - 每条推文发完后 finish_item() 写一行 JSONL，每次轮询订阅源结束后 finish_cycle() 写一行汇总
+    - 记录每条推文从 pubDate 到发进每个群的延迟
+    - serve(port) 在本机开一个 Prometheus 文本格式的 /metrics；其他组件的 snapshot() 通过 add_collector 一并导出
+    """
+
+    def __init__(self, jsonl_path: str = '', window: int = 500):
+        self.jsonl_path = jsonl_path
+        self.window = window
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._local = threading.local()
+        self._stages = {}
+        self._latency = {}  # 群号 -> Summary
+        self._counters = {}
+        self._collectors = {}
+        self._server = None
+
+    # ---- 计时 ----
+
+    def observe(self, stage: str, seconds: float, nbytes: int = 0, trace: ItemTrace = None):
+        with self._lock:
+            summary = self._stages.get(stage)
+            if summary is None:
+                summary = self._stages[stage] = Summary(self.window)
+            summary.observe(seconds, nbytes)
+        trace = trace or self.current()
+        if trace is not None:
+            trace.add(stage, seconds, nbytes)
+
+    @contextmanager
+    def stage(self, name: str):
+        """with metrics.stage("render") as span: ...；块内抛异常也会记下耗时"""
+        span = _Span()
+        start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            self.observe(name, time.perf_counter() - start, span.bytes)
+
+    def count(self, name: str, n: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    # ---- 单条推文 ----
+
+    def current(self):
+        return getattr(self._local, 'trace', None)
+
+    @contextmanager
+    def track(self, trace: ItemTrace):
+        """块内当前线程的 stage() 计入 trace"""
+        previous = self.current()
+        self._local.trace = trace
+        try:
+            yield trace
+        finally:
+            self._local.trace = previous
+
+    def delivered(self, trace: ItemTrace, target):
+        """推文发进 target 群：记下距离 pubDate 的延迟"""
+        if trace is None or not trace.published:
+            return
+        latency = max(0.0, time.time() - trace.published)
+        with trace._lock:
+            trace.latency[target] = latency
+        with self._lock:
+            summary = self._latency.get(target)
+            if summary is None:
+                summary = self._latency[target] = Summary(self.window)
+            summary.observe(latency)
+
+    def finish_item(self, trace: ItemTrace):
+        self.count("items_delivered")
+        if trace is not None:
+            self._write(trace.to_dict())
+
+    def finish_cycle(self, feed: str, status: str, elapsed: float, fetch_bytes: int = 0,
+                     new_items: int = 0, traces=()):
+        """一次订阅源轮询结束：写一行汇总（各阶段耗时为本轮推文的合计）"""
+        self.count("cycles")
+        self.count("items_new", new_items)
+        if status == 'error':
+            self.count("cycles_failed")
+        stages, latencies = {}, []
+        for trace in traces:
+            item = trace.to_dict()
+            for stage, seconds in item["stages"].items():
+                stages[stage] = round(stages.get(stage, 0.0) + seconds, 4)
+            latencies.extend(item["latency"].values())
+        cycle = {
+            "type": "cycle",
+            "time": round(time.time(), 3),
+            "feed": feed,
+            "status": status,
+            "elapsed": round(elapsed, 3),
+            "fetch_bytes": fetch_bytes,
+            "new_items": new_items,
+            "delivered": len(traces),
+            "stages": stages,
+        }
+        if latencies:
+            cycle["latency_p50"] = round(_percentile(latencies, 50), 1)
+            cycle["latency_max"] = round(max(latencies), 1)
+            logging.info(
+                f"本轮 {feed} | 新推文 {new_items} 条，发送 {len(traces)} 条 | 耗时 {elapsed:.1f}s | "
+                f"推文到群延迟 p50 {cycle['latency_p50']}s / 最大 {cycle['latency_max']}s"
+            )
+        self._write(cycle)
+
+    def _write(self, entry: dict):
+        if not self.jsonl_path:
+            return
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._write_lock:
+            try:
+                with open(self.jsonl_path, 'a', encoding='utf-8') as f:
+                    f.write(line + '\n')
+            except OSError as e:
+                logging.warning(f"写入统计文件失败：{e}")
+
+    # ---- 导出 ----
+
+    def add_collector(self, name: str, collect):
+        """collect() 返回 {指标: 数值}（如各组件的 snapshot()），导出为 gauge；返回 None 时跳过"""
+        self._collectors[name] = collect
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stages = {name: s.snapshot() for name, s in self._stages.items()}
+            everyone = [v for s in self._latency.values() for v in s.recent]
+            latency = {
+                "count": sum(s.count for s in self._latency.values()),
+                "p50": round(_percentile(everyone, 50), 1),
+                "p95": round(_percentile(everyone, 95), 1),
+                "max": round(max((s.max for s in self._latency.values()), default=0.0), 1),
+            }
+            counters = dict(self._counters)
+        return {"stages": stages, "tweet_to_group": latency, "counters": counters}
+
+    def _summary_lines(self, lines, name: str, help_text: str, summaries: dict, label: str):
+        lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {PREFIX}_{name} summary")
+        for key, s in sorted(summaries.items(), key=lambda kv: str(kv[0])):
+            values = list(s.recent)
+            for q in QUANTILES:
+                lines.append(
+                    f'{PREFIX}_{name}{{{label}="{_label(key)}",quantile="{q}"}} {_percentile(values, q * 100):.6f}'
+                )
+            lines.append(f'{PREFIX}_{name}_sum{{{label}="{_label(key)}"}} {s.total:.6f}')
+            lines.append(f'{PREFIX}_{name}_count{{{label}="{_label(key)}"}} {s.count}')
+
+    def render_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            self._summary_lines(lines, "stage_seconds", "各阶段耗时（秒）", self._stages, "stage")
+            lines.append(f"# HELP {PREFIX}_stage_bytes_total 各阶段处理的字节数")
+            lines.append(f"# TYPE {PREFIX}_stage_bytes_total counter")
+            for stage, s in sorted(self._stages.items()):
+                if s.bytes:
+                    lines.append(f'{PREFIX}_stage_bytes_total{{stage="{_label(stage)}"}} {s.bytes}')
+            self._summary_lines(
+                lines, "tweet_to_group_seconds", "pubDate 到发进群的延迟（秒）", self._latency, "target"
+            )
+            for name, value in sorted(self._counters.items()):
+                lines.append(f"# TYPE {PREFIX}_{name}_total counter")
+                lines.append(f"{PREFIX}_{name}_total {value}")
+        for component, collect in sorted(self._collectors.items()):
+            try:
+                values = collect()
+            except Exception as e:
+                logging.debug(f"读取 {component} 统计失败：{e}")
+                continue
+            for key, value in sorted((values or {}).items()):
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                lines.append(f"# TYPE {PREFIX}_{component}_{key} gauge")
+                lines.append(f"{PREFIX}_{component}_{key} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port: int, host: str = '127.0.0.1'):
+        """在后台线程里提供 http://host:port/metrics"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True).start()
+        logging.info(f"统计接口已启动：http://{host}:{self._server.server_address[1]}/metrics")
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
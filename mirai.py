@@ -0,0 +1,325 @@
+import json
+import time
+import logging
+import itertools
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from urllib.parse import urlencode
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+try:
+    # 可选依赖：WebSocket 发送需要 websocket-client（pip install websocket-client）
+    import websocket
+except ImportError:
+    websocket = None
+
+
+# -------------------
+# mirai-api-http 客户端
+# -------------------
+
+# Mirai 状态码：3 Session 失效或不存在，4 Session 未认证
+SESSION_INVALID_CODES = (3, 4)
+
+
+class MiraiError(Exception):
+    """Mirai 返回 5xx 或无法解析的响应"""
+
+
+def request_not_sent(error: Exception) -> bool:
+    """
+    error 是否发生在连接建立之前（连接被拒绝、连接超时），即请求肯定没有到达 Mirai。
+    只有这类错误可以放心重发群消息；读超时、连接中途断开和 5xx 时消息可能已经发进群，重发会重复。
+    """
+    if not isinstance(error, requests.exceptions.ConnectionError):
+        return False
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, (urllib3.exceptions.NewConnectionError, urllib3.exceptions.ConnectTimeoutError))
+
+
+class MiraiWsTransport:
+    """
+    mirai-api-http 的 WebSocket 适配器（/all 或 /message），一条长连接发送所有命令：
+    - 每个命令带自增 syncId，后台读线程按 syncId 把响应交给对应的等待方，
+      多个线程可以同时发送，不必等前一个命令返回（流水线）
+    - 连接断开时所有等待中的命令立即失败，下一次调用时自动重连（间隔 reconnect_delay 秒）
+    - syncId 为 -1 的是 Mirai 推送的事件，直接忽略
+    """
+
+    def __init__(self, ws_url: str, verify_key: str, qq, timeout: float = 30, reconnect_delay: float = 5):
+        query = urlencode({"verifyKey": verify_key, "qq": qq})
+        self.url = f"{ws_url.rstrip('/')}{'&' if '?' in ws_url else '?'}{query}"
+        self.timeout = timeout
+        self.reconnect_delay = reconnect_delay
+        self._ws = None
+        self._pending = {}
+        self._sync_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._last_attempt = 0.0
+        self.reconnects = 0
+
+    @property
+    def connected(self) -> bool:
+        return self._ws is not None
+
+    def _connect(self):
+        """建立连接并读取 Mirai 返回的会话信息，调用方持有 self._lock"""
+        if websocket is None:
+            raise MiraiError("未安装 websocket-client")
+        now = time.monotonic()
+        if self._last_attempt and now - self._last_attempt < self.reconnect_delay:
+            raise MiraiError("WebSocket 重连冷却中")
+        self._last_attempt = now
+        ws = websocket.create_connection(self.url, timeout=self.timeout, enable_multithread=True)
+        try:
+            hello = json.loads(ws.recv())
+        except Exception:
+            ws.close()
+            raise
+        data = hello.get("data") or {}
+        if data.get("code", 0) != 0:
+            ws.close()
+            raise MiraiError(f"WebSocket 认证失败：{data}")
+        ws.settimeout(None)
+        self._ws = ws
+        self.reconnects += 1
+        threading.Thread(target=self._reader, args=(ws,), name="mirai-ws", daemon=True).start()
+        logging.info(f"Mirai WebSocket 已连接（第 {self.reconnects} 次）")
+
+    def _reader(self, ws):
+        while True:
+            try:
+                message = ws.recv()
+            except Exception as e:
+                self._disconnect(ws, e)
+                return
+            if not message:
+                continue
+            try:
+                payload = json.loads(message)
+            except ValueError:
+                continue
+            future = self._pending.pop(str(payload.get("syncId")), None)
+            if future is not None and not future.done():
+                future.set_result(payload.get("data") or {})
+
+    def _disconnect(self, ws, error):
+        with self._lock:
+            if self._ws is not ws:
+                return
+            self._ws = None
+            pending, self._pending = self._pending, {}
+        logging.warning(f"Mirai WebSocket 断开：{error}")
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError(f"WebSocket 断开：{error}"))
+        try:
+            ws.close()
+        except Exception:
+            pass
+
+    def submit(self, command: str, content: dict, sub_command: str = None) -> Future:
+        """发送一个命令，立即返回 Future[data]，不等待响应"""
+        with self._lock:
+            if self._ws is None:
+                self._connect()
+            ws = self._ws
+            sync_id = str(next(self._sync_ids))
+            future = Future()
+            future.sync_id = sync_id
+            self._pending[sync_id] = future
+        frame = json.dumps({
+            "syncId": sync_id,
+            "command": command,
+            "subCommand": sub_command,
+            "content": content,
+        }, ensure_ascii=False)
+        try:
+            with self._send_lock:
+                ws.send(frame)
+        except Exception as e:
+            self._pending.pop(sync_id, None)
+            self._disconnect(ws, e)
+            raise ConnectionError(f"WebSocket 发送失败：{e}") from e
+        return future
+
+    def command(self, command: str, content: dict, sub_command: str = None) -> dict:
+        return self.wait(self.submit(command, content, sub_command))
+
+    def wait(self, future: Future) -> dict:
+        """等待 submit() 返回的 Future，超过 timeout 抛 TimeoutError"""
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            # 超时的请求不会再有人等，从等待表里移除，响应晚到时直接丢弃
+            self._pending.pop(future.sync_id, None)
+            future.cancel()
+            raise
+
+    def close(self):
+        with self._lock:
+            ws, self._ws = self._ws, None
+        if ws is not None:
+            try:
+                ws.close()
+            except Exception:
+                pass
+
+
+class MiraiClient:
+    """
+    长期复用的 Mirai 会话：
+    - 所有 HTTP 调用走同一个 requests.Session，保持长连接
+    - 一个绑定好的 sessionKey 跨多次轮询复用；距上次确认超过 check_interval 秒时用 /sessionInfo 检查一次，
+      失效（或任一调用返回状态码 3/4）时才重新 /verify + /bind
+    - release() 在退出时释放会话，不在 Mirai 端留下无用的 session
+    - 提供 ws_url 时，发送消息优先走 WebSocket 长连接；WebSocket 不可用或出错时回退到 HTTP。
+      上传图片/文件是 multipart 请求，WebSocket 适配器不支持，始终走 HTTP
+    """
+
+    def __init__(self, api_url: str, verify_key: str, qq, pool_size: int = 8,
+                 timeout: float = 30, check_interval: float = 60, ws_url: str = None):
+        self.api_url = api_url.rstrip('/')
+        self.verify_key = verify_key
+        self.qq = qq
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size))
+        self.http.mount('http://', adapter)
+        self.http.mount('https://', adapter)
+        self._lock = threading.Lock()
+        self._session_key = None
+        self._checked_at = 0.0
+        self.verifies = 0
+        self.ws = None
+        self.ws_fallbacks = 0
+        if ws_url:
+            if websocket is None:
+                logging.warning("未安装 websocket-client，Mirai 消息发送回退到 HTTP")
+            else:
+                self.ws = MiraiWsTransport(ws_url, verify_key, qq, timeout=timeout)
+
+    # ---- 底层请求 ----
+    def _parse(self, res: requests.Response) -> dict:
+        if res.status_code >= 500:
+            raise MiraiError(f"HTTP {res.status_code}")
+        try:
+            data = res.json()
+        except ValueError:
+            data = {"code": -1, "msg": res.text[:200]}
+        if res.status_code != 200 and "code" not in data:
+            data["code"] = res.status_code
+        if data.get("code") in SESSION_INVALID_CODES:
+            self.invalidate()
+        return data
+
+    def post(self, path: str, **kwargs) -> dict:
+        return self._parse(self.http.post(f"{self.api_url}{path}", timeout=self.timeout, **kwargs))
+
+    def get(self, path: str, **kwargs) -> dict:
+        return self._parse(self.http.get(f"{self.api_url}{path}", timeout=self.timeout, **kwargs))
+
+    # ---- 会话管理 ----
+    def _verify(self) -> str:
+        data = self.post("/verify", json={"verifyKey": self.verify_key})
+        session_key = data.get("session")
+        if not session_key:
+            raise MiraiError(f"认证失败：{data}")
+        data = self.post("/bind", json={"sessionKey": session_key, "qq": self.qq})
+        if data.get("code", 0) != 0:
+            raise MiraiError(f"绑定失败：{data}")
+        self.verifies += 1
+        logging.info(f"Mirai 会话已建立（第 {self.verifies} 次认证）")
+        return session_key
+
+    def _is_valid(self, session_key: str) -> bool:
+        try:
+            data = self.get("/sessionInfo", params={"sessionKey": session_key})
+        except Exception as e:
+            logging.warning(f"检查 Mirai 会话失败：{e}")
+            return False
+        return data.get("code", 0) == 0
+
+    def session_key(self) -> str:
+        """返回可用的 sessionKey，必要时重新认证；认证失败抛 MiraiError"""
+        with self._lock:
+            now = time.monotonic()
+            if self._session_key and now - self._checked_at < self.check_interval:
+                return self._session_key
+            if not self._session_key or not self._is_valid(self._session_key):
+                if self._session_key:
+                    logging.warning("Mirai 会话已失效，重新认证")
+                self._session_key = self._verify()
+            self._checked_at = time.monotonic()
+            return self._session_key
+
+    def invalidate(self):
+        """让下一次 session_key() 重新检查会话"""
+        self._checked_at = 0.0
+
+    def release(self):
+        with self._lock:
+            session_key, self._session_key = self._session_key, None
+        if not session_key:
+            return
+        try:
+            self.post("/release", json={"sessionKey": session_key, "qq": self.qq})
+            logging.info("Mirai 会话已释放")
+        except Exception as e:
+            logging.warning(f"释放 Mirai 会话失败：{e}")
+
+    def close(self):
+        if self.ws is not None:
+            self.ws.close()
+        self.release()
+        self.http.close()
+
+    # ---- 接口 ----
+    def _with_session(self, session_key: str, func) -> dict:
+        """
+        用最新的 sessionKey 调用 func(session_key)（调用方传入的可能已经被重新认证替换）；
+        返回会话失效时重新认证并重试一次。
+        """
+        data = func(self._session_key or session_key)
+        if data.get("code") in SESSION_INVALID_CODES:
+            data = func(self.session_key())
+        return data
+
+    def upload_image(self, file_path: str, session_key: str):
+        def upload(key):
+            with open(file_path, 'rb') as img_file:
+                return self.post("/uploadImage", data={'sessionKey': key, 'type': 'group'},
+                                 files={'img': img_file})
+        return self._with_session(session_key, upload).get("imageId")
+
+    def upload_group_file(self, file_path: str, session_key: str, target_id):
+        def upload(key):
+            with open(file_path, 'rb') as file:
+                return self.post("/file/upload", files={'file': file}, data={
+                    'sessionKey': key,
+                    'type': 'group',
+                    'target': str(target_id),
+                    'path': '',
+                })
+        return (self._with_session(session_key, upload).get("data") or {}).get("id")
+
+    def send_group_message(self, session_key: str, target, message_chain: list) -> dict:
+        if self.ws is not None:
+            try:
+                future = self.ws.submit("sendGroupMessage", {"target": target, "messageChain": message_chain})
+            except Exception as e:
+                self.ws_fallbacks += 1
+                logging.warning(f"WebSocket 发送失败，改用 HTTP：{e}")
+            else:
+                # 帧已经发出，之后的超时或断线时消息可能已经发进群，不能再用 HTTP 重发
+                return self.ws.wait(future)
+        return self._with_session(session_key, lambda key: self.post("/sendGroupMessage", json={
+            "sessionKey": key,
+            "target": target,
+            "messageChain": message_chain,
+        }))
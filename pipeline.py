@@ -0,0 +1,163 @@
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+# -------------------
+# 分阶段并发处理流水线
+# -------------------
+
+class PipelineStopped(Exception):
+    """流水线已经关闭，不再接收新任务"""
+
+
+class ItemPipeline:
+    """
+    推文处理流水线：解析 -> 翻译/下载 -> 渲染 -> 发送
+    - 前三个阶段各有一个线程池，并发数分别配置，不同推文互相重叠执行
+    - 渲染好的推文按 order_key（pubDate）依次交给 dispatch（每个群一个有序队列），
+      同一个群里推文的先后顺序不变，不用等上一条在所有群发完
+    - shutdown() 会等正在执行的任务结束，未发送的推文不会被标记为已看，下次运行会重新处理
+    """
+
+    def __init__(self, parse, prepare, render, order_key,
+                 parse_workers=2, prepare_workers=4, render_workers=2,
+                 prefetch=None):
+        self.parse = parse
+        # prefetch(records) 在一批条目全部解析完后调用一次，用于批量翻译等跨条目的预处理
+        self.prefetch = prefetch
+        self.prepare = prepare
+        self.render = render
+        self.order_key = order_key
+        self._pools = {
+            "parse": ThreadPoolExecutor(max_workers=parse_workers, thread_name_prefix="parse"),
+            "prepare": ThreadPoolExecutor(max_workers=prepare_workers, thread_name_prefix="prepare"),
+            "render": ThreadPoolExecutor(max_workers=render_workers, thread_name_prefix="render-stage"),
+        }
+        self._stopping = threading.Event()
+
+    def _submit(self, stage: str, func, *args) -> Future:
+        if self._stopping.is_set():
+            raise PipelineStopped()
+        return self._pools[stage].submit(func, *args)
+
+    def _start_item(self, record) -> Future:
+        """把一条推文依次送进 翻译/下载、渲染 两个阶段，返回渲染完成时结束的 Future"""
+        done = Future()
+
+        def after_render(render_future):
+            if render_future.cancelled():
+                done.set_exception(PipelineStopped())
+            elif render_future.exception() is not None:
+                done.set_exception(render_future.exception())
+            else:
+                done.set_result(render_future.result())
+
+        def after_prepare(prepare_future):
+            if prepare_future.cancelled():
+                done.set_exception(PipelineStopped())
+                return
+            if prepare_future.exception() is not None:
+                done.set_exception(prepare_future.exception())
+                return
+            try:
+                self._submit("render", self.render, prepare_future.result()).add_done_callback(after_render)
+            except Exception as e:
+                done.set_exception(e)
+
+        try:
+            self._submit("prepare", self.prepare, record).add_done_callback(after_prepare)
+        except Exception as e:
+            done.set_exception(e)
+        return done
+
+    def run(self, raw_items, dispatch, on_delivered=None) -> int:
+        """
+        处理一批原始条目，阻塞到全部发送完（或流水线被关闭）为止。
+        dispatch(record) 把一条推文排进所有群的发送队列，返回全部群发完时完成的 Future；
+        on_delivered(record) 在该推文成功发进所有群后按顺序调用（在调用 run 的线程里执行）；
+        有任何一个群发送失败时不调用，推文保持未完成，下次运行重新处理（dispatch 负责跳过已经收到的群）。
+        返回成功发送的条目数。
+        每次调用的待处理和发送中状态都是局部的，多个订阅源可以同时调用 run，共用各阶段的线程池。
+        """
+        # 解析阶段
+        try:
+            parse_futures = [self._submit("parse", self.parse, raw) for raw in raw_items]
+        except PipelineStopped:
+            return 0
+        records = []
+        for future in parse_futures:
+            try:
+                record = future.result()
+            except Exception as e:
+                logging.error(f"解析条目失败：{e}")
+                continue
+            if record is not None:
+                records.append(record)
+
+        # 按发布时间排序，保证每个群里收到的顺序与发推顺序一致
+        records.sort(key=self.order_key)
+        if self.prefetch and records:
+            try:
+                self.prefetch(records)
+            except Exception as e:
+                logging.error(f"预处理失败，按单条处理：{e}")
+        pending = [(record, self._start_item(record)) for record in records]
+
+        delivered = 0
+        sending = deque()
+
+        def finish(record, future) -> bool:
+            """处理一条推文的发送结果，返回是否应该继续"""
+            nonlocal delivered
+            try:
+                results = future.result()
+            except Exception as e:
+                logging.warning(f"发送队列关闭，推文未发完所有群：{record.get('link')} -> {e!r}")
+                return False
+            failed = {target: error for target, error in results.items() if error is not None}
+            for target, error in failed.items():
+                logging.error(f"发送推文出错：{record.get('link')} -> 群 {target}: {error}")
+            if failed:
+                logging.warning(f"推文有 {len(failed)} 个群没有发出，不标记为已看：{record.get('link')}")
+                return True
+            delivered += 1
+            if on_delivered:
+                on_delivered(record)
+            return True
+
+        stopped = False
+        for record, ready in pending:
+            if self._stopping.is_set():
+                break
+            try:
+                ready_record = ready.result()
+            except Exception as e:
+                logging.error(f"处理推文失败，下次运行重试：{record.get('link')} -> {e}")
+                continue
+
+            try:
+                sending.append((ready_record, dispatch(ready_record)))
+            except Exception as e:
+                logging.warning(f"无法排入发送队列：{record.get('link')} -> {e!r}")
+                break
+            # 已经发完的推文及时标记，不等整批结束
+            while sending and sending[0][1].done():
+                if not finish(*sending.popleft()):
+                    stopped = True
+                    break
+            if stopped:
+                break
+
+        while sending and not stopped:
+            if not finish(*sending.popleft()):
+                break
+        return delivered
+
+    def shutdown(self, wait: bool = True):
+        """停止接收新任务并等待已经开始的任务结束"""
+        self._stopping.set()
+        for name in ("parse", "prepare", "render"):
+            self._pools[name].shutdown(wait=wait, cancel_futures=True)
+        logging.info("处理流水线已关闭")
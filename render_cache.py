@@ -0,0 +1,193 @@
+import os
+import uuid
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from key_locks import KeyLocks
+
+
+# -------------------
+# 卡片截图缓存
+# -------------------
+
+# 渲染中的临时文件前缀，启动扫描时清理上次残留的
+TMP_PREFIX = '.rendering-'
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg', '.webp')
+
+
+def render_key(html: str, files=(), extra: str = '') -> str:
+    """
+    卡片截图的缓存键：HTML（已包含模板和全部文字、翻译、时间）+ 引用的本地文件（头像）的大小和修改时间
+    + 影响截图结果的渲染设置。头像在原路径上被更新时键也会变。
+    """
+    digest = hashlib.sha256()
+    digest.update(extra.encode('utf-8'))
+    for path in files:
+        if not path:
+            continue
+        try:
+            st = os.stat(path)
+            digest.update(f"\0{path}:{st.st_size}:{st.st_mtime_ns}".encode('utf-8'))
+        except OSError:
+            digest.update(f"\0{path}:missing".encode('utf-8'))
+    digest.update(b"\0")
+    digest.update(html.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class RenderCache:
+    """
+    output 目录下的卡片截图缓存：
+    - 文件名就是缓存键（<sha256 前 32 位>.<ext>），内容相同的卡片直接返回已有图片，不再截图；
+      不同卡片不会因为同一秒生成而重名
+    - 先渲染到临时文件，完成后原子改名，半张图不会被其他线程拿到；同一张卡片同时只渲染一次
+    - 目录总大小超过 max_bytes 时按最近使用时间淘汰最旧的图片（包括改造前留下的时间戳命名的图片）；
+      render(..., pin=True) 返回的图片在 unpin 之前不会被淘汰，还在发送队列里的卡片不会被删掉
+    """
+
+    def __init__(self, root: str, max_bytes: int, ext: str = '.png'):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self.ext = ext
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._key_locks = KeyLocks()
+        self._entries = OrderedDict()  # 文件名 -> 大小，越靠后越新
+        self._pinned = {}  # 文件名 -> 使用中的次数，不参与淘汰
+        self._total = 0
+        self.hits = 0
+        self.renders = 0
+        self.evicted = 0
+        self._scan()
+        logging.info(f"截图缓存：{len(self._entries)} 张，{self._total / 1024 / 1024:.1f} MB")
+        self._evict()
+
+    def _scan(self):
+        files = []
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                if entry.name.startswith(TMP_PREFIX):
+                    # 上次退出时没渲染完的临时文件
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+                    continue
+                if not entry.name.lower().endswith(IMAGE_EXTS):
+                    continue
+                st = entry.stat()
+                files.append((st.st_mtime, entry.name, st.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._total += size
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.root, f"{key[:32]}{self.ext}")
+
+    def _pin(self, name: str):
+        # 调用方持有 self._lock
+        self._pinned[name] = self._pinned.get(name, 0) + 1
+
+    def unpin(self, path: str):
+        """render(..., pin=True) 返回的图片用完了，之后可以被淘汰"""
+        name = os.path.basename(path)
+        with self._lock:
+            count = self._pinned.get(name, 0)
+            if count > 1:
+                self._pinned[name] = count - 1
+            else:
+                self._pinned.pop(name, None)
+
+    def get(self, key: str, pin: bool = False):
+        """已缓存的截图路径，没有返回 None；pin 为 True 时返回的图片在 unpin 之前不会被淘汰"""
+        path = self.path_for(key)
+        name = os.path.basename(path)
+        with self._lock:
+            if name not in self._entries:
+                return None
+            self._entries.move_to_end(name)
+            if pin:
+                self._pin(name)
+        try:
+            # 修改时间作为最近使用时间，重启后按它恢复淘汰顺序
+            os.utime(path)
+        except OSError:
+            # 文件被手动删除了
+            with self._lock:
+                self._total -= self._entries.pop(name, 0)
+            if pin:
+                self.unpin(path)
+            return None
+        self.hits += 1
+        return path
+
+    def render(self, key: str, produce, pin: bool = False):
+        """
+        返回 key 对应的截图；没有缓存时调用 produce(临时路径) 渲染，成功返回 True。
+        渲染失败返回 None。pin 为 True 时返回的图片在 unpin 之前不会被淘汰。
+        """
+        path = self.get(key, pin)
+        if not path:
+            with self._key_locks.hold(key):
+                # 等锁期间可能已经被其他线程渲染好
+                return self.get(key, pin) or self._render(key, produce, pin)
+        logging.info(f"卡片内容未变，复用已有截图：{path}")
+        return path
+
+    def _render(self, key: str, produce, pin: bool):
+        path = self.path_for(key)
+        tmp_path = os.path.join(self.root, f"{TMP_PREFIX}{uuid.uuid4().hex[:8]}{self.ext}")
+        try:
+            if not produce(tmp_path):
+                return None
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        size = os.path.getsize(path)
+        name = os.path.basename(path)
+        with self._lock:
+            self._total += size - self._entries.pop(name, 0)
+            self._entries[name] = size
+            if pin:
+                self._pin(name)
+        self.renders += 1
+        self._evict()
+        return path
+
+    def _evict(self):
+        removed = []
+        with self._lock:
+            # 从最旧的开始淘汰，跳过使用中的图片，至少保留刚渲染的那一张
+            candidates = list(self._entries)[:-1] if self._total > self.max_bytes else ()
+            for name in candidates:
+                if self._total <= self.max_bytes:
+                    break
+                if name in self._pinned:
+                    continue
+                self._total -= self._entries.pop(name)
+                removed.append(name)
+        for name in removed:
+            try:
+                os.remove(os.path.join(self.root, name))
+            except OSError:
+                pass
+        if removed:
+            self.evicted += len(removed)
+            logging.info(f"截图缓存淘汰 {len(removed)} 张，当前 {self._total / 1024 / 1024:.1f} MB")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            files, total, pinned = len(self._entries), self._total, len(self._pinned)
+        return {
+            "files": files,
+            "pinned": pinned,
+            "mb": round(total / 1024 / 1024, 1),
+            "hits": self.hits,
+            "renders": self.renders,
+            "evicted": self.evicted,
+        }
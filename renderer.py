@@ -0,0 +1,358 @@
+import os
+import time
+import queue
+import logging
+import threading
+from pathlib import Path
+from dataclasses import dataclass
+from concurrent.futures import Future
+
+from PIL import Image
+from html2image import Html2Image
+
+try:
+    # 可选依赖：常驻浏览器需要 playwright（pip install playwright && playwright install chromium）
+    from playwright.sync_api import sync_playwright
+except ImportError:
+    sync_playwright = None
+
+
+# -------------------
+# 常驻浏览器渲染池
+# -------------------
+
+DEFAULT_VIEWPORT = (2160, 8000)
+# 按内容截图时页面只需要一个普通高度的视口，超出部分由 full_page 截图补齐
+FIT_VIEWPORT_HEIGHT = 1080
+# 卡片外框选择器，以及给 shadow-sm 阴影（zoom: 4 之后约 12~16px）留的边距
+CONTENT_SELECTOR = 'body > div'
+FIT_PADDING = 16
+
+# 渲染池里的任务类型
+JOB_SCREENSHOT = "screenshot"
+JOB_TAILWIND_CSS = "tailwind_css"
+
+# Tailwind 浏览器编译器会往 <head> 里追加一个以版权注释开头的 <style>
+_TAILWIND_READY_JS = (
+    "() => Array.from(document.querySelectorAll('style'))"
+    ".some(s => s.textContent.startsWith('/*! tailwindcss'))"
+)
+_TAILWIND_CSS_JS = (
+    "() => Array.from(document.querySelectorAll('style'))"
+    ".filter(s => s.textContent.startsWith('/*! tailwindcss'))"
+    ".map(s => s.textContent).join('\\n')"
+)
+
+
+@dataclass
+class RenderResult:
+    path: str
+    elapsed: float  # 单次渲染耗时（秒），不含排队时间
+    worker: int
+    fitted: bool = False  # 已按内容区域截图，不需要再裁剪白边
+
+
+# 255 映射为 0、其余映射为 255 的查找表：PIL 在 C 里一次查表完成，
+# 不用再为 point() 构造 lambda，也不用把整张图转成 Python 数据
+_NON_WHITE_LUT = [255] * 255 + [0]
+
+def crop_whitespace(filepath: str) -> bool:
+    """裁掉截图四周的纯白区域，返回是否发生了裁剪"""
+    with Image.open(filepath) as img:
+        img.load()
+        bbox = img.convert('L').point(_NON_WHITE_LUT).getbbox()
+        if not bbox or bbox == (0, 0) + img.size:
+            return False
+        cropped = img.crop(bbox)
+    cropped.save(filepath)
+    return True
+
+
+class RenderStats:
+    """渲染耗时统计，线程安全"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.failed = 0
+        self.restarts = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def record(self, elapsed: float):
+        with self._lock:
+            self.count += 1
+            self.total += elapsed
+            self.last = elapsed
+            self.max = max(self.max, elapsed)
+
+    def record_failure(self):
+        with self._lock:
+            self.failed += 1
+
+    def record_restart(self):
+        with self._lock:
+            self.restarts += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            avg = self.total / self.count if self.count else 0.0
+            return {
+                "count": self.count,
+                "failed": self.failed,
+                "restarts": self.restarts,
+                "avg": round(avg, 3),
+                "max": round(self.max, 3),
+                "last": round(self.last, 3),
+            }
+
+
+class _BrowserWorker(threading.Thread):
+    """
+    单个渲染线程，持有一个常驻 Chromium 实例。
+    playwright 的同步 API 不能跨线程使用，所以每个线程各自启动自己的浏览器。
+    """
+
+    def __init__(self, pool: "RenderPool", index: int):
+        super().__init__(name=f"render-{index}", daemon=True)
+        self.pool = pool
+        self.index = index
+        self._pw = None
+        self._browser = None
+        self._page = None
+        self._renders = 0
+
+    # ---- 浏览器生命周期 ----
+    def _launch(self):
+        if self._pw is None:
+            self._pw = sync_playwright().start()
+        self._browser = self._pw.chromium.launch(
+            headless=True,
+            args=['--hide-scrollbars', '--allow-file-access-from-files'],
+        )
+        height = FIT_VIEWPORT_HEIGHT if self.pool.fit_content else self.pool.viewport[1]
+        self._page = self._browser.new_page(
+            viewport={"width": self.pool.viewport[0], "height": height}
+        )
+        self._renders = 0
+        logging.info(f"[{self.name}] 浏览器已启动")
+
+    def _close_browser(self):
+        try:
+            if self._browser:
+                self._browser.close()
+        except Exception as e:
+            logging.warning(f"[{self.name}] 关闭浏览器出错：{e}")
+        self._browser = None
+        self._page = None
+
+    def _restart(self):
+        self.pool.stats.record_restart()
+        logging.warning(f"[{self.name}] 重启浏览器")
+        self._close_browser()
+        self._launch()
+
+    def _alive(self) -> bool:
+        return bool(self._browser and self._browser.is_connected() and self._page and not self._page.is_closed())
+
+    # ---- 渲染 ----
+    def _content_clip(self):
+        """在页面里量出卡片实际占用的区域（含阴影边距）"""
+        box = self._page.locator(CONTENT_SELECTOR).first.bounding_box()
+        if not box or box["width"] <= 0 or box["height"] <= 0:
+            return None
+        x = max(0, box["x"] - FIT_PADDING)
+        y = max(0, box["y"] - FIT_PADDING)
+        return {
+            "x": x,
+            "y": y,
+            "width": box["x"] + box["width"] + FIT_PADDING - x,
+            "height": box["y"] + box["height"] + FIT_PADDING - y,
+        }
+
+    def _run_job(self, kind: str, html: str, filepath: str):
+        output_dir = os.path.dirname(filepath)
+        # 和 Html2Image 一样落地成临时文件再用 file:// 打开，模板里的本地头像路径才能加载
+        tmp_html = os.path.join(output_dir, f".render_{self.index}.html")
+        with open(tmp_html, 'w', encoding='utf-8') as f:
+            f.write(html)
+        try:
+            self._page.goto(Path(tmp_html).as_uri(), wait_until='load', timeout=self.pool.timeout * 1000)
+            if kind == JOB_TAILWIND_CSS:
+                self._page.wait_for_function(_TAILWIND_READY_JS, timeout=self.pool.timeout * 1000)
+                return self._page.evaluate(_TAILWIND_CSS_JS)
+            if self.pool.fit_content:
+                clip = self._content_clip()
+                if clip:
+                    self._page.screenshot(path=filepath, clip=clip, full_page=True,
+                                          timeout=self.pool.timeout * 1000)
+                    return True
+                logging.warning(f"[{self.name}] 未找到卡片元素 {CONTENT_SELECTOR}，按整页截图")
+            self._page.screenshot(path=filepath, timeout=self.pool.timeout * 1000)
+            return False
+        finally:
+            try:
+                os.remove(tmp_html)
+            except OSError:
+                pass
+
+    def run(self):
+        try:
+            self._launch()
+        except Exception as e:
+            logging.error(f"[{self.name}] 浏览器启动失败：{e}")
+
+        while True:
+            job = self.pool._jobs.get()
+            if job is None:
+                break
+            kind, html, filepath, future = job
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            start = time.perf_counter()
+            last_error = None
+            output = None
+            # 第一次失败视为浏览器崩溃，重启后再试一次
+            for attempt in range(2):
+                try:
+                    if not self._alive():
+                        self._restart()
+                    output = self._run_job(kind, html, filepath)
+                    last_error = None
+                    break
+                except Exception as e:
+                    last_error = e
+                    logging.warning(f"[{self.name}] 渲染失败（第 {attempt+1} 次）：{e}")
+                    # 关掉当前浏览器，下一次循环开头会重新启动
+                    self._close_browser()
+
+            if last_error is not None:
+                self.pool.stats.record_failure()
+                future.set_exception(last_error)
+                continue
+
+            self._renders += 1
+            if kind == JOB_TAILWIND_CSS:
+                future.set_result(output)
+            else:
+                elapsed = time.perf_counter() - start
+                self.pool.stats.record(elapsed)
+                future.set_result(RenderResult(filepath, elapsed, self.index, fitted=bool(output)))
+
+            # 长时间运行的 Chromium 会慢慢涨内存，渲染一定次数后主动换一个
+            if self.pool.recycle_after and self._renders >= self.pool.recycle_after:
+                try:
+                    self._restart()
+                except Exception as e:
+                    logging.error(f"[{self.name}] 定期重启浏览器失败：{e}")
+
+        self._close_browser()
+        if self._pw is not None:
+            self._pw.stop()
+            self._pw = None
+
+
+class _Html2ImageWorker(threading.Thread):
+    """没有安装 playwright 时的回退实现：每张图仍然启动一次 Chromium（原有行为）"""
+
+    def __init__(self, pool: "RenderPool", index: int):
+        super().__init__(name=f"render-{index}", daemon=True)
+        self.pool = pool
+        self.index = index
+
+    def run(self):
+        while True:
+            job = self.pool._jobs.get()
+            if job is None:
+                break
+            kind, html, filepath, future = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            if kind == JOB_TAILWIND_CSS:
+                future.set_exception(NotImplementedError("Html2Image 无法提取 Tailwind 编译结果"))
+                continue
+            start = time.perf_counter()
+            try:
+                hti = Html2Image(output_path=os.path.dirname(filepath), size=self.pool.viewport)
+                hti.screenshot(html_str=html, save_as=os.path.basename(filepath))
+            except Exception as e:
+                self.pool.stats.record_failure()
+                future.set_exception(e)
+                continue
+            elapsed = time.perf_counter() - start
+            self.pool.stats.record(elapsed)
+            future.set_result(RenderResult(filepath, elapsed, self.index))
+
+
+class RenderPool:
+    """
+    常驻的 HTML 截图引擎：
+    - size 个浏览器实例跨多次 Twitter_seiyuu 运行保持打开，可并行渲染多张卡片
+    - 浏览器崩溃时自动重启，渲染 recycle_after 次后主动重启
+    - 每次渲染的耗时记录在 stats 中
+    - fit_content 时按卡片实际高度截图，不再截 2160x8000 的整张画布再裁白边
+    """
+
+    def __init__(self, size: int = 1, engine: str = "playwright",
+                 viewport=DEFAULT_VIEWPORT, timeout: int = 30, recycle_after: int = 200,
+                 fit_content: bool = True):
+        self.size = max(1, int(size))
+        self.viewport = tuple(viewport)
+        self.fit_content = fit_content
+        self.timeout = timeout
+        self.recycle_after = recycle_after
+        self.stats = RenderStats()
+        self._jobs = queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+
+        if engine == "playwright" and sync_playwright is None:
+            logging.warning("未安装 playwright，渲染池回退到 Html2Image（每张图启动一次浏览器）")
+            engine = "html2image"
+        self.engine = engine
+
+    def start(self):
+        with self._lock:
+            if self._workers:
+                return
+            worker_cls = _BrowserWorker if self.engine == "playwright" else _Html2ImageWorker
+            for i in range(self.size):
+                worker = worker_cls(self, i)
+                worker.start()
+                self._workers.append(worker)
+            logging.info(f"渲染池已启动 | 引擎={self.engine} | 并发={self.size}")
+
+    def submit(self, html: str, filepath: str) -> Future:
+        """提交渲染任务，返回 Future[RenderResult]"""
+        return self._submit(JOB_SCREENSHOT, html, filepath)
+
+    def _submit(self, kind: str, html: str, filepath: str) -> Future:
+        self.start()
+        future = Future()
+        self._jobs.put((kind, html, os.path.abspath(filepath), future))
+        return future
+
+    def render(self, html: str, filepath: str) -> RenderResult:
+        """阻塞渲染一张图"""
+        return self.submit(html, filepath).result()
+
+    def compile_tailwind_css(self, html: str, work_dir: str) -> str:
+        """
+        用浏览器里的 Tailwind 编译器跑一遍带 browser@4.js 的页面，
+        取出生成的 CSS，供之后的渲染直接内联，不必每张图都在浏览器里编译。
+        """
+        os.makedirs(work_dir, exist_ok=True)
+        return self._submit(JOB_TAILWIND_CSS, html, os.path.join(work_dir, "tailwind.css")).result()
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for _ in workers:
+            self._jobs.put(None)
+        if wait:
+            for worker in workers:
+                worker.join()
+        if workers:
+            logging.info(f"渲染池已关闭 | 统计={self.stats.snapshot()}")
@@ -0,0 +1,250 @@
+import io
+import os
+import json
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+import xml.etree.ElementTree as ET
+
+import requests
+
+
+# -------------------
+# 增量抓取 RSS
+# -------------------
+
+# 每个订阅源记住最近处理过的多少个链接，用于解析时提前停止
+MAX_MARKERS = 50
+# 连续遇到多少个已处理的条目后停止解析；置顶或顺序变化的旧推文只会被跳过，不会挡住后面的新推文
+STOP_AFTER_MARKERS = 3
+
+
+@dataclass
+class FeedResult:
+    url: str
+    status: str  # ok / not_modified / error
+    items: list = field(default_factory=list)  # 本次新出现的 <item>
+    links: list = field(default_factory=list)  # 本次解析到的所有链接（按订阅源顺序）
+    etag: str = None
+    last_modified: str = None
+    bytes: int = 0
+    fetch_time: float = 0.0
+    parse_time: float = 0.0
+    error: str = None
+
+
+class FeedFetcher:
+    """
+    增量抓取 RSS：
+    - 用上次保存的 ETag / Last-Modified 发条件请求，304 时不再下载和解析
+    - 记住每个订阅源最近处理过的链接，流式解析时跳过已处理的条目，连续遇到 STOP_AFTER_MARKERS 个后停止
+    - 状态保存在 state_path，只有本次的新条目都处理完（commit）后才推进，失败的条目下次还会被抓到
+    """
+
+    def __init__(self, state_path: str = 'feed_state.json', timeout: float = 40):
+        self.state_path = state_path
+        self.timeout = timeout
+        self.session = requests.Session()
+        self._lock = threading.Lock()
+        self._state = self._load_state()
+
+    def _load_state(self) -> dict:
+        if not os.path.exists(self.state_path):
+            return {}
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logging.warning(f"读取订阅源状态失败，重新开始：{e}")
+            return {}
+
+    def _save_state(self):
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def _feed_state(self, url: str) -> dict:
+        with self._lock:
+            return dict(self._state.get(url, {}))
+
+    def fetch(self, url: str) -> FeedResult:
+        feed_state = self._feed_state(url)
+        headers = {}
+        if feed_state.get('etag'):
+            headers['If-None-Match'] = feed_state['etag']
+        if feed_state.get('last_modified'):
+            headers['If-Modified-Since'] = feed_state['last_modified']
+
+        start = time.perf_counter()
+        try:
+            resp = self.session.get(url, timeout=self.timeout, headers=headers)
+            if resp.status_code == 304:
+                result = FeedResult(url, 'not_modified', fetch_time=time.perf_counter() - start)
+                logging.info(f"订阅源未更新(304)：{url} | 耗时 {result.fetch_time:.2f}s")
+                return result
+            resp.raise_for_status()
+            content = resp.content
+        except Exception as e:
+            return FeedResult(url, 'error', fetch_time=time.perf_counter() - start, error=str(e))
+        fetch_time = time.perf_counter() - start
+
+        # 流式解析，跳过已经处理过的条目，连续遇到几个就停止，不再解析剩下的旧条目
+        markers = set(feed_state.get('markers', []))
+        items, links = [], []
+        seen_in_row = 0
+        start = time.perf_counter()
+        try:
+            for _, elem in ET.iterparse(io.BytesIO(content), events=('end',)):
+                if elem.tag != 'item':
+                    continue
+                link = elem.findtext('link') or elem.findtext('guid')
+                links.append(link)
+                if link in markers:
+                    seen_in_row += 1
+                    if seen_in_row >= STOP_AFTER_MARKERS:
+                        break
+                    continue
+                seen_in_row = 0
+                items.append(elem)
+        except ET.ParseError as e:
+            return FeedResult(url, 'error', bytes=len(content), fetch_time=fetch_time, error=f"解析失败：{e}")
+        parse_time = time.perf_counter() - start
+
+        result = FeedResult(
+            url, 'ok', items=items, links=links,
+            etag=resp.headers.get('ETag'),
+            last_modified=resp.headers.get('Last-Modified'),
+            bytes=len(content), fetch_time=fetch_time, parse_time=parse_time,
+        )
+        logging.info(
+            f"抓取成功：{url} | {result.bytes} 字节 | 下载 {fetch_time:.2f}s | "
+            f"解析 {parse_time*1000:.1f}ms | 新条目 {len(items)}"
+        )
+        return result
+
+    def commit(self, result: FeedResult, is_done):
+        """
+        本轮处理结束后调用。is_done(link) 判断条目是否已经处理完。
+        处理完的链接记为标记；只有新条目全部处理完时才保存 ETag / Last-Modified，
+        否则清掉它们，保证下次会重新下载、重试失败的条目。
+        """
+        if result.status != 'ok':
+            return
+        links = [link for link in result.links if link]
+        # 解析连续遇到标记就停止，所以只有比所有未完成条目都旧的链接才能作为标记
+        pending = [i for i, link in enumerate(links) if not is_done(link)]
+        safe_links = links[pending[-1] + 1:] if pending else links
+        all_done = not pending
+        with self._lock:
+            feed_state = self._state.setdefault(result.url, {})
+            markers = safe_links + [m for m in feed_state.get('markers', []) if m not in safe_links]
+            feed_state['markers'] = markers[:MAX_MARKERS]
+            if all_done:
+                feed_state['etag'] = result.etag
+                feed_state['last_modified'] = result.last_modified
+            else:
+                feed_state.pop('etag', None)
+                feed_state.pop('last_modified', None)
+            self._save_state()
+
+
+# -------------------
+# 按订阅源独立调度
+# -------------------
+
+@dataclass
+class FeedSchedule:
+    url: str
+    interval: float  # 基础轮询间隔（秒）
+    next_due: float = 0.0
+    quiet_polls: int = 0  # 连续没有新条目的次数
+    running: bool = False
+    polls: int = 0
+    last_duration: float = 0.0
+
+
+class FeedScheduler:
+    """
+    每个订阅源各自一个轮询间隔，在线程池里并发抓取：
+    - 下次轮询时间带 ±jitter 的随机抖动，避免所有订阅源同时打到 RSSHub
+    - 连续 quiet_after 次没有新条目后，间隔逐次翻倍，最长 max_interval；一有新条目立即恢复
+    - 同一个订阅源上一次还没跑完时不会再次提交，慢订阅源不影响其他订阅源
+    poll(url) 返回本次新条目数；返回 None 或抛异常视为失败，按当前间隔重试，不计入退避。
+    """
+
+    def __init__(self, poll, urls, interval: float = 60, intervals: dict = None,
+                 max_interval: float = 600, jitter: float = 0.1, quiet_after: int = 10,
+                 workers: int = 4):
+        self.poll = poll
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self.quiet_after = quiet_after
+        intervals = intervals or {}
+        self._feeds = {url: FeedSchedule(url, intervals.get(url, interval)) for url in urls}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="feed")
+
+    def _current_interval(self, feed: FeedSchedule) -> float:
+        if feed.quiet_polls < self.quiet_after:
+            return feed.interval
+        backoff = 2 ** (feed.quiet_polls - self.quiet_after + 1)
+        return min(self.max_interval, feed.interval * backoff)
+
+    def _schedule_next(self, feed: FeedSchedule, now: float):
+        interval = self._current_interval(feed)
+        feed.next_due = now + interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def tick(self) -> int:
+        """提交所有到期且没有在运行的订阅源，返回本次提交的数量"""
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            for feed in self._feeds.values():
+                if not feed.running and feed.next_due <= now:
+                    feed.running = True
+                    due.append(feed)
+        for feed in due:
+            self._pool.submit(self._run, feed)
+        return len(due)
+
+    def _run(self, feed: FeedSchedule):
+        start = time.monotonic()
+        new_count = None
+        try:
+            new_count = self.poll(feed.url)
+        except Exception as e:
+            logging.error(f"轮询订阅源出错：{feed.url} -> {e}")
+        finally:
+            now = time.monotonic()
+            with self._lock:
+                feed.running = False
+                feed.polls += 1
+                feed.last_duration = now - start
+                if new_count:
+                    feed.quiet_polls = 0
+                elif new_count is not None:
+                    feed.quiet_polls += 1
+                self._schedule_next(feed, now)
+                interval = self._current_interval(feed)
+            if new_count is not None and feed.quiet_polls == self.quiet_after:
+                logging.info(f"订阅源长时间没有更新，轮询间隔退避：{feed.url} -> {interval:.0f}s")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                url: {
+                    "interval": round(self._current_interval(feed), 1),
+                    "quiet_polls": feed.quiet_polls,
+                    "polls": feed.polls,
+                    "running": feed.running,
+                    "last_duration": round(feed.last_duration, 2),
+                }
+                for url, feed in self._feeds.items()
+            }
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
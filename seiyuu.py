@@ -3,26 +3,37 @@ import re
 import json
 import time
 import logging
-import requests
-import schedule
 from typing import Optional
-from openai import OpenAI
-import xml.etree.ElementTree as ET
 from datetime import datetime
 from html import unescape
 from urllib.parse import urlparse, parse_qs
-from datetime import datetime, timezone, timedelta
-from PIL import Image, ImageDraw, ImageFont
+from PIL import ImageDraw, ImageFont
 from pathlib import Path
 #import emoji
 #from io import BytesIO
-from html2image import Html2Image
 from jinja2 import Template
-from jinja2 import Environment, FileSystemLoader
 import subprocess
-import base64
-import win32gui
-import win32con
+import hashlib
+import threading
+import atexit
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+from renderer import RenderPool, crop_whitespace
+from card_renderer import CardRenderer, CARD_TEMPLATES
+from render_cache import RenderCache, render_key
+from card_images import AvatarCache, CARD_FORMATS, encode_card
+import item_parser
+from pipeline import ItemPipeline
+from delivery import GroupDispatcher
+from mirai import MiraiClient, request_not_sent
+from rss_fetcher import FeedFetcher, FeedScheduler
+from translator import Translator, TranslationCache
+from state_store import RecordSet
+from downloader import DownloadManager
+from media_store import MediaStore
+from upload_cache import UploadCache
+from avatar_index import AvatarIndex
+from metrics import Metrics, ItemTrace
 
 
 # -------------------
@@ -48,13 +59,66 @@ RSSHUB_BAT_PATH = config.get("RSSHUB_BAT_PATH")
 # Deepseek API 配置
 DEEPSEEK_API_KEY = config.get("api_key")
 DEEPSEEK_BASE_URL = config.get("base_url")
-
+TRANSLATE_TIMEOUT = config.get("TRANSLATE_TIMEOUT", 30)
+TRANSLATE_WORKERS = config.get("TRANSLATE_WORKERS", 4)  # 同时进行的翻译请求数
+TRANSLATE_STREAM = config.get("TRANSLATE_STREAM", True)  # 流式翻译，记录首 token 耗时，慢请求提前取消
+TRANSLATE_TIMEOUT_FACTOR = config.get("TRANSLATE_TIMEOUT_FACTOR", 2.0)  # 自适应超时 = 最近 p95 延迟 × 该系数
+TRANSLATE_MIN_TIMEOUT = config.get("TRANSLATE_MIN_TIMEOUT", 5)
+TRANSLATE_BATCH = config.get("TRANSLATE_BATCH", True)  # 每轮抓取的所有文本合并成少量批量请求
+TRANSLATE_BATCH_TOKEN_BUDGET = config.get("TRANSLATE_BATCH_TOKEN_BUDGET", 2000)  # 单个批量请求的输入 token 上限（估算）
+TRANSLATION_CACHE_PATH = config.get("TRANSLATION_CACHE_PATH", "translation_cache.db")  # 设为空字符串关闭翻译缓存
+TRANSLATION_CACHE_MAX_ENTRIES = config.get("TRANSLATION_CACHE_MAX_ENTRIES", 5000)
+TRANSLATION_CACHE_TTL_DAYS = config.get("TRANSLATION_CACHE_TTL_DAYS", 30)
+
+# 渲染池配置
+RENDER_ENGINE = config.get("RENDER_ENGINE", "playwright")  # playwright 常驻浏览器 / html2image 每张图启动一次
+RENDER_POOL_SIZE = config.get("RENDER_POOL_SIZE", 2)
+RENDER_TIMEOUT = config.get("RENDER_TIMEOUT", 30)
+RENDER_RECYCLE_AFTER = config.get("RENDER_RECYCLE_AFTER", 200)  # 每个浏览器渲染多少张后重启，0 为不重启
+RENDER_FIT_CONTENT = config.get("RENDER_FIT_CONTENT", True)  # 按内容高度截图，不再截整张 8000px 画布后裁剪
+TAILWIND_MODE = config.get("TAILWIND_MODE", "static")  # static 启动时预编译CSS / runtime 每张图在浏览器里编译
+TEMPLATE_HOT_RELOAD = config.get("TEMPLATE_HOT_RELOAD", False)  # 模板/CSS 改动后不重启直接生效（每张图多几次 stat）
+RENDER_OUTPUT_DIR = config.get("RENDER_OUTPUT_DIR", "./output")  # 卡片截图目录，同时是截图缓存
+RENDER_CACHE_MAX_MB = config.get("RENDER_CACHE_MAX_MB", 512)  # 截图目录的大小上限，超出后淘汰最久没用过的图片
+INLINE_AVATARS = config.get("INLINE_AVATARS", True)  # 头像缩小到显示尺寸后以 data URI 内联进卡片
+CARD_FORMAT = config.get("CARD_FORMAT", "png")  # 卡片图片格式：png（截图原样输出）/ jpeg / webp
+CARD_WIDTH = config.get("CARD_WIDTH", 0)  # 卡片图片宽度，0 为保持截图原宽（约 2160px）
+CARD_QUALITY = config.get("CARD_QUALITY", 90)  # jpeg / webp 的质量
+
+# 处理流水线各阶段并发数
+PIPELINE_PARSE_WORKERS = config.get("PIPELINE_PARSE_WORKERS", 2)
+PIPELINE_PREPARE_WORKERS = config.get("PIPELINE_PREPARE_WORKERS", 4)  # 翻译/下载
+PIPELINE_RENDER_WORKERS = config.get("PIPELINE_RENDER_WORKERS", RENDER_POOL_SIZE)
+
+# 发送队列配置（每个群一个队列）
+DELIVERY_RATE = config.get("DELIVERY_RATE", 1.0)  # 每个群平均每秒最多几次 Mirai 调用，0 为不限速
+DELIVERY_BURST = config.get("DELIVERY_BURST", 3)  # 每个群允许的连续突发调用次数
+DELIVERY_RETRIES = config.get("DELIVERY_RETRIES", 3)  # 连不上 Mirai（消息肯定没发出）时的尝试次数
+MIRAI_SESSION_CHECK_INTERVAL = config.get("MIRAI_SESSION_CHECK_INTERVAL", 60)  # 复用会话时多久用 /sessionInfo 确认一次（秒）
+MIRAI_WS_URL = config.get("MIRAI_WS_URL", "")  # 如 ws://localhost:8080/all，设置后消息走 WebSocket，出错时回退 HTTP
+MERGE_MESSAGE_CHAIN = config.get("MERGE_MESSAGE_CHAIN", True)  # 卡片、链接和媒体图片合成一条消息发送
+
+# 各阶段耗时统计
+METRICS_JSONL_PATH = config.get("METRICS_JSONL_PATH", "metrics.jsonl")  # 每条推文、每轮抓取一行 JSON，设为空字符串不写
+METRICS_PORT = config.get("METRICS_PORT", 0)  # 本机 Prometheus 接口 http://127.0.0.1:端口/metrics，0 为不开启
 
 
 #RSS_BASE_URL = "http://rsshub.app/twitter/user/"
 #RSS_URLS = [f"{RSS_BASE_URL}{username}" for username in USERNAME_LIST]
 
-SEEN_FILE = 'seen.json'
+SEEN_FILE = 'seen.json'  # 旧版记录，首次启动时导入 STATE_DB_PATH
+STATE_DB_PATH = config.get("STATE_DB_PATH", "state.db")  # 已看记录、媒体索引、上传缓存（SQLite）
+SEEN_RETENTION_DAYS = config.get("SEEN_RETENTION_DAYS", 180)  # 超过这个天数的记录会被清理
+UPLOAD_CACHE_TTL_HOURS = config.get("UPLOAD_CACHE_TTL_HOURS", 24)  # Mirai imageId 复用多久后重新上传
+FEED_STATE_FILE = config.get("FEED_STATE_FILE", "feed_state.json")  # 每个订阅源的 ETag/Last-Modified 和已处理位置
+
+# 订阅源轮询配置（秒）
+RSS_POLL_INTERVAL = config.get("RSS_POLL_INTERVAL", 60)
+RSS_FEED_INTERVALS = config.get("RSS_FEED_INTERVALS", {})  # 单独指定某个订阅源的轮询间隔 {url: 秒}
+RSS_POLL_MAX_INTERVAL = config.get("RSS_POLL_MAX_INTERVAL", 600)  # 长时间没有更新时退避到的最长间隔
+RSS_POLL_JITTER = config.get("RSS_POLL_JITTER", 0.1)  # 每次间隔随机浮动 ±10%
+RSS_QUIET_AFTER = config.get("RSS_QUIET_AFTER", 10)  # 连续多少次没有新条目后开始退避
+RSS_FETCH_WORKERS = config.get("RSS_FETCH_WORKERS", 4)  # 同时抓取的订阅源数
 
 
 USER_FOLDER_MAP = {username: username for username in USERNAME_LIST}
@@ -64,8 +128,8 @@ proxies = {
     #'https': 'http://127.0.0.1:7897',
 }
 AVATAR_DIR = './avatar'  # <--- 新增头像目录
-
-rt_pattern = re.compile(r'^(.+?)\s+RT\s*<br>', re.IGNORECASE)
+DOWNLOAD_WORKERS = config.get("DOWNLOAD_WORKERS", 8)  # 全局同时进行的下载数
+DOWNLOAD_PER_ITEM = config.get("DOWNLOAD_PER_ITEM", 4)  # 单条推文的媒体同时下载数
 
 
 # -------------------
@@ -73,146 +137,144 @@ rt_pattern = re.compile(r'^(.+?)\s+RT\s*<br>', re.IGNORECASE)
 # -------------------
 
 
-# 初始化客户端（建议放在全局配置区）
+# 订阅源抓取器（条件请求 + 增量解析）
+_feed_fetcher = None
+_feed_fetcher_lock = threading.Lock()
+
+def get_feed_fetcher() -> FeedFetcher:
+    global _feed_fetcher
+    if _feed_fetcher is None:
+        with _feed_fetcher_lock:
+            if _feed_fetcher is None:
+                _feed_fetcher = FeedFetcher(FEED_STATE_FILE, timeout=40)
+    return _feed_fetcher
+
+
+# 翻译器（进程内共享一个 Deepseek 客户端）
+_translator = None
+_translator_lock = threading.Lock()
+
+def get_translator() -> Translator:
+    global _translator
+    if _translator is None:
+        with _translator_lock:
+            if _translator is None:
+                cache = None
+                if TRANSLATION_CACHE_PATH:
+                    cache = TranslationCache(
+                        TRANSLATION_CACHE_PATH,
+                        max_entries=TRANSLATION_CACHE_MAX_ENTRIES,
+                        ttl=TRANSLATION_CACHE_TTL_DAYS * 86400,
+                    )
+                _translator = Translator(
+                    timeout=TRANSLATE_TIMEOUT,
+                    workers=TRANSLATE_WORKERS,
+                    cache=cache,
+                    stream=TRANSLATE_STREAM,
+                    timeout_factor=TRANSLATE_TIMEOUT_FACTOR,
+                    min_timeout=TRANSLATE_MIN_TIMEOUT,
+                )
+    return _translator
 
 def translate_text(text: str) -> str:
     """
     使用 Deepseek API 进行文本翻译（日语 -> 简体中文）
     返回格式: 翻译后的文本字符串，失败时返回原文本
     """
-    # 独立客户端实例（配置直连）
-    DEEPSEEK_CLIENT = OpenAI(
-        #api_key=,  # 建议改为从环境变量获取
-        #base_url="https://api.deepseek.com",
-        timeout=30,
-        # 正确配置无代理的方式
-    )
-
-    if not DEEPSEEK_CLIENT.api_key:
-        logging.warning("Deepseek API key 未配置，跳过翻译")
-        return text
-
-    system_prompt = (
-        "你是一名专业翻译，请将日语内容精准翻译为简体中文。要求：\n"
-        "1. 保持原有换行和格式\n"
-        "2. 保留#话题标签和@提及,不进行翻译，同时#话题标签后必须保留空格\n"
-        "3. 禁止添加解释内容\n"
-        "4. 保留URL链接不变\n"
-        "5. 处理日式颜文字不翻译\n"
-        "6. 人名保留原文不翻译"
-    )
-
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": f"请翻译以下内容：\n{text}"}
-    ]
-
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            start_time = time.time()
-            
-            response = DEEPSEEK_CLIENT.chat.completions.create(
-                model="deepseek-chat",
-                messages=messages,
-                temperature=0.2,
-                top_p=0.3,
-                max_tokens=8000,
-                stream=False
-            )
+    return get_translator().translate(text)
 
-            if response.choices and response.choices[0].message.content:
-                translated = response.choices[0].message.content.strip()
-                translated = re.sub(r'^翻译[：:]?\s*', '', translated)
-                translated = re.sub(r'\n{3,}', '\n\n', translated)
-                
-                logging.info(
-                    f"翻译成功 | 耗时 {time.time()-start_time:.2f}s | "
-                    f"Token使用: {response.usage.total_tokens}"
-                )
-                return translated
+def translate_texts(texts) -> dict:
+    """并发翻译同一条推文里的多段文本（正文、引用），相同文本只翻译一次，返回 {原文: 译文}"""
+    return get_translator().translate_many(texts)
 
-        except Exception as e:
-            wait_time = 2 ** attempt
-            logging.warning(f"翻译尝试 {attempt+1}/{max_retries} 失败: {str(e)}")
-            time.sleep(wait_time)
-    
-    logging.error(f"所有重试失败 | 原文: {text[:100]}...")
-    return text
-
-def merge_consecutive_br(text: str) -> str:
-    """合并文本中连续的<br>标签为单个<br>"""
-    if not text:
-        return text
-    # 使用正则表达式将连续的<br>替换为单个<br>
-    return re.sub(r'(?:<br>){2,}', '<br>', text)
-
-
-def clean_html(text: str, author: str = None) -> str:
-    if author:
-        # 使用RSS中的作者名称，查找并移除description中该作者名之前的所有内容
-        pattern = re.compile(fr'.*?{re.escape(author)}[:：]\s*(.*)', re.DOTALL)  
-        match = pattern.match(text)
-        if match:
-            text = f"{author}: {match.group(1)}"
-        else:
-            pattern = re.compile(r'.*?([^>]+?)[:：]\s*(.*)', re.DOTALL)
-            match = pattern.match(text)
-            if match:
-                text = f"{author}: {match.group(2)}"
-        text = re.sub(fr'^{re.escape(author)}[:：]\s*', '', text)
-
-    text = unescape(text)
-    # 清理其他HTML标签，保留<br>
-    text = re.sub(r'<(?!br).*?>', '', text)
-    # 合并连续的<br>标签
-    text = merge_consecutive_br(text)
-    return text
-
-# 在工具函数区添加
-def extract_user_id(link: str) -> str:
-    """从推特URL提取用户ID"""
-    parsed = urlparse(link)
-    path_segments = [s for s in parsed.path.split('/') if s]
-    return path_segments[0] if path_segments else 'unknown_user'
+def prefetch_translations(records):
+    """把这个订阅源本次抓到的所有推文的正文和引用交给批量翻译，结果以 Future 挂在各自的 record 上"""
+    if not TRANSLATE_BATCH:
+        return
+    texts = [t for record in records for t in (record["desc_clean"], record["quote_clean"])]
+    futures = get_translator().prefetch(texts, token_budget=TRANSLATE_BATCH_TOKEN_BUDGET)
+    for record in records:
+        record["translation_futures"] = {
+            t: futures[t] for t in (record["desc_clean"], record["quote_clean"]) if t
+        }
 
 
 # -------------------
 # 下载和上传部分
 # -------------------
 
-UPLOAD_RECORD_FILE = 'uploaded_files.json'
 DOWNLOAD_DIR = '.\女声优图库'
 
-def load_seen():
-    return set(json.load(open('seen.json', 'r')) if os.path.exists('seen.json') else [])
-
-def save_seen(seen):
-    with open('seen.json', 'w') as f:
-        json.dump(list(seen), f, indent=2)
-
-def load_uploaded():
-    return set(json.load(open(UPLOAD_RECORD_FILE, 'r')) if os.path.exists(UPLOAD_RECORD_FILE) else [])
-
-def save_uploaded(uploaded):
-    with open(UPLOAD_RECORD_FILE, 'w') as f:
-        json.dump(list(uploaded), f, indent=2)
+def load_seen() -> RecordSet:
+    return RecordSet(STATE_DB_PATH, 'seen', retention=SEEN_RETENTION_DAYS * 86400, legacy_json=SEEN_FILE)
+
+def load_delivered() -> RecordSet:
+    # 键为 "群号 链接"：推文只发进了部分群时，重试只补发还没收到的群
+    return RecordSet(STATE_DB_PATH, 'delivered', retention=SEEN_RETENTION_DAYS * 86400)
+
+# 下载器（共享连接池，媒体并行下载）
+_downloader = None
+_downloader_lock = threading.Lock()
+
+def get_downloader() -> DownloadManager:
+    global _downloader
+    if _downloader is None:
+        with _downloader_lock:
+            if _downloader is None:
+                _downloader = DownloadManager(
+                    workers=DOWNLOAD_WORKERS,
+                    per_item=DOWNLOAD_PER_ITEM,
+                    timeout=15,
+                    proxies=proxies,
+                )
+    return _downloader
+
+# 媒体库（按内容寻址，跨作者/日期去重）
+_media_store = None
+_media_store_lock = threading.Lock()
+
+def get_media_store() -> MediaStore:
+    global _media_store
+    if _media_store is None:
+        with _media_store_lock:
+            if _media_store is None:
+                _media_store = MediaStore(DOWNLOAD_DIR, STATE_DB_PATH, fetch=get_downloader().fetch)
+    return _media_store
+
+# 上传缓存（内容哈希 -> imageId，一张图只上传一次）
+_upload_cache = None
+_upload_cache_lock = threading.Lock()
+
+def get_upload_cache() -> UploadCache:
+    global _upload_cache
+    if _upload_cache is None:
+        with _upload_cache_lock:
+            if _upload_cache is None:
+                _upload_cache = UploadCache(STATE_DB_PATH, upload_image, ttl=UPLOAD_CACHE_TTL_HOURS * 3600)
+    return _upload_cache
 
 # 特殊返回值，用于标识跳过了推特头像
 SKIPPED_PROFILE_IMAGE_FLAG = "SKIPPED_PROFILE_IMAGE"
 
+# 头像索引（启动时扫描一次 avatar 目录，记录每个头像的来源 URL）
+_avatar_index = None
+_avatar_index_lock = threading.Lock()
+
+def get_avatar_index() -> AvatarIndex:
+    global _avatar_index
+    if _avatar_index is None:
+        with _avatar_index_lock:
+            if _avatar_index is None:
+                _avatar_index = AvatarIndex(AVATAR_DIR, STATE_DB_PATH, fetch=get_downloader().fetch)
+    return _avatar_index
+
 # 新增函数：根据作者名获取本地头像
 def get_avatar_by_author(author: str) -> str:
-    """通过作者名查找本地已存在的头像文件"""
-    safe_author = re.sub(r'[\\/:*?"<>|]', '_', author)
-    for ext in ['.jpg', '.jpeg', '.png', '.gif']:
-        filename = f"{safe_author}{ext}"
-        path = os.path.join(AVATAR_DIR, filename)
-        if os.path.exists(path):
-            logging.info(f"找到本地头像：{filename}")
-            return path
-    logging.warning(f"未找到本地头像：{author}")
-    return None
+    """通过作者名查找本地已存在的头像文件（只查内存索引，不访问磁盘）"""
+    path = get_avatar_index().get(author)
+    if not path:
+        logging.warning(f"未找到本地头像：{author}")
+    return path
 
 
 def download_media(url: str, author: str) -> str:
@@ -250,66 +312,35 @@ def download_media(url: str, author: str) -> str:
     filename = f"{timestamp}_{original_filename}"
     path = os.path.join(user_dir, filename)
     
-    # 检查文件是否已存在（基于完整文件名）
-    if os.path.exists(path):
-        logging.info(f"文件已存在，跳过下载：{filename}")
-        return path
-
-    # 下载重试逻辑
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            resp = requests.get(
-                url,
-                proxies=proxies,
-                stream=True,
-                timeout=15,
-                verify=False,
-                headers={'User-Agent': 'Mozilla/5.0'}
-            )
-            resp.raise_for_status()
+    # 按 URL 身份和内容哈希去重，同一个文件只下载、保存一次；path 为指向实体文件的硬链接
+    return get_media_store().get(url, path, author)
 
-            # 写入文件
-            with open(path, 'wb') as f:
-                for chunk in resp.iter_content(1024):
-                    f.write(chunk)
-            
-            logging.info(f"下载成功：{filename}")
-            return path
 
-        except Exception as e:
-            logging.warning(f"尝试 {attempt+1}/{max_retries} 失败：{str(e)[:100]}")
-            time.sleep(1)
-    
-    logging.error(f"下载失败：{url}")
-    return None
+def download_media_many(urls, author: str) -> list:
+    """并行下载一条推文的所有媒体，按原顺序返回路径（失败的为 None）"""
+    return get_downloader().map(download_media, [(url, author) for url in urls])
 
 
 def upload_image(file_path, session_key):
-    with open(file_path, 'rb') as img_file:
-        files = {'img': img_file}
-        data = {'sessionKey': session_key, 'type': 'group'}
-        res = requests.post(f"{MIRAI_API_URL}/uploadImage", data=data, files=files)
-        return res.json().get("imageId") if res.status_code == 200 else None
+    with get_metrics().stage("upload") as span:
+        span.bytes = os.path.getsize(file_path)
+        return get_mirai().upload_image(file_path, session_key)
 
 def upload_video(file_path, session_key, target_id):
-    with open(file_path, 'rb') as video_file:
-        files = {'file': video_file}
-        data = {
-            'sessionKey': session_key,
-            'type': 'group',
-            'target': str(target_id),
-            'path': ''
-        }
-        res = requests.post(f"{MIRAI_API_URL}/file/upload", data=data, files=files)
-        return res.json().get("data", {}).get("id") if res.status_code == 200 else None
+    with get_metrics().stage("file_upload") as span:
+        span.bytes = os.path.getsize(file_path)
+        return get_dispatcher().call(
+            target_id, lambda: get_mirai().upload_group_file(file_path, session_key, target_id),
+            retry_if=request_not_sent,
+        )
 
-def send_message(session_key, target, message_chain):
-    return requests.post(f"{MIRAI_API_URL}/sendGroupMessage", json={
-        "sessionKey": session_key,
-        "target": target,
-        "messageChain": message_chain
-    })
+def send_message(session_key, target, message_chain) -> dict:
+    # 经过该群的限速；只有连接没建立起来（消息肯定没发出）时才重试，避免群里出现重复消息
+    with get_metrics().stage("send"):
+        return get_dispatcher().call(
+            target, lambda: get_mirai().send_group_message(session_key, target, message_chain),
+            retry_if=request_not_sent,
+        )
 
 # -------------------
 # 用于重启rsshub的函数，若在docker部署，此部分需要重构
@@ -327,6 +358,10 @@ def is_rsshub_running(host='localhost', port=14607):
 WINDOW_TITLE = "RSSHUB_CMD_WINDOW"
 
 def close_rsshub_window():
+    # pywin32 只在 Windows 上有，用到时才导入，其他系统上也能导入本模块（如 bench/ 里的基准）
+    import win32gui
+    import win32con
+
     def callback(hwnd, extra):
         if win32gui.IsWindowVisible(hwnd):
             title = win32gui.GetWindowText(hwnd)
@@ -347,353 +382,619 @@ def restart_rsshub():
     print("已在新窗口中重启 RSSHub")
 
 # -------------------
-# html转图片的主函数
+# 渲染池（跨多次运行复用浏览器）
 # -------------------
 
-def Twitter_seiyuu():
-    seen = load_seen()
-    uploaded = load_uploaded()
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+def get_render_pool() -> RenderPool:
+    global _render_pool
+    if _render_pool is None:
+        with _render_pool_lock:
+            if _render_pool is None:
+                pool = RenderPool(
+                    size=RENDER_POOL_SIZE,
+                    engine=RENDER_ENGINE,
+                    timeout=RENDER_TIMEOUT,
+                    recycle_after=RENDER_RECYCLE_AFTER,
+                    fit_content=RENDER_FIT_CONTENT,
+                )
+                pool.start()
+                atexit.register(pool.shutdown)
+                # 启动完成后才公开，其他线程不会拿到还没启动的渲染池
+                _render_pool = pool
+    return _render_pool
+
+# 截图缓存（内容相同的卡片只截图一次，output 目录大小受限）
+_render_cache = None
+_render_cache_lock = threading.Lock()
+
+def get_render_cache() -> RenderCache:
+    global _render_cache
+    if _render_cache is None:
+        with _render_cache_lock:
+            if _render_cache is None:
+                _render_cache = RenderCache(
+                    RENDER_OUTPUT_DIR,
+                    max_bytes=RENDER_CACHE_MAX_MB * 1024 * 1024,
+                    ext=CARD_FORMATS.get(CARD_FORMAT, '.png'),
+                )
+    return _render_cache
+
+# 头像缩略图缓存（按显示尺寸缩小一次，data URI 常驻内存）
+_avatar_cache = None
+_avatar_cache_lock = threading.Lock()
+
+def get_avatar_cache() -> AvatarCache:
+    global _avatar_cache
+    if _avatar_cache is None:
+        with _avatar_cache_lock:
+            if _avatar_cache is None:
+                _avatar_cache = AvatarCache(os.path.join(AVATAR_DIR, '.thumbs'))
+    return _avatar_cache
+
+# 各阶段耗时统计（JSONL + 可选的 Prometheus 接口）
+_metrics = None
+_metrics_lock = threading.Lock()
+
+def _snapshot_of(name: str):
+    # 只读取已经创建的组件，导出统计时不顺带初始化浏览器、数据库等
+    component = globals().get(name)
+    if component is None:
+        return None
+    stats = getattr(component, "stats", component)
+    return stats.snapshot()
+
+def get_metrics() -> Metrics:
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                metrics = Metrics(METRICS_JSONL_PATH)
+                for component, name in (
+                    ("render_pool", "_render_pool"),
+                    ("render_cache", "_render_cache"),
+                    ("avatar_cache", "_avatar_cache"),
+                    ("translator", "_translator"),
+                    ("downloader", "_downloader"),
+                    ("media_store", "_media_store"),
+                    ("upload_cache", "_upload_cache"),
+                ):
+                    metrics.add_collector(component, partial(_snapshot_of, name))
+                if METRICS_PORT:
+                    try:
+                        metrics.serve(METRICS_PORT)
+                    except OSError as e:
+                        logging.error(f"统计接口启动失败：{e}")
+                _metrics = metrics
+    return _metrics
+
+# -------------------
+# Tailwind 预编译
+# -------------------
+
+TEMPLATE_DIR = os.path.join(Path(__file__).resolve().parent, "html")
+COMPILED_CSS_DIR = os.path.join(TEMPLATE_DIR, "compiled")
+_tailwind_css_cache = {}
+_tailwind_lock = threading.Lock()
+
+def get_tailwind_css(template_name: str) -> str:
+    """
+    返回模板对应的预编译 Tailwind CSS（内存缓存，落盘到 html/compiled/）。
+    模板或 browser@4.js 变化后自动重新编译；编译失败返回空字符串，调用方回退到浏览器内编译。
+    """
+    if template_name in _tailwind_css_cache:
+        return _tailwind_css_cache[template_name]
+    # 多个渲染线程同时遇到未编译的模板时只编译一次
+    with _tailwind_lock:
+        if template_name not in _tailwind_css_cache:
+            _tailwind_css_cache[template_name] = _compile_tailwind_css(template_name)
+    return _tailwind_css_cache[template_name]
+
+def _compile_tailwind_css(template_name: str) -> str:
+
+    with open(os.path.join(TEMPLATE_DIR, template_name), 'r', encoding='utf-8') as f:
+        template_source = f.read()
+    js_content = get_card_renderer().asset("browser@4.js")
+    source_hash = hashlib.sha1((template_source + js_content).encode('utf-8')).hexdigest()
+    header = f"/* source-hash: {source_hash} */\n"
+    css_path = os.path.join(COMPILED_CSS_DIR, os.path.splitext(template_name)[0] + '.css')
+
+    css = ''
+    if os.path.exists(css_path):
+        with open(css_path, 'r', encoding='utf-8') as f:
+            cached = f.read()
+        if cached.startswith(header):
+            css = cached[len(header):]
+
+    if not css:
+        try:
+            # 用占位内容渲染一遍模板，让浏览器里的 Tailwind 把模板用到的类全部编译出来
+            sample_html = get_card_renderer().template(template_name).render(
+                author='sample', author_id='sample',
+                desc_clean='sample', desc_zh='sample',
+                quote_clean='sample', quote_zh='sample',
+                quoted_username='sample', beijing_time_str='sample',
+                translate_source='', css_content='',
+                js_content=js_content, tailwind_css=''
+            )
+            start_time = time.time()
+            css = get_render_pool().compile_tailwind_css(sample_html, os.path.abspath(RENDER_OUTPUT_DIR))
+            os.makedirs(COMPILED_CSS_DIR, exist_ok=True)
+            with open(css_path, 'w', encoding='utf-8') as f:
+                f.write(header + css)
+            logging.info(f"Tailwind 预编译完成 | {template_name} | {len(css)} 字节 | 耗时 {time.time()-start_time:.2f}s")
+        except Exception as e:
+            logging.warning(f"Tailwind 预编译失败，{template_name} 回退到浏览器内编译：{e}")
+            css = ''
+    return css
+
+def _on_template_reload(template_name: str):
+    # 模板改动后丢弃旧的预编译样式，下次使用时按新模板重新编译
+    _tailwind_css_cache.pop(template_name, None)
+
+# 卡片 HTML 生成器（模板和静态资源只加载一次）
+_card_renderer = None
+_card_renderer_lock = threading.Lock()
+
+def get_card_renderer() -> CardRenderer:
+    global _card_renderer
+    if _card_renderer is None:
+        with _card_renderer_lock:
+            if _card_renderer is None:
+                _card_renderer = CardRenderer(
+                    TEMPLATE_DIR,
+                    hot_reload=TEMPLATE_HOT_RELOAD,
+                    tailwind_css=get_tailwind_css if TAILWIND_MODE == 'static' else None,
+                    on_reload=_on_template_reload,
+                )
+    return _card_renderer
 
-    session_res = requests.post(f"{MIRAI_API_URL}/verify", json={"verifyKey": VERIFY_KEY})
-    session_key = session_res.json().get("session")
-    if not session_key:
-        print("认证失败")
+def prepare_tailwind_css():
+    """启动时预编译所有卡片模板的样式"""
+    if TAILWIND_MODE != 'static':
         return
-    requests.post(f"{MIRAI_API_URL}/bind", json={"sessionKey": session_key, "qq": QQ_ID})
+    for template_name in CARD_TEMPLATES:
+        get_tailwind_css(template_name)
 
-    if not is_rsshub_running():
-        logging.warning("RSSHub 未运行，正在启动...")
-        restart_rsshub()
-        # 可选：等待启动完成
-        time.sleep(10)
+# -------------------
+# 推文处理各阶段
+# -------------------
+
+def parse_item(item) -> Optional[dict]:
+    """
+    解析阶段：只做字符串处理，从 RSS <item> 中提取正文、引用、头像链接、媒体链接和时间（见 item_parser）。
+    没有链接的条目返回 None。
+    """
+    start = time.perf_counter()
+    parsed = item_parser.parse_item(item)
+    if not parsed:
+        return None
+    record = parsed.to_record()
+    record["trace"] = ItemTrace(record["link"], record["author"], record["pub_dt_utc"].timestamp())
+    get_metrics().observe("parse", time.perf_counter() - start, trace=record["trace"])
+    return record
+
+
+def traced(stage_func):
+    """阶段函数执行期间，当前线程里的计时都记到这条推文上"""
+    @wraps(stage_func)
+    def wrapper(record: dict, *args, **kwargs):
+        with get_metrics().track(record.get("trace")):
+            return stage_func(record, *args, **kwargs)
+    return wrapper
+
+
+@traced
+def prepare_item(record: dict) -> dict:
+    """翻译/下载阶段：翻译正文和引用，下载头像和媒体文件"""
+    author = record["author"]
+    quoted_username = record["quoted_username"]
+    quote_avatar_url = record["quote_avatar_url"]
+    avatar_quote = None
+
+    # 提取主推文字
+    logging.info(f"[{author}] 开始翻译...")
+    with get_metrics().stage("translate"):
+        if "translation_futures" in record:
+            # 已经在批量翻译里提交过，等待结果即可
+            translations = {t: f.result() for t, f in record["translation_futures"].items()}
+        else:
+            # 正文和引用并发翻译，两段相同时只请求一次
+            translations = translate_texts([record["desc_clean"], record["quote_clean"]])
+    record["desc_zh"] = translations.get(record["desc_clean"], '')
+    record["quote_zh"] = translations.get(record["quote_clean"], '')
+    logging.info(f"[{author}] 翻译完成.")
+
+    # 下载引用用户头像（本地已有且来源 URL 没变时直接复用）
+    if quote_avatar_url and quoted_username and quote_avatar_url.startswith("https://pbs.twimg.com/profile_images/"):
+        avatar_quote = download_avatar(quote_avatar_url, quoted_username)
+
+    # 下载原作者头像
+    if record["author_avatar_url"]:
+        avatar_path = download_avatar(record["author_avatar_url"], author)
+        if not avatar_path:
+            logging.warning(f"下载原作者头像失败: {author}")
+    else:
+        avatar_path = get_avatar_by_author(author)
+        if not avatar_path:
+            logging.warning(f"未找到原作者头像URL: {author}")
+
+    # 提取转推用户头像（从 quote_block 中）
+    logging.info("开始尝试提取转推头像链接")
+    avatar_quote_url = record["quote_block_avatar_url"]
+    if avatar_quote_url:
+        logging.info(f"提取到转推头像链接：{avatar_quote_url}")
+        logging.info(f"转推用户名用于命名头像文件：{quoted_username}")
+
+        if quoted_username:  # 使用之前提取的用户名
+            avatar_quote = download_avatar(avatar_quote_url, quoted_username)
+
+        if avatar_quote and avatar_quote != SKIPPED_PROFILE_IMAGE_FLAG:
+            logging.info(f"转推头像已存在或者下载成功：{avatar_quote}")
+        else:
+            logging.warning(f"转推头像下载失败或无效路径：{avatar_quote}")
+    else:
+        logging.warning("未找到转推头像 <img> 标签或用户名")
+
+    record["avatar_path"] = avatar_path
+    record["avatar_quote"] = avatar_quote
+    with get_metrics().stage("media") as span:
+        record["media_paths"] = [p for p in download_media_many(record["media_urls"], author) if p]
+        span.bytes = sum(
+            os.path.getsize(p) for p in record["media_paths"]
+            if p != SKIPPED_PROFILE_IMAGE_FLAG and os.path.exists(p)
+        )
+    return record
+
+
+@traced
+def render_item(record: dict) -> dict:
+    """渲染阶段：生成推文卡片图片"""
+    author = record["author"]
+    logging.info(f"[{author}] 开始生成消息图片...")
+    with get_metrics().stage("render"):
+        record["img_path"] = text_to_image_html(
+            author=author,
+            author_id=record["author_id"],
+            desc_clean=record["desc_clean"],
+            desc_zh=record["desc_zh"],
+            quote_clean=record["quote_clean"],
+            quote_zh=record["quote_zh"],
+            categories=record["categories"],
+            beijing_time_str=record["beijing_time_str"],
+            avatar_path=record["avatar_path"],
+            avatar_quote=record["avatar_quote"],
+            quoted_username=record["quoted_username"],
+            is_retweet=record["is_retweet"],
+            pin=True,
+        )
+    logging.info(f"[{author}] 消息图片生成完成: {record['img_path']}")
+    return record
+
+
+def send_chain(session_key, target_id, parts, required: str = None) -> bool:
+    """
+    发送一条消息，parts 为 [("image", 文件路径) | ("text", 文字)]。
+    图片经过上传缓存取得 imageId（上传失败的图片跳过）；required 为必须发出的图片（卡片），
+    它上传失败时整条消息不发，返回 False，不会只发出一段链接文字就算成功。
+    用缓存的 imageId 发送失败（可能已过期）时丢弃这些缓存，重新上传一次。
+    """
+    cache = get_upload_cache()
+    for attempt in range(2):
+        chain, image_ids = [], []
+        for kind, value in parts:
+            if kind == "text":
+                chain.append({"type": "Plain", "text": value})
+                continue
+            image_id = cache.get_image_id(value, session_key)
+            if not image_id:
+                if value == required:
+                    logging.error(f"上传卡片图片失败，不发送这条消息：{value}")
+                    return False
+                logging.error(f"上传图片失败，跳过：{value}")
+                continue
+            image_ids.append(image_id)
+            chain.append({"type": "Image", "imageId": image_id})
+        if not image_ids and all(kind == "image" for kind, _ in parts):
+            return False
+        if send_message(session_key, target_id, chain).get("code", 0) == 0:
+            return True
+        for image_id in image_ids:
+            cache.invalidate(image_id)
+        logging.warning(f"发送消息到群 {target_id} 失败，重新上传图片（第 {attempt+1} 次）")
+    return False
+
+
+def send_image(session_key, target_id, file_path) -> bool:
+    return send_chain(session_key, target_id, [("image", file_path)])
 
 
-    for url in RSS_URLS:
+@traced
+def deliver_item(record: dict, target_id, session_key):
+    """
+    发送阶段：把一条推文发到一个群。
+    卡片/链接消息没有发出去时抛出异常，这条推文不会被标记为已看，下次只补发给还没收到的群；
+    主消息发出后记下 (群, 链接)，之后的媒体图片、视频尽力发送，失败不会让整条推文重发。
+    """
+    author = record["author"]
+    delivered = get_delivered_state()
+    delivered_key = f"{target_id} {record['link']}"
+    if delivered_key in delivered:
+        logging.info(f"[{author}] 推文之前已经发进群 {target_id}，跳过：{record['link']}")
+        return
+    img_path = record["img_path"]
+    link_text = f"🔗 原文链接：{record['link']}"
+    images, videos = [], []
+    for media_path in record["media_paths"]:
+        if media_path == SKIPPED_PROFILE_IMAGE_FLAG:
+            continue
+        if media_path.lower().endswith(('.jpg', '.png', '.jpeg', '.gif')):
+            images.append(media_path)
+        elif media_path.lower().endswith(('.mp4', '.mkv', '.avi', '.mov')):
+            videos.append(media_path)
+        else:
+            logging.warning(f"未识别的媒体类型：{media_path}")
+
+    logging.info(f"[{author}] 开始向群 {target_id} 发送...")
+    extras = []
+    if MERGE_MESSAGE_CHAIN:
+        # 卡片图 + 链接 + 媒体图片合成一条消息，一次 sendGroupMessage；卡片上传失败时整条不发
+        parts = []
+        if img_path:
+            parts.append(("image", img_path))
+        parts.append(("text", ("\n" if img_path else "") + link_text))
+        parts.extend(("image", path) for path in images)
+        if not send_chain(session_key, target_id, parts, required=img_path):
+            raise RuntimeError(f"发送合并消息到群 {target_id} 失败：{record['link']}")
+        print(f"立即发送翻译后图片到群 {target_id} | 用户：{author}")
+    else:
+        # 先发卡片图；没有卡片图时这一步没有可发的内容，不算失败
+        if img_path:
+            if not send_image(session_key, target_id, img_path):
+                raise RuntimeError(f"上传翻译图片到群 {target_id} 失败：{record['link']}")
+            print(f"立即发送翻译后图片到群 {target_id} | 用户：{author}")
+            extras.append(partial(send_message, session_key, target_id, [{"type": "Plain", "text": link_text}]))
+        extras.extend(partial(send_image, session_key, target_id, path) for path in images)
+
+    # 主消息已经进群，之后重试不再给这个群重发
+    delivered.add(delivered_key)
+    # 推文（卡片）进群的时间，统计 pubDate -> 群 的延迟
+    if img_path or MERGE_MESSAGE_CHAIN:
+        get_metrics().delivered(record.get("trace"), target_id)
+
+    for send in extras:
+        try:
+            send()
+        except Exception as e:
+            logging.error(f"[{author}] 发送到群 {target_id} 失败，跳过：{e}")
+    # 群文件按群上传，不能跨群复用，也不能放进消息链
+    for media_path in videos:
         try:
-            resp = requests.get(url, timeout=40)
-            resp.raise_for_status()
-            root = ET.fromstring(resp.content)
-            logging.info(f"抓取成功：{url}")
+            vid_id = upload_video(media_path, session_key, target_id)
+            if vid_id:
+                send_message(session_key, target_id, [{"type": "File", "id": vid_id}])
         except Exception as e:
-            error_msg = str(e)
-            logging.error(f"抓取失败：{url} -> {error_msg}")
+            logging.error(f"[{author}] 发送视频到群 {target_id} 失败，跳过：{media_path} - {e}")
 
-            if ("503 Server Error" in error_msg) or \
-               ("HTTPConnectionPool(host='localhost', port=14607): Read timed out." in error_msg):
-                logging.warning("检测到 RSSHub 异常，尝试重启服务...")
-                restart_rsshub()
 
-            continue
+def dispatch_item(record: dict, session_key):
+    """把推文排进所有群的发送队列；卡片在所有群发完之前固定在截图缓存里，不会被淘汰"""
+    img_path = record.get("img_path")
+    try:
+        future = get_dispatcher().submit(partial(deliver_item, record, session_key=session_key))
+    except Exception:
+        if img_path:
+            get_render_cache().unpin(img_path)
+        raise
+    if img_path:
+        future.add_done_callback(lambda _: get_render_cache().unpin(img_path))
+    return future
+
+
+# Mirai 客户端（复用会话和连接池）
+_mirai = None
+_mirai_lock = threading.Lock()
+
+def get_mirai() -> MiraiClient:
+    global _mirai
+    if _mirai is None:
+        with _mirai_lock:
+            if _mirai is None:
+                _mirai = MiraiClient(
+                    MIRAI_API_URL,
+                    VERIFY_KEY,
+                    QQ_ID,
+                    pool_size=max(4, len(TARGET_IDs_list) * 2),
+                    check_interval=MIRAI_SESSION_CHECK_INTERVAL,
+                    ws_url=MIRAI_WS_URL or None,
+                )
+    return _mirai
+
+
+# 发送队列（每个群一个有序队列，群之间并行）
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+def get_dispatcher() -> GroupDispatcher:
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = GroupDispatcher(
+                    TARGET_IDs_list,
+                    rate=DELIVERY_RATE,
+                    burst=DELIVERY_BURST,
+                    retries=DELIVERY_RETRIES,
+                )
+    return _dispatcher
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+def get_pipeline() -> ItemPipeline:
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                _pipeline = ItemPipeline(
+                    parse=parse_item,
+                    prepare=prepare_item,
+                    render=render_item,
+                    order_key=lambda record: record["pub_dt_utc"],
+                    parse_workers=PIPELINE_PARSE_WORKERS,
+                    prepare_workers=PIPELINE_PREPARE_WORKERS,
+                    render_workers=PIPELINE_RENDER_WORKERS,
+                    prefetch=prefetch_translations,
+                )
+    return _pipeline
+
+# -------------------
+# html转图片的主函数
+# -------------------
+
+# 已看记录在进程内共享；锁保证多个订阅源并发时「检查 + 排队」是原子的
+_seen = None
+_delivered = None
+_state_lock = threading.Lock()
+_queued_links = set()  # 正在流水线里处理的链接，避免两个订阅源同时处理同一条推文
+
+def get_seen_state() -> RecordSet:
+    global _seen
+    with _state_lock:
+        if _seen is None:
+            _seen = load_seen()
+        return _seen
+
+def get_delivered_state() -> RecordSet:
+    global _delivered
+    with _state_lock:
+        if _delivered is None:
+            _delivered = load_delivered()
+        return _delivered
+
+
+# RSSHub 重启冷却时间，多个订阅源同时失败时只重启一次
+RSSHUB_RESTART_COOLDOWN = 60
+_rsshub_lock = threading.Lock()
+_rsshub_restarted_at = 0.0
+
+def restart_rsshub_once(wait: float = 0):
+    global _rsshub_restarted_at
+    with _rsshub_lock:
+        if time.monotonic() - _rsshub_restarted_at < RSSHUB_RESTART_COOLDOWN:
+            return
+        restart_rsshub()
+        _rsshub_restarted_at = time.monotonic()
+        if wait:
+            time.sleep(wait)
+
+
+def open_mirai_session() -> Optional[str]:
+    try:
+        return get_mirai().session_key()
+    except Exception as e:
+        logging.error(f"Mirai 认证失败：{e}")
+        return None
 
-        for item in root.findall('.//item'):
-            # 在每个item开始时重置引用相关变量
-            quoted_username = ''
-            quote_block = ''
-            quote_clean = ''
-            quote_zh = ''
-            avatar_quote = None
 
+def poll_feed(url: str) -> Optional[int]:
+    """抓取一个订阅源并处理其中的新推文，返回新条目数；抓取或认证失败返回 None"""
+    seen = get_seen_state()
+    metrics = get_metrics()
+    cycle_start = time.monotonic()
+
+    if not is_rsshub_running():
+        logging.warning("RSSHub 未运行，正在启动...")
+        # 可选：等待启动完成
+        restart_rsshub_once(wait=10)
+
+    fetcher = get_feed_fetcher()
+    result = fetcher.fetch(url)
+    metrics.observe("fetch", result.fetch_time, result.bytes)
+    if result.status == 'ok':
+        metrics.observe("feed_parse", result.parse_time)
+    if result.status == 'error':
+        error_msg = result.error
+        logging.error(f"抓取失败：{url} -> {error_msg}")
+
+        if ("503 Server Error" in error_msg) or \
+           ("HTTPConnectionPool(host='localhost', port=14607): Read timed out." in error_msg):
+            logging.warning("检测到 RSSHub 异常，尝试重启服务...")
+            restart_rsshub_once()
+        metrics.finish_cycle(url, result.status, time.monotonic() - cycle_start, result.bytes)
+        return None
+
+    # 收集未看过的条目（同一链接只处理一次）
+    new_items = []
+    with _state_lock:
+        for item in result.items:
             link = item.findtext('link')
-            if not link or link in seen:
+            if not link or link in seen or link in _queued_links:
                 continue
+            _queued_links.add(link)
+            new_items.append(item)
+    queued = [item.findtext('link') for item in new_items]
+    traces = []
+
+    def on_delivered(record):
+        with _state_lock:
+            seen.add(record["link"])
+            logging.info(f"[{record['author']}] 项目 {record['link']} 处理完毕，标记为已看。")
+        trace = record.get("trace")
+        metrics.finish_item(trace)
+        if trace is not None:
+            traces.append(trace)
 
-            # 新增用户ID提取
-            author_id = extract_user_id(link)
-            title = item.findtext('title') or ''
-            desc  = item.findtext('description') or ''
-            # 修改后
-            author_text = item.findtext('author') or 'unknown'  # 直接获取author标签内容
-            author_clean = re.sub(r'<[^>]+>', '', author_text)
-            # 清理HTML标签和特殊标记
-            author = re.sub(r'<[^>]+>', '', author_text)
-            #author = re.sub(r'\s*(?:OFFICIAL|のこと。?|[:：])\s*$', '', author)  # 移除结尾的OFFICIAL等标记和冒号
-            author = re.sub(r'[\\/:*?"<>|\s]', '_', author.strip()).strip('_')
-
-            pub_dt = item.findtext('pubDate') or ''
-            categories = ['#' + c.text.strip() for c in item.findall('category') if c.text]
-        
-            
-            # --- Step 1: 检测直接RT模式 ---
-            # 检测是否为直接转发模式
-            rt_match = rt_pattern.search(desc)
-
-            if rt_match:  # 直接转发无评论的情况
-                # 主推内容置空
-                desc_main_only = ''
-                # 添加清理逻辑
-                author = re.sub(r'<[^>]+>', '', author)
-                author = re.sub(r'[\\/:*?"<>|\s]', '_', author.strip()).strip('_')
-
-                # 修改：直接从RT后的内容提取转推块的内容
-                rt_content = desc[rt_match.end():]
-                quote_block = rt_content
-
-                    
-                # 提取引用内容中的头像和用户名 (和普通推文使用相同的提取逻辑)
-                quote_author_match = re.search(r'<img[^>]+?src="([^"]+?)"[^>]*?>([^:<]+?):', quote_block)
-                if quote_author_match:
-                    quote_avatar_url = unescape(quote_author_match.group(1))
-                    quoted_username = quote_author_match.group(2).strip()
-                    # 清理用户名，移除末尾的标记和冒号
-                    quoted_username = re.sub(r'<[^>]+>', '', quoted_username)
-                    #quoted_username = re.sub(r'\s*(?:OFFICIAL|のこと。?|[:：])\s*$', '', quoted_username)
-                    quoted_username = re.sub(r'[\\/:*?"<>|\s]', '_', quoted_username.strip()).strip('_')
-                    
-                    logging.info(f"提取到RT用户信息 - 用户名: {quoted_username}")
-                    logging.info(f"提取到RT用户信息 - 头像URL: {quote_avatar_url}")
-                    
-                    # 清理开头的作者名和冒号
-                    quote_block = re.sub(fr'{re.escape(quoted_username)}[:：]\s*', '', quote_block)  # 移除用户名和冒号
-                    quote_block = re.sub(r'^(?:<img[^>]+>)', '', quote_block)  # 只移除头像标签
-                
-                quote_clean = clean_html(quote_block)  # 直接清理RT后的内容
-                quote_zh = translate_text(quote_clean) if quote_clean else ''  # 翻译RT内容
-                logging.info(f"[{author}] 检测到直接转发模式，RT内容已清理并翻译。")
-                
-                # 下载引用用户头像
-                if quote_avatar_url and quoted_username and quote_avatar_url.startswith("https://pbs.twimg.com/profile_images/"):
-                    avatar_quote = get_avatar_by_author(quoted_username)
-                    if not avatar_quote:
-                        avatar_quote = download_avatar(quote_avatar_url, quoted_username)
-                    avatar_quote = get_avatar_by_author(quoted_username)
-
-                # 直接转发模式下，使用 author 下载用户头像
-                avatar_path = get_avatar_by_author(author)
-                if not avatar_path:  # 如果本地没有头像
-                    # 尝试从desc中提取原作者头像URL
-                    author_avatar_match = re.search(r'<img[^>]+?src="([^"]+?/profile_images/[^"]+?)"[^>]*?>', desc)
-                    if author_avatar_match:
-                        author_avatar_url = unescape(author_avatar_match.group(1))
-                        logging.info(f"尝试下载原作者头像 - URL: {author_avatar_url}")
-                        avatar_path = download_avatar(author_avatar_url, author)
-                        if avatar_path:
-                            logging.info(f"成功下载原作者头像: {avatar_path}")
-                        else:
-                            logging.warning(f"下载原作者头像失败: {author}")
-                    else:
-                        logging.warning(f"未找到原作者头像URL: {author}")
-
-            else:
-                # 1. 首先分离主推文内容和引用内容
-                desc_main_only = re.split(r'<div class="rsshub-quote">', desc)[0]
-                
-                # 2. 使用更激进的清理方式 - 查找作者名和冒号后的位置，只保留之后的内容
-                author_pattern = fr'{re.escape(author)}[:：]\s*'
-                match = re.search(author_pattern, desc_main_only)
-                if match:
-                    desc_main_only = desc_main_only[match.end():]
-                
-                # 3. 移除所有可能的开头HTML标签和空白
-                #desc_main_only = re.sub(r'^.*?<br>', '', desc_main_only, flags=re.DOTALL)  # 移除开头到第一个<br>之间的所有内容
-                #desc_main_only = re.sub(r'^<[^>]+>', '', desc_main_only)  # 移除剩余的开头HTML标签
-                desc_main_only = re.sub(fr'^.*?{re.escape(author_clean)}[:：]\s*', '', desc_main_only)
-                desc_main_only = desc_main_only.lstrip()  # 移除开头空白
-
-                # 从desc_main_only中提取头像URL
-                m = re.search(r'<img[^>]+?src="([^"]+?/profile_images/[^"]+?)"[^>]*?>', desc)
-                if m:
-                    avatar_url = unescape(m.group(1))
-                    # 先尝试获取本地头像
-                    avatar_path = get_avatar_by_author(author)
-                    # 如果本地没有,则下载
-                    if not avatar_path:
-                        avatar_path = download_avatar(avatar_url, author)
-                else:
-                    # 如果没有找到URL,仍然尝试从本地获取
-                    avatar_path = get_avatar_by_author(author)
-
-                # 优化引用块的提取
-                quote_block_match = re.search(r'<div class="rsshub-quote">(.*?)</div>', desc, re.DOTALL)
-                if quote_block_match:
-                    quote_block = quote_block_match.group(1)
-                    # 提取引用内容中的头像和用户名
-                    quote_author_match = re.search(r'<img[^>]+?src="([^"]+?)"[^>]*?>([^:<]+?):', quote_block)
-                    if quote_author_match:
-                        quote_avatar_url = unescape(quote_author_match.group(1))
-                        quoted_username = quote_author_match.group(2).strip()
-                        # 清理用户名，移除末尾的标记和冒号
-                        quoted_username = re.sub(r'<[^>]+>', '', quoted_username)
-                        #quoted_username = re.sub(r'\s*(?:OFFICIAL|のこと。?|[:：])\s*$', '', quoted_username)
-                        quoted_username = re.sub(r'[\\/:*?"<>|\s]', '_', quoted_username.strip()).strip('_')
-                        
-                        logging.info(f"提取到引用用户信息 - 用户名: {quoted_username}")
-                        logging.info(f"提取到引用用户信息 - 头像URL: {quote_avatar_url}")
-                        # 直接清理引用内容，包括用户名前缀
-                        quote_block = re.sub(fr'{re.escape(quoted_username)}[:：]\s*', '', quote_block)  # 移除用户名和冒号
-                        quote_block = re.sub(r'^<img[^>]+>', '', quote_block)  # 只移除头像标签
-                        quote_clean = clean_html(quote_block)
-                        quote_zh = translate_text(quote_clean) if quote_clean else ''
-                             
-                        # 下载引用用户头像
-                        if quote_avatar_url.startswith("https://pbs.twimg.com/profile_images/"):
-                            if not avatar_quote:
-                                avatar_quote = download_avatar(quote_avatar_url, quoted_username)
-                            avatar_quote = get_avatar_by_author(quoted_username)
-
-                    
-                    # 清理引用内容，使用更严格的正则表达式去除作者信息
-                    quote_block = re.sub(r'^<img[^>]+>', '', quote_block)
-                    quote_clean = clean_html(quote_block)
-                    quote_zh = translate_text(quote_clean) if quote_clean else ''
-                else:
-                    quote_block = ''
-                    quote_clean = ''
-                    quote_zh = ''
-                    quoted_username = ''
-                    avatar_quote = None
-
-
-            # 提取主推文字
-            logging.info(f"[{author}] 开始翻译...")
-            # --- 后续处理保持原有逻辑，但需确保desc_clean为空时处理 ---
-            desc_clean = clean_html(desc_main_only) if desc_main_only else ''
-            desc_zh = translate_text(desc_clean) if desc_clean else ''
-
-            # --- Step 2: 提取转推块 html ---
-            #quote_block_match = re.search(r'<div class="rsshub-quote">(.*?)</div>', desc, re.DOTALL)
-            #quote_block = quote_block_match.group(1) if quote_block_match else ''
-
-
-            logging.info(f"[{author}] 翻译完成.")
-
-
-            # 提取转推用户头像（从 quote_block 中）
-            logging.info("开始尝试提取转推头像链接")
-            #avatar_quote = None
-            #quoted_username = ''  # 添加此行，设置默认值
-            matches = re.findall(r'<img[^>]+src="([^"]+pbs\.twimg\.com/profile_images/[^"]+)"[^>]*>\s*([^:<\n]+)', quote_block)
-            
-
-            if matches:
-                avatar_quote_url = matches[0][0]  # 只获取头像URL，不覆盖用户名
-                #quoted_username = re.sub(r'<[^>]+>', '', quoted_username)
-                #quoted_username = re.sub(r'[\\/:*?"<>|\s]', '_', quoted_username.strip()).strip('_')
-
-                logging.info(f"提取到转推头像链接：{avatar_quote_url}")
-                logging.info(f"转推用户名用于命名头像文件：{quoted_username}")
-
-                if quoted_username:  # 使用之前提取的用户名
-                    avatar_quote = download_avatar(avatar_quote_url, quoted_username)
-
-                if avatar_quote and avatar_quote != SKIPPED_PROFILE_IMAGE_FLAG and os.path.exists(avatar_quote):
-                    logging.info(f"转推头像已存在或者下载成功：{avatar_quote}")
-                else:
-                    logging.warning(f"转推头像下载失败或无效路径：{avatar_quote}")
-            else:
-                logging.warning("未找到转推头像 <img> 标签或用户名")
-
-            # 提取媒体链接，跳过隐藏元素
-            media_urls = []
-            seen_urls = set()
-            for tag in re.findall(r'(<img[^>]+>)', desc):
-                if tag.startswith('<img width="0" height="0" hidden="true"'):
-                    continue
-                u = re.search(r'src="([^"]+)"', tag).group(1)
-                u = unescape(u)
-                if u.startswith("https://pbs.twimg.com/profile_images/"):
-                    continue  # 跳过头像
-                if u not in seen_urls:
-                    media_urls.append(u)
-                    seen_urls.add(u)
-
-            
-            # 同理处理 <video>
-            for tag in re.findall(r'(<video[^>]+>.*?</video>)', desc, re.DOTALL):
-                if 'hidden="true"' in tag or 'style="display:none"' in tag:
-                    continue
-                src_match = re.search(r'src="([^"]+)"', tag)
-                if src_match:
-                    u = src_match.group(1).replace('&amp;', '&')
-                    if u not in seen_urls:
-                        media_urls.append(u)
-                        seen_urls.add(u)
-
-            media_paths = [p for u in media_urls if (p := download_media(u, author))]
-
-    
-            # 处理时间转换
-            try:
-                pub_dt_gmt = datetime.strptime(pub_dt, '%a, %d %b %Y %H:%M:%S %Z')
-                pub_dt_utc = pub_dt_gmt.replace(tzinfo=timezone.utc)
-            except ValueError:
-                pub_dt_gmt = datetime.strptime(pub_dt.rstrip(' GMT'), '%a, %d %b %Y %H:%M:%S')
-                pub_dt_utc = pub_dt_gmt.replace(tzinfo=timezone.utc)
-
-            beijing_tz = timezone(timedelta(hours=8))
-            pub_dt_beijing = pub_dt_utc.astimezone(beijing_tz)
-            
-            WEEKDAY_MAP = {
-                0: "星期一", 1: "星期二", 2: "星期三", 3: "星期四",
-                4: "星期五", 5: "星期六", 6: "星期天"
-            }
-            weekday_cn = WEEKDAY_MAP[pub_dt_beijing.weekday()]
-            beijing_time_str = f"{weekday_cn}，{pub_dt_beijing.year}.{pub_dt_beijing.month:02}.{pub_dt_beijing.day:02} {pub_dt_beijing.strftime('%H:%M:%S')}"
-            
-
-            # # 生成消息文本
-            # message_text = '\n'.join([
-            #     f"👤 来自用户：{author}",                
-            #     f"🌈 原文内容：\n{desc_clean}",
-            #     f"🌈 翻译内容：\n{desc_zh}",
-            #     '',
-            #     f"🕒 发布时间：{beijing_time_str}",
-            #     ' '.join(categories)
-            # ])
-
-            logging.info(f"[{author}] 开始生成消息图片...")
-            # 生成图片并发送
-            img_path = text_to_image_html(
-                author=author,
-                author_id=author_id,  # 新增
-                desc_clean=desc_clean,
-                desc_zh=desc_zh,
-                quote_clean=quote_clean,
-                quote_zh=quote_zh,
-                categories=categories,
-                beijing_time_str=beijing_time_str,
-                avatar_path=avatar_path,
-                avatar_quote=avatar_quote,
-                quoted_username=quoted_username,
-                is_retweet=bool(rt_pattern.search(desc))  # 新增参数
+    try:
+        if new_items:
+            session_key = open_mirai_session()
+            if not session_key:
+                return None
+            get_pipeline().run(
+                new_items,
+                dispatch=partial(dispatch_item, session_key=session_key),
+                on_delivered=on_delivered,
             )
-            logging.info(f"[{author}] 消息图片生成完成: {img_path}")
-
-            for target_id in TARGET_IDs_list:
-                logging.info(f"[{author}] 开始向群 {target_id} 发送...")                
-                # 优先发送图片消息
-                if img_path:
-                    img_message = upload_image(img_path, session_key)
-                    if img_message:
-                        # 立即发送图片和链接
-                        send_message(session_key, target_id, [{"type": "Image", "imageId": img_message}])
-                        send_message(session_key, target_id, [{"type": "Plain", "text": f"🔗 原文链接：{link}"}])
-                        print(f"立即发送翻译后图片到群 {target_id} | 用户：{author}")
-                    else:
-                        logging.error(f"[{author}] 上传翻译图片到群 {target_id} 失败")
-
-                # 处理媒体文件
-                for media_path in media_paths:
-                    filename = os.path.basename(media_path)
-                    if filename in uploaded:
-                        logging.info(f"[{author}] 媒体文件 {filename} 已上传过，跳过")
-                        continue
-                    if media_path == SKIPPED_PROFILE_IMAGE_FLAG:
-                        continue
-
-                    if media_path.lower().endswith(('.jpg', '.png', '.jpeg', '.gif')):
-                        img_id = upload_image(media_path, session_key)
-                        if img_id:
-                            send_message(session_key, target_id, [{"type": "Image", "imageId": img_id}])
-                    elif media_path.lower().endswith(('.mp4', '.mkv', '.avi', '.mov')):
-                        vid_id = upload_video(media_path, session_key, target_id)
-                        if vid_id:
-                            send_message(session_key, target_id, [{"type": "File", "id": vid_id}])
-                    else:
-                        logging.warning(f"未识别的媒体类型：{media_path}")
-            seen.add(link)
-            logging.info(f"[{author}] 项目 {link} 处理完毕，标记为已看。")
-            save_seen(seen)
-            save_uploaded(uploaded)
+    finally:
+        with _state_lock:
+            _queued_links.difference_update(queued)
+            # 已发送的条目推进订阅源状态，没发出去的下次还会重新抓到
+            fetcher.commit(result, lambda link: link in seen)
+        metrics.finish_cycle(
+            url, result.status, time.monotonic() - cycle_start, result.bytes, len(new_items), traces
+        )
+    return len(new_items)
+
+
+def Twitter_seiyuu():
+    """所有订阅源并发抓取一轮（不经过调度器）"""
+    with ThreadPoolExecutor(max_workers=max(1, RSS_FETCH_WORKERS), thread_name_prefix="feed") as pool:
+        list(pool.map(poll_feed, RSS_URLS))
+
+
+# 订阅源调度器（每个订阅源独立的轮询间隔）
+_feed_scheduler = None
+_feed_scheduler_lock = threading.Lock()
+
+def get_feed_scheduler() -> FeedScheduler:
+    global _feed_scheduler
+    if _feed_scheduler is None:
+        with _feed_scheduler_lock:
+            if _feed_scheduler is None:
+                _feed_scheduler = FeedScheduler(
+                    poll_feed,
+                    RSS_URLS,
+                    interval=RSS_POLL_INTERVAL,
+                    intervals=RSS_FEED_INTERVALS,
+                    max_interval=RSS_POLL_MAX_INTERVAL,
+                    jitter=RSS_POLL_JITTER,
+                    quiet_after=RSS_QUIET_AFTER,
+                    workers=RSS_FETCH_WORKERS,
+                )
+    return _feed_scheduler
 
 # 消息图片化
 def text_to_image_html(
@@ -704,140 +1005,95 @@ def text_to_image_html(
     quote_clean: str = '',
     quote_zh: str = '',
     categories: list = None,
-    output_path: str = "./output",
+    output_path: str = None,
     beijing_time_str=None,
     avatar_path: str = None,
     avatar_quote: str = None,
     quoted_username: str = '',
-    is_retweet: bool = False  # 新增参数
+    is_retweet: bool = False,  # 新增参数
+    pin: bool = False
 ):
-    # 生成以时间戳命名的文件名
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"{timestamp}.png"
-    filepath = os.path.join(output_path, filename)
-    output_path = os.path.abspath(output_path)
-    filepath = os.path.join(output_path, filename)
-    os.makedirs(output_path, exist_ok=True)
-
     # 移除相对路径转换函数，直接使用传入的绝对路径
     if avatar_path:
         avatar_path = os.path.abspath(avatar_path)
     if avatar_quote:
         avatar_quote = os.path.abspath(avatar_quote)
 
-
-    # 内嵌 hashtag 高亮逻辑（#tag → 蓝色）
-    def highlight_hashtags(text: str) -> str:
-        # 修改正则表达式，排除 < 字符，这样就不会匹配到 <br>
-        return re.sub(r'#([^<\s]+)', r'<span style="color:#1da1f2;">#\1</span>', text)
-
-
-
-
-    # 对所有文本内容进行处理
-    desc_clean = merge_consecutive_br(desc_clean)
-    desc_zh = merge_consecutive_br(desc_zh)
-    quote_clean = merge_consecutive_br(quote_clean)
-    quote_zh = merge_consecutive_br(quote_zh)
-    
-    # 渲染 hashtag
-    desc_clean = highlight_hashtags(desc_clean)
-    desc_zh = highlight_hashtags(desc_zh)
-    quote_clean = highlight_hashtags(quote_clean)
-    quote_zh = highlight_hashtags(quote_zh)
-
-
-    # 加载外部 HTML 模板
-
-    # 获取当前脚本所在目录
-    script_dir = Path(__file__).resolve().parent
-
-
-    # 设置模板文件夹的绝对路径
-    template_dir = os.path.join(script_dir, "html")
-
-    # 新增：读取CSS和JS文件内容
-    def load_resource(filename):
-        resource_path = os.path.join(template_dir, filename)
-        try:
-            with open(resource_path, 'r', encoding='utf-8') as f:
-                return f.read()
-        except Exception as e:
-            logging.error(f"加载资源失败: {resource_path} - {str(e)}")
-            return ""
-        
-    # 加载CSS和JS内容
-    css_content = load_resource("css2.css")
-    js_content = load_resource("browser@4.js")
-
-    # 加载模板
-    env = Environment(loader=FileSystemLoader(template_dir))
-    template_name = 'seiyuu.html' if quote_clean.strip() or quote_zh.strip() else 'no-quote.html'
-    template = env.get_template(template_name)
-    #avatar_base64 = image_to_base64(avatar_path) if avatar_path else None
-
     # 添加调试信息
     logging.info(f"生成图片参数 | author_id={author_id} | avatar_path={avatar_path}")
 
+    # 头像缩小到显示尺寸（48px / 24px，乘以模板的 zoom）后内联，处理失败时仍使用文件路径
+    metrics = get_metrics()
+    avatar_src, avatar_quote_src = avatar_path, avatar_quote
+    if INLINE_AVATARS:
+        with metrics.stage("avatar_inline"):
+            avatar_src = get_avatar_cache().data_uri(avatar_path, 48) or avatar_path
+            avatar_quote_src = get_avatar_cache().data_uri(avatar_quote, 24) or avatar_quote
+
+    # 渲染 HTML（模板、CSS/JS 和翻译来源提示都在 CardRenderer 里预先加载好）
+    with metrics.stage("card_html") as span:
+        rendered_html = get_card_renderer().render_html(
+            author=author,
+            author_id=author_id,
+            desc_clean=desc_clean,
+            desc_zh=desc_zh,
+            quote_clean=quote_clean,
+            quote_zh=quote_zh,
+            categories=categories,
+            beijing_time_str=beijing_time_str,
+            avatar_path=avatar_src,
+            avatar_quote=avatar_quote_src,
+            quoted_username=quoted_username,
+            is_retweet=is_retweet,
+        )
+        span.bytes = len(rendered_html)
 
+    def produce(filepath: str) -> bool:
+        raw_path = f"{filepath}.raw.png"
+        try:
+            # Step 1: 生成大尺寸截图（由常驻渲染池完成）
+            try:
+                with metrics.stage("screenshot"):
+                    result = get_render_pool().render(rendered_html, raw_path)
+            except Exception as e:
+                logging.error(f"HTML 转图片失败：{e}")
+                return False
+            logging.info(
+                f"渲染耗时 {result.elapsed:.2f}s | 渲染线程 {result.worker} | "
+                f"累计统计 {get_render_pool().stats.snapshot()}"
+            )
 
-    # 准备翻译来源提示样式
-    if not desc_clean.strip() and not desc_zh.strip() and not quote_clean.strip() and not quote_zh.strip():
-        # 如果没有任何文字内容,则传入空白的 translate_source
-        translate_source = ''
-    elif is_retweet:
-        translate_source = "已转推"
-    else:
-        translate_source = '''
-    <div class="text-blue-500 text-sm flex items-center">
-        由  
-        <div class="flex flex-row items-center gap-2">
-            <div class="h-9 w-9 text-gray-500" style="flex: none">
-                <svg viewBox="0 0 30 30" width="30" height="30" xmlns="http://www.w3.org/2000/svg" class="fill-current">
-                    <path id="path" d="M27.501 8.46875C27.249 8.3457 27.1406 8.58008 26.9932 8.69922C26.9434 8.73828 26.9004 8.78906 26.8584 8.83398C26.4902 9.22852 26.0605 9.48633 25.5 9.45508C24.6787 9.41016 23.9785 9.66797 23.3594 10.2969C23.2275 9.52148 22.79 9.05859 22.125 8.76172C21.7764 8.60742 21.4238 8.45312 21.1807 8.11719C21.0098 7.87891 20.9639 7.61328 20.8779 7.35156C20.8242 7.19336 20.7695 7.03125 20.5879 7.00391C20.3906 6.97266 20.3135 7.13867 20.2363 7.27734C19.9258 7.84375 19.8066 8.46875 19.8174 9.10156C19.8447 10.5234 20.4453 11.6562 21.6367 12.4629C21.7725 12.5547 21.8076 12.6484 21.7646 12.7832C21.6836 13.0605 21.5869 13.3301 21.501 13.6074C21.4473 13.7852 21.3662 13.8242 21.1768 13.7461C20.5225 13.4727 19.957 13.0684 19.458 12.5781C18.6104 11.7578 17.8438 10.8516 16.8877 10.1426C16.6631 9.97656 16.4395 9.82227 16.207 9.67578C15.2314 8.72656 16.335 7.94727 16.5898 7.85547C16.8574 7.75977 16.6826 7.42773 15.8193 7.43164C14.957 7.43555 14.167 7.72461 13.1611 8.10938C13.0137 8.16797 12.8594 8.21094 12.7002 8.24414C11.7871 8.07227 10.8389 8.0332 9.84766 8.14453C7.98242 8.35352 6.49219 9.23633 5.39648 10.7441C4.08105 12.5547 3.77148 14.6133 4.15039 16.7617C4.54883 19.0234 5.70215 20.8984 7.47559 22.3633C9.31348 23.8809 11.4307 24.625 13.8457 24.4824C15.3125 24.3984 16.9463 24.2012 18.7881 22.6406C19.2529 22.8711 19.7402 22.9629 20.5498 23.0332C21.1729 23.0918 21.7725 23.002 22.2373 22.9062C22.9648 22.752 22.9141 22.0781 22.6514 21.9531C20.5186 20.959 20.9863 21.3633 20.5605 21.0371C21.6445 19.752 23.2783 18.418 23.917 14.0977C23.9668 13.7539 23.9238 13.5391 23.917 13.2598C23.9131 13.0918 23.9512 13.0254 24.1445 13.0059C24.6787 12.9453 25.1973 12.7988 25.6738 12.5352C27.0557 11.7793 27.6123 10.5391 27.7441 9.05078C27.7637 8.82422 27.7402 8.58789 27.501 8.46875ZM15.46 21.8613C13.3926 20.2344 12.3906 19.6992 11.9766 19.7227C11.5898 19.7441 11.6592 20.1875 11.7441 20.4766C11.833 20.7617 11.9492 20.959 12.1123 21.209C12.2246 21.375 12.3018 21.623 12 21.8066C11.334 22.2207 10.1768 21.668 10.1221 21.6406C8.77539 20.8477 7.64941 19.7988 6.85547 18.3652C6.08984 16.9844 5.64453 15.5039 5.57129 13.9238C5.55176 13.541 5.66406 13.4062 6.04297 13.3379C6.54199 13.2461 7.05762 13.2266 7.55664 13.2988C9.66602 13.6074 11.4619 14.5527 12.9668 16.0469C13.8262 16.9004 14.4766 17.918 15.1465 18.9121C15.8584 19.9688 16.625 20.9746 17.6006 21.7988C17.9443 22.0879 18.2197 22.3086 18.4824 22.4707C17.6895 22.5586 16.3652 22.5781 15.46 21.8613ZM16.4502 15.4805C16.4502 15.3105 16.5859 15.1758 16.7568 15.1758C16.7949 15.1758 16.8301 15.1836 16.8613 15.1953C16.9033 15.2109 16.9424 15.2344 16.9727 15.2695C17.0273 15.3223 17.0586 15.4004 17.0586 15.4805C17.0586 15.6504 16.9229 15.7852 16.7529 15.7852C16.582 15.7852 16.4502 15.6504 16.4502 15.4805ZM19.5273 17.0625C19.3301 17.1426 19.1328 17.2129 18.9434 17.2207C18.6494 17.2344 18.3281 17.1152 18.1533 16.9688C17.8828 16.7422 17.6895 16.6152 17.6074 16.2168C17.5732 16.0469 17.5928 15.7852 17.623 15.6348C17.6934 15.3105 17.6152 15.1035 17.3877 14.9141C17.2012 14.7598 16.9658 14.7188 16.7061 14.7188C16.6094 14.7188 16.5205 14.6758 16.4541 14.6406C16.3457 14.5859 16.2568 14.4512 16.3418 14.2852C16.3691 14.2324 16.501 14.1016 16.5322 14.0781C16.8838 13.877 17.29 13.9434 17.666 14.0938C18.0146 14.2363 18.2773 14.498 18.6562 14.8672C19.0439 15.3145 19.1133 15.4395 19.334 15.7734C19.5078 16.0371 19.667 16.3066 19.7754 16.6152C19.8408 16.8066 19.7559 16.9648 19.5273 17.0625Z" fill-rule="nonzero" fill="#4D6BFE"></path>
-                </svg>
-            </div>
-        </div>
-        翻译自日语
-    </div>
-    '''
-
-    # 渲染 HTML
-    rendered_html = template.render(
-        author=author,
-        author_id=author_id,  # 新增
-        desc_clean=desc_clean,
-        desc_zh=desc_zh,
-        quote_clean=quote_clean,
-        quote_zh=quote_zh,
-        beijing_time_str=beijing_time_str,
-        categories=categories,
-        avatar_path=avatar_path,
-        avatar_quote=avatar_quote,
-        quoted_username=quoted_username,
-        translate_source=translate_source,
-        css_content=css_content,
-        js_content=js_content  # 新增参数
-    )
-
-    # Step 1: 生成大尺寸截图
-    hti = Html2Image(output_path=output_path, size=(2160, 8000))
-    try:
-        hti.screenshot(html_str=rendered_html, save_as=filename)
-    except Exception as e:
-        logging.error(f"HTML 转图片失败：{e}")
-        return None
-
-    # Step 2: 裁剪白色空白区域
-    img = Image.open(filepath)
-    gray = img.convert('L')
-    bbox = gray.point(lambda x: 0 if x == 255 else 255).getbbox()
-
-    if bbox:
-        img = img.crop(bbox)
-        img.save(filepath)
+            # Step 2: 裁剪白色空白区域（按内容截图时已经是卡片大小，跳过）
+            if not result.fitted:
+                with metrics.stage("crop"):
+                    crop_whitespace(raw_path)
 
-    return filepath
+            # Step 3: 输出编码（缩放到 CARD_WIDTH，按 CARD_FORMAT 压缩），上传给 Mirai 的文件更小
+            start_time = time.time()
+            raw_size = os.path.getsize(raw_path)
+            with metrics.stage("encode") as span:
+                size = encode_card(raw_path, filepath, CARD_FORMAT, CARD_WIDTH, CARD_QUALITY)
+                span.bytes = size
+            logging.info(
+                f"卡片编码 {CARD_FORMAT} | {raw_size // 1024}KB -> {size // 1024}KB | 耗时 {time.time()-start_time:.2f}s"
+            )
+            return True
+        finally:
+            if os.path.exists(raw_path):
+                os.remove(raw_path)
+
+    # 同一条推文从另一个订阅源再次出现、或发送失败后重新处理时，内容相同的卡片直接复用已有截图
+    key = render_key(
+        rendered_html, (avatar_path, avatar_quote),
+        f"{RENDER_ENGINE}|{RENDER_FIT_CONTENT}|{CARD_FORMAT}|{CARD_WIDTH}|{CARD_QUALITY}",
+    )
+    cache = get_render_cache()
+    if output_path and os.path.abspath(output_path) != cache.root:
+        # 指定了其他目录时不走缓存，仍以内容哈希命名
+        os.makedirs(output_path, exist_ok=True)
+        filepath = os.path.join(os.path.abspath(output_path), f"{key[:32]}{CARD_FORMATS.get(CARD_FORMAT, '.png')}")
+        return filepath if produce(filepath) else None
+    return cache.render(key, produce, pin)
 
 
 
@@ -859,60 +1115,59 @@ def download_avatar(url: str, author: str) -> str:
     # 修改URL获取高清版本
     url = modify_avatar_url(url)
 
-    os.makedirs(AVATAR_DIR, exist_ok=True)  # 确保 avatar 目录存在
-
     url = unescape(url.replace('&amp;', '&'))
     parsed_url = urlparse(url)
     ext = os.path.splitext(parsed_url.path)[1] or ".png"  # 保留扩展名或默认为.png
-    filename = f"{author}{ext}"
-    path = os.path.join(AVATAR_DIR, filename)
 
-    # 如果头像文件已存在，则直接返回路径，不重新下载
-    if os.path.exists(path):
-        logging.info(f"头像已存在，跳过下载：{filename}")
-        return path
-
-    try:
-        resp = requests.get(
-            url,
-            proxies=proxies,
-            stream=True,
-            timeout=15,
-            verify=False,
-            headers={'User-Agent': 'Mozilla/5.0'}
-        )
-        resp.raise_for_status()
-        with open(path, 'wb') as f:
-            for chunk in resp.iter_content(1024):
-                f.write(chunk)
-        logging.info(f"头像下载成功：{filename}")
-        return path
-    except Exception as e:
-        logging.warning(f"头像下载失败：{str(e)}")
-        return None
+    # avatar 目录由头像索引创建；本地头像来自同一个 URL 时直接返回；推特换了头像（URL 变化）时重新下载覆盖
+    with get_metrics().stage("avatar"):
+        path = get_avatar_index().ensure(author, url, ext)
+    if not path:
+        logging.warning(f"头像下载失败：{author}")
+    return path
 
-def image_to_base64(image_path: str) -> Optional[str]:
-    if not image_path or not os.path.exists(image_path):
-        return None
-    try:
-        with open(image_path, "rb") as img_file:
-            encoded = base64.b64encode(img_file.read()).decode("utf-8")
-            ext = os.path.splitext(image_path)[1][1:].lower()  # jpg/png/svg 等
-            return f"data:image/{ext};base64,{encoded}"
-    except Exception as e:
-        logging.warning(f"Base64 编码失败：{e}")
-        return None
 
+def _close_existing(name: str, method: str = None, label: str = None):
+    # 和 _snapshot_of 一样只处理已经创建的组件，退出时不为了关闭而新建浏览器、数据库等
+    component = globals().get(name)
+    if component is None:
+        return
+    if label:
+        logging.info(f"{label}：{component.snapshot()}")
+    if method:
+        getattr(component, method)()
+
+
+def shutdown():
+    """等正在处理的推文结束，关闭各组件并把统计写进日志"""
+    _close_existing("_pipeline", "shutdown")
+    _close_existing("_dispatcher", "shutdown")
+    _close_existing("_mirai", "close")
+    _close_existing("_render_pool", "shutdown")
+    _close_existing("_render_cache", label="截图缓存统计")
+    _close_existing("_avatar_cache", label="头像缩略图统计")
+    _close_existing("_translator", "close")
+    _close_existing("_downloader", "shutdown")
+    _close_existing("_media_store", "close", "媒体库统计")
+    _close_existing("_avatar_index", "close", "头像索引统计")
+    _close_existing("_upload_cache", "close", "上传缓存统计")
+    _close_existing("_metrics", "close", "各阶段耗时统计")
+    _close_existing("_seen", "close")
+    _close_existing("_delivered", "close")
 
-def start_immediate_tasks():
-# 启动时立即扫描更新
-    Twitter_seiyuu()
 
 # 调度入口
 if __name__ == '__main__':
-    schedule.every(1).minutes.do(Twitter_seiyuu)
-    # 启动时立即执行任务
-    start_immediate_tasks()
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
+    get_metrics()  # 配置了 METRICS_PORT 时启动时就开放统计接口
+    prepare_tailwind_css()
+    # 调度器第一次 tick 时所有订阅源都到期，相当于启动时立即扫描一次
+    scheduler = get_feed_scheduler()
+    try:
+        while True:
+            scheduler.tick()
+            time.sleep(1)
+    except KeyboardInterrupt:
+        logging.info("收到退出信号，等待流水线处理完正在进行的任务...")
+    finally:
+        scheduler.shutdown(wait=False)
+        shutdown()
@@ -0,0 +1,100 @@
+import os
+import json
+import time
+import logging
+import sqlite3
+import threading
+
+
+# -------------------
+# 已看/已上传记录（SQLite）
+# -------------------
+
+# 距离上次清理超过这个时间才再清理一次过期记录
+PRUNE_EVERY = 3600
+
+
+class RecordSet:
+    """
+    落盘的字符串集合，用法和原来的 set 一样（in / add / len）：
+    - SQLite WAL 模式，每次 add 只插入一行，不再整文件重写 JSON；写到一半崩溃也不会损坏已有记录
+    - 超过 retention 秒的记录会被清理（None 为永久保留）
+    - 第一次打开时导入旧的 JSON 文件，导入后改名为 *.migrated，不再读取
+    """
+
+    def __init__(self, path: str, table: str, retention: float = None, legacy_json: str = None):
+        self.path = path
+        self.table = table
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            " key TEXT PRIMARY KEY,"
+            " created_at REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_created_at ON {table}(created_at)")
+        self._conn.commit()
+        if legacy_json:
+            self._migrate(legacy_json)
+        self.prune()
+
+    def _migrate(self, json_path: str):
+        if not os.path.exists(json_path):
+            return
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                keys = json.load(f)
+        except Exception as e:
+            logging.error(f"读取旧记录 {json_path} 失败，跳过导入：{e}")
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT OR IGNORE INTO {self.table} (key, created_at) VALUES (?, ?)",
+                ((str(key), now) for key in keys)
+            )
+            self._conn.commit()
+        # 提交之后再改名，中途崩溃下次会重新导入（INSERT OR IGNORE 可重复执行）
+        os.replace(json_path, json_path + '.migrated')
+        logging.info(f"已将 {json_path} 中的 {len(keys)} 条记录导入 {self.path}:{self.table}")
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            row = self._conn.execute(f"SELECT 1 FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        return row is not None
+
+    def add(self, key):
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR IGNORE INTO {self.table} (key, created_at) VALUES (?, ?)",
+                (key, time.time())
+            )
+            self._conn.commit()
+        if time.monotonic() - self._last_prune > PRUNE_EVERY:
+            self.prune()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def prune(self) -> int:
+        """删除超过保留期的记录，返回删除条数"""
+        self._last_prune = time.monotonic()
+        if not self.retention:
+            return 0
+        with self._lock:
+            cur = self._conn.execute(
+                f"DELETE FROM {self.table} WHERE created_at < ?", (time.time() - self.retention,)
+            )
+            self._conn.commit()
+        if cur.rowcount:
+            logging.info(f"清理过期记录 {self.table}：{cur.rowcount} 条")
+        return cur.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
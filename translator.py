@@ -0,0 +1,565 @@
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from openai import OpenAI, APITimeoutError
+
+
+# -------------------
+# Deepseek 翻译
+# -------------------
+
+SYSTEM_PROMPT = (
+    "你是一名专业翻译，请将日语内容精准翻译为简体中文。要求：\n"
+    "1. 保持原有换行和格式\n"
+    "2. 保留#话题标签和@提及,不进行翻译，同时#话题标签后必须保留空格\n"
+    "3. 禁止添加解释内容\n"
+    "4. 保留URL链接不变\n"
+    "5. 处理日式颜文字不翻译\n"
+    "6. 人名保留原文不翻译"
+)
+BATCH_PROMPT = (
+    "\n7. 用户会以 JSON 给出多段待翻译内容 {\"segments\": [{\"id\": 编号, \"text\": 原文}]}，"
+    "逐段独立翻译，不要合并或拆分段落\n"
+    "8. 只输出 JSON：{\"translations\": [{\"id\": 编号, \"text\": 译文}]}，每个编号必须且只能出现一次"
+)
+MODEL = "deepseek-chat"
+# 提示词或模型变化后旧的缓存译文自动失效
+PROMPT_VERSION = hashlib.sha1(f"{MODEL}\n{SYSTEM_PROMPT}".encode('utf-8')).hexdigest()[:12]
+
+
+def clean_translation(translated: str) -> str:
+    """去掉模型回复里多余的前缀和空行"""
+    translated = translated.strip()
+    translated = re.sub(r'^翻译[：:]?\s*', '', translated)
+    translated = re.sub(r'\n{3,}', '\n\n', translated)
+    return translated
+
+
+class TranslationTimeout(Exception):
+    """流式翻译超过自适应超时，被提前取消；ttft 为首 token 耗时，没等到首 token 时为首 token 超时"""
+
+    ttft = None
+
+
+def _percentile(values, p: float) -> float:
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+class TranslationStats:
+    """
+    翻译调用的延迟与 token 统计，线程安全。
+    保留最近 window 次的总耗时和首 token 耗时，用于计算分位数和自适应超时。
+    超时取消的调用按取消时的耗时计入窗口，否则分位数只看得到快的调用，超时会越缩越短。
+    批量请求一次翻译多段，耗时和单条调用不可比，单独计数，不进入自适应超时的样本窗口。
+    """
+
+    def __init__(self, window: int = 200):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.tokens = 0
+        self.total_latency = 0.0
+        self.recent = deque(maxlen=window)
+        self.recent_ttft = deque(maxlen=window)
+        self.batch_calls = 0
+        self.batch_tokens = 0
+        self.batch_latency = 0.0
+
+    def record(self, latency: float, tokens: int = 0, ttft: float = None):
+        with self._lock:
+            self.calls += 1
+            self.tokens += tokens
+            self.total_latency += latency
+            self.recent.append(latency)
+            if ttft is not None:
+                self.recent_ttft.append(ttft)
+
+    def record_batch(self, latency: float, tokens: int = 0):
+        with self._lock:
+            self.batch_calls += 1
+            self.batch_tokens += tokens
+            self.batch_latency += latency
+
+    def record_failure(self):
+        with self._lock:
+            self.failed += 1
+
+    def record_timeout(self, latency: float, ttft: float = None):
+        with self._lock:
+            self.timeouts += 1
+            self.recent.append(latency)
+            if ttft is not None:
+                self.recent_ttft.append(ttft)
+
+    def percentile(self, p: float) -> float:
+        with self._lock:
+            values = list(self.recent)
+        return _percentile(values, p)
+
+    def ttft_percentile(self, p: float) -> float:
+        with self._lock:
+            values = list(self.recent_ttft)
+        return _percentile(values, p)
+
+    def samples(self) -> int:
+        with self._lock:
+            return len(self.recent)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            avg = self.total_latency / self.calls if self.calls else 0.0
+            calls, failed, timeouts, tokens = self.calls, self.failed, self.timeouts, self.tokens
+            batch_calls, batch_tokens = self.batch_calls, self.batch_tokens
+            batch_avg = self.batch_latency / batch_calls if batch_calls else 0.0
+        return {
+            "calls": calls,
+            "failed": failed,
+            "timeouts": timeouts,
+            "tokens": tokens,
+            "avg": round(avg, 3),
+            "p50": round(self.percentile(50), 3),
+            "p95": round(self.percentile(95), 3),
+            "ttft_p50": round(self.ttft_percentile(50), 3),
+            "ttft_p95": round(self.ttft_percentile(95), 3),
+            "batch_calls": batch_calls,
+            "batch_tokens": batch_tokens,
+            "batch_avg": round(batch_avg, 3),
+        }
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：日文汉字/假名约 1 字 1 token，英文约 3 字节 1 token"""
+    return len(text.encode('utf-8')) // 3 + 1
+
+
+def normalize_source(text: str) -> str:
+    """缓存键用的归一化：统一全半角、合并空白和连续的 <br>"""
+    text = unicodedata.normalize('NFKC', text)
+    text = re.sub(r'[ \t\u3000]+', ' ', text)
+    text = re.sub(r'(?:\s*<br\s*/?>\s*)+', '<br>', text, flags=re.IGNORECASE)
+    return text.strip()
+
+
+class TranslationCache:
+    """
+    落盘的翻译缓存（SQLite），重启后仍然有效：
+    - 键为 归一化原文 + 提示词/模型版本 的哈希
+    - 超过 ttl 的条目视为未命中，超过 max_entries 时按最近使用时间淘汰（LRU）
+    - 记录命中/未命中次数，以及命中时省下的 token 和耗时
+    """
+
+    def __init__(self, path: str, max_entries: int = 5000, ttl: float = 30 * 86400):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.saved_tokens = 0
+        self.saved_seconds = 0.0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            " key TEXT PRIMARY KEY,"
+            " translation TEXT NOT NULL,"
+            " tokens INTEGER NOT NULL DEFAULT 0,"
+            " latency REAL NOT NULL DEFAULT 0,"
+            " created_at REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_translations_last_used ON translations(last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(text: str) -> str:
+        return hashlib.sha256(f"{PROMPT_VERSION}\n{normalize_source(text)}".encode('utf-8')).hexdigest()
+
+    def get(self, text: str):
+        key = self.make_key(text)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT translation, tokens, latency, created_at FROM translations WHERE key = ?", (key,)
+            ).fetchone()
+            if row and now - row[3] > self.ttl:
+                self._conn.execute("DELETE FROM translations WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+            if not row:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE translations SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            self.saved_tokens += row[1]
+            self.saved_seconds += row[2]
+            return row[0]
+
+    def put(self, text: str, translation: str, tokens: int = 0, latency: float = 0.0):
+        key = self.make_key(text)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO translations (key, translation, tokens, latency, created_at, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, translation, tokens, latency, now, now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        self._conn.execute("DELETE FROM translations WHERE created_at < ?", (time.time() - self.ttl,))
+        count = self._conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM translations WHERE key IN"
+                " (SELECT key FROM translations ORDER BY last_used ASC LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "saved_tokens": self.saved_tokens,
+                "saved_seconds": round(self.saved_seconds, 2),
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class Translator:
+    """
+    进程内共享的翻译器：
+    - 只创建一次 OpenAI 客户端，底层连接池保持长连接，不再每次调用都重新握手
+    - translate_many() 并发翻译多段文本，同一段文本只翻译一次
+    - 每次调用的耗时和 token 记录在 stats 中
+    - 传入 cache 时先查翻译缓存，只有未命中才请求 API
+    - stream 模式下记录首 token 耗时，超时时间按最近的延迟分位数自适应，
+      过慢的请求提前取消并返回原文，不再阻塞后面的流程
+    """
+
+    # 自适应超时至少需要这么多次调用的样本，之前使用固定 timeout
+    ADAPTIVE_MIN_SAMPLES = 10
+
+    def __init__(self, api_key=None, base_url=None, timeout: float = 30,
+                 max_retries: int = 3, workers: int = 4, cache: TranslationCache = None,
+                 stream: bool = True, timeout_factor: float = 2.0, min_timeout: float = 5.0):
+        self.cache = cache
+        self.stream = stream
+        self.timeout_factor = timeout_factor
+        self.min_timeout = min_timeout
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.stats = TranslationStats()
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="translate")
+
+    @property
+    def client(self) -> OpenAI:
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    # api_key/base_url 为 None 时 OpenAI 会读取 OPENAI_API_KEY / OPENAI_BASE_URL 环境变量
+                    # 客户端自带连接池，整个进程共用一个实例即可复用长连接
+                    self._client = OpenAI(
+                        api_key=self.api_key,
+                        base_url=self.base_url,
+                        timeout=self.timeout,
+                    )
+        return self._client
+
+    def adaptive_timeout(self):
+        """
+        根据最近调用（含超时取消的调用）的 p95 延迟计算 (首 token 超时, 总超时)，
+        结果限制在 [min_timeout, timeout] 之间；样本不足时两者都用固定 timeout
+        """
+        if self.stats.samples() < self.ADAPTIVE_MIN_SAMPLES:
+            return self.timeout, self.timeout
+        total = min(self.timeout, max(self.min_timeout, self.stats.percentile(95) * self.timeout_factor))
+        first_token = min(total, max(self.min_timeout, self.stats.ttft_percentile(95) * self.timeout_factor))
+        return first_token, total
+
+    def _stream_completion(self, client, messages):
+        """流式请求，返回 (回复内容, token数, 首token耗时)；超过自适应超时抛出 TranslationTimeout"""
+        first_token_timeout, total_timeout = self.adaptive_timeout()
+        start_time = time.perf_counter()
+        # 请求级 timeout 约束的是两次读之间的等待，正好覆盖“迟迟不出首 token”和“中途卡住”；
+        # 关掉 SDK 自带的重试，超时后由这里决定是否放弃
+        ttft = None
+        try:
+            try:
+                stream = client.with_options(max_retries=0).chat.completions.create(
+                    model=MODEL,
+                    messages=messages,
+                    temperature=0.2,
+                    top_p=0.3,
+                    max_tokens=8000,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                    timeout=first_token_timeout
+                )
+            except APITimeoutError as e:
+                raise TranslationTimeout(f"首 token 超过 {first_token_timeout:.1f}s") from e
+            parts = []
+            tokens = 0
+            try:
+                for chunk in self._iter_stream(stream, first_token_timeout):
+                    elapsed = time.perf_counter() - start_time
+                    if chunk.usage:
+                        tokens = chunk.usage.total_tokens
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        if ttft is None:
+                            ttft = elapsed
+                        parts.append(chunk.choices[0].delta.content)
+                    if ttft is None and elapsed > first_token_timeout:
+                        raise TranslationTimeout(f"首 token 超过 {first_token_timeout:.1f}s")
+                    if elapsed > total_timeout:
+                        raise TranslationTimeout(f"总耗时超过 {total_timeout:.1f}s")
+            finally:
+                stream.close()
+        except TranslationTimeout as e:
+            e.ttft = ttft if ttft is not None else first_token_timeout
+            raise
+        return ''.join(parts), tokens, ttft
+
+    @staticmethod
+    def _iter_stream(stream, read_timeout: float):
+        """逐块读取流式回复，读超时统一转成 TranslationTimeout"""
+        try:
+            yield from stream
+        except APITimeoutError as e:
+            raise TranslationTimeout(f"读取回复超过 {read_timeout:.1f}s 无数据") from e
+        except Exception as e:
+            # 流读取过程中的底层超时异常不一定被 SDK 包装
+            if 'timeout' in type(e).__name__.lower():
+                raise TranslationTimeout(f"读取回复超过 {read_timeout:.1f}s 无数据") from e
+            raise
+
+    def translate(self, text: str) -> str:
+        """
+        使用 Deepseek API 进行文本翻译（日语 -> 简体中文）
+        返回格式: 翻译后的文本字符串，失败时返回原文本
+        """
+        if self.cache is not None:
+            cached = self.cache.get(text)
+            if cached is not None:
+                logging.info(f"翻译缓存命中 | 缓存统计 {self.cache.snapshot()}")
+                return cached
+        return self._translate_uncached(text)
+
+    def _translate_uncached(self, text: str) -> str:
+        """不查缓存直接请求，成功时写入缓存；失败返回原文"""
+        result = self._request(text)
+        if result is None:
+            return text
+        translated, tokens, latency = result
+        if self.cache is not None:
+            self.cache.put(text, translated, tokens, latency)
+            logging.info(f"翻译缓存未命中，已写入 | 缓存统计 {self.cache.snapshot()}")
+        return translated
+
+    def _request(self, text: str):
+        """请求 Deepseek，成功返回 (译文, token数, 耗时)，失败返回 None"""
+        try:
+            client = self.client
+        except Exception as e:
+            logging.warning(f"Deepseek 客户端初始化失败，跳过翻译：{e}")
+            return None
+
+        if not client.api_key:
+            logging.warning("Deepseek API key 未配置，跳过翻译")
+            return None
+
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": f"请翻译以下内容：\n{text}"}
+        ]
+
+        for attempt in range(self.max_retries):
+            start_time = time.perf_counter()
+            try:
+                ttft = None
+                if self.stream:
+                    content, tokens, ttft = self._stream_completion(client, messages)
+                else:
+                    response = client.chat.completions.create(
+                        model=MODEL,
+                        messages=messages,
+                        temperature=0.2,
+                        top_p=0.3,
+                        max_tokens=8000,
+                        stream=False
+                    )
+                    content = response.choices[0].message.content if response.choices else ''
+                    tokens = response.usage.total_tokens if response.usage else 0
+
+                if content:
+                    translated = clean_translation(content)
+                    latency = time.perf_counter() - start_time
+                    self.stats.record(latency, tokens, ttft)
+                    ttft_info = f"首token {ttft:.2f}s | " if ttft is not None else ''
+                    logging.info(
+                        f"翻译成功 | {ttft_info}耗时 {latency:.2f}s | Token使用: {tokens} | "
+                        f"累计 {self.stats.snapshot()}"
+                    )
+                    return translated, tokens, latency
+
+            except TranslationTimeout as e:
+                # 慢请求直接放弃，使用原文，不再退避重试拖住流水线；
+                # 取消时的耗时照样计入延迟窗口，下次的超时会相应放宽
+                self.stats.record_timeout(time.perf_counter() - start_time, e.ttft)
+                logging.warning(f"翻译过慢已取消，使用原文: {e} | 原文: {text[:50]}...")
+                return None
+
+            except Exception as e:
+                wait_time = 2 ** attempt
+                logging.warning(f"翻译尝试 {attempt+1}/{self.max_retries} 失败: {str(e)}")
+                time.sleep(wait_time)
+
+        self.stats.record_failure()
+        logging.error(f"所有重试失败 | 原文: {text[:100]}...")
+        return None
+
+    # ---- 批量翻译 ----
+    def prefetch(self, texts, token_budget: int = 2000, max_segments: int = 20) -> dict:
+        """
+        把一次调用传入的所有待翻译文本打包成少量批量请求，立即返回 {原文: Future[译文]}。
+        seiyuu.py 在每个订阅源每次抓取后调用一次（pipeline.run 的 prefetch），
+        所以批次按订阅源划分，同一轮里不同订阅源的推文不会合并进同一个请求。
+        已缓存的文本直接给出结果；每个批次按 token_budget 估算的输入 token 数切分；
+        批量回复解析失败或缺段时，对应文本退回单条翻译（已经查过缓存，不再重复查）。
+        """
+        futures = {}
+        pending = []
+        for text in dict.fromkeys(t for t in texts if t):
+            future = Future()
+            futures[text] = future
+            cached = self.cache.get(text) if self.cache is not None else None
+            if cached is not None:
+                future.set_result(cached)
+            else:
+                pending.append(text)
+
+        batches, batch, batch_tokens = [], [], 0
+        for text in pending:
+            tokens = estimate_tokens(text)
+            if batch and (batch_tokens + tokens > token_budget or len(batch) >= max_segments):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+
+        if batches:
+            logging.info(f"批量翻译 | {len(pending)} 段待翻译，分 {len(batches)} 个请求")
+        for batch in batches:
+            self._executor.submit(self._run_batch, batch, {text: futures[text] for text in batch})
+        return futures
+
+    def _run_batch(self, batch, futures):
+        try:
+            results = self._request_batch(batch) if len(batch) > 1 else {}
+        except Exception as e:
+            logging.warning(f"批量翻译失败，逐段重试：{e}")
+            results = {}
+        for text in batch:
+            try:
+                if text in results:
+                    futures[text].set_result(results[text])
+                else:
+                    futures[text].set_result(self._translate_uncached(text))
+            except Exception as e:
+                futures[text].set_exception(e)
+
+    def _request_batch(self, batch) -> dict:
+        """一次请求翻译多段文本，返回能够可靠对应回原文的 {原文: 译文}"""
+        client = self.client
+        if not client.api_key:
+            return {}
+        segments = [{"id": i, "text": text} for i, text in enumerate(batch)]
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT + BATCH_PROMPT},
+            {"role": "user", "content": json.dumps({"segments": segments}, ensure_ascii=False)}
+        ]
+
+        start_time = time.perf_counter()
+        response = client.chat.completions.create(
+            model=MODEL,
+            messages=messages,
+            temperature=0.2,
+            top_p=0.3,
+            max_tokens=8000,
+            stream=False,
+            response_format={"type": "json_object"}
+        )
+        latency = time.perf_counter() - start_time
+        tokens = response.usage.total_tokens if response.usage else 0
+        content = response.choices[0].message.content if response.choices else ''
+
+        results = {}
+        try:
+            items = json.loads(content or '').get("translations", [])
+        except (ValueError, AttributeError):
+            items = []
+        for item in items if isinstance(items, list) else []:
+            if not isinstance(item, dict):
+                continue
+            index, translated = item.get("id"), item.get("text")
+            if isinstance(index, int) and 0 <= index < len(batch) and isinstance(translated, str) and translated.strip():
+                # 同一编号出现多次视为回复不可靠，该段退回单条翻译
+                if batch[index] in results:
+                    results[batch[index]] = None
+                else:
+                    results[batch[index]] = clean_translation(translated)
+        results = {text: translated for text, translated in results.items() if translated is not None}
+
+        self.stats.record_batch(latency, tokens)
+        logging.info(
+            f"批量翻译完成 | {len(results)}/{len(batch)} 段 | 耗时 {latency:.2f}s | Token使用: {tokens}"
+        )
+        if self.cache is not None:
+            # 批量请求的耗时和 token 按段数平摊，用于统计缓存节省量
+            share = max(1, len(results))
+            for text, translated in results.items():
+                self.cache.put(text, translated, tokens // share, latency / share)
+        return results
+
+    def translate_many(self, texts) -> dict:
+        """并发翻译多段文本，返回 {原文: 译文}；空文本和重复文本不会发请求"""
+        unique = list(dict.fromkeys(t for t in texts if t))
+        if not unique:
+            return {}
+        if len(unique) == 1:
+            return {unique[0]: self.translate(unique[0])}
+        futures = {text: self._executor.submit(self.translate, text) for text in unique}
+        return {text: future.result() for text, future in futures.items()}
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        if self._client is not None:
+            self._client.close()
+        if self.cache is not None:
+            self.cache.close()
@@ -0,0 +1,92 @@
+import time
+import sqlite3
+import threading
+
+from key_locks import KeyLocks
+from media_store import file_sha256
+
+
+# -------------------
+# Mirai 图片上传缓存
+# -------------------
+
+class UploadCache:
+    """
+    文件内容哈希 -> Mirai imageId 的缓存（SQLite）：
+    - 同一张图片只上传一次，发往多个群时复用同一个 imageId
+    - 同一内容并发上传时只有一个线程真正上传，其余线程等待结果
+    - imageId 会在服务器上过期，超过 ttl 的条目重新上传；发送失败时调用 invalidate 丢弃
+    """
+
+    def __init__(self, db_path: str, upload, ttl: float = 24 * 3600):
+        # upload(file_path, session_key) -> imageId 或 None
+        self.upload = upload
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._key_locks = KeyLocks()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS upload_cache ("
+            " sha256 TEXT PRIMARY KEY,"
+            " image_id TEXT NOT NULL,"
+            " uploaded_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _lookup(self, sha256: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT image_id, uploaded_at FROM upload_cache WHERE sha256 = ?", (sha256,)
+            ).fetchone()
+        if row and time.time() - row[1] <= self.ttl:
+            return row[0]
+        return None
+
+    def get_image_id(self, file_path: str, session_key: str):
+        """返回文件对应的 imageId，没有缓存时上传；上传失败返回 None"""
+        sha256 = file_sha256(file_path)
+        with self._key_locks.hold(sha256):
+            return self._get_image_id(sha256, file_path, session_key)
+
+    def _get_image_id(self, sha256: str, file_path: str, session_key: str):
+        image_id = self._lookup(sha256)
+        if image_id:
+            with self._lock:
+                self.hits += 1
+            return image_id
+        image_id = self.upload(file_path, session_key)
+        with self._lock:
+            if not image_id:
+                self.failed += 1
+                return None
+            self.misses += 1
+            self._conn.execute(
+                "INSERT OR REPLACE INTO upload_cache (sha256, image_id, uploaded_at) VALUES (?, ?, ?)",
+                (sha256, image_id, time.time())
+            )
+            self._conn.execute("DELETE FROM upload_cache WHERE uploaded_at < ?", (time.time() - self.ttl,))
+            self._conn.commit()
+        return image_id
+
+    def invalidate(self, image_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM upload_cache WHERE image_id = ?", (image_id,))
+            self._conn.commit()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "uploads": self.misses,
+                "failed": self.failed,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()